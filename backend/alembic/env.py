@@ -36,6 +36,14 @@ database_url = Config().SQLALCHEMY_DATABASE_URI
 
 config.set_main_option('sqlalchemy.url', f'{database_url}')
 
+# Generated search columns and their indexes are created by DDL outside the model metadata, see EVENT_SEARCH_DOCUMENT
+SEARCH_OBJECTS = {'search_vector', 'ix_events_search_vector', 'ix_articles_search_vector'}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the generated search columns and indexes out of autogenerate"""
+    return not (reflected and name in SEARCH_OBJECTS)
+
 
 def run_migrations_offline() -> None:
     """
@@ -56,6 +64,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={'paramstyle': 'named'},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -77,7 +86,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,47 @@
+"""Add email outbox
+
+Revision ID: 4a9d2e6f8c13
+Revises: e41c8d7a5b90
+Create Date: 2026-10-18 10:17:52.934104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a9d2e6f8c13'
+down_revision: Union[str, None] = 'e41c8d7a5b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('email_outbox',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('to_email', sa.String(length=320), nullable=False),
+        sa.Column('from_email', sa.String(length=320), nullable=True),
+        sa.Column('subject', sa.String(length=998), nullable=False),
+        sa.Column('html_content', sa.Text(), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('id')
+    )
+    op.create_index(
+        'ix_email_outbox_next_attempt_at_pending', 'email_outbox', ['next_attempt_at'],
+        unique=False, postgresql_where=sa.text('status = 0'), sqlite_where=sa.text('status = 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_next_attempt_at_pending', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,38 @@
+"""Add indexes for the event list filters
+
+Revision ID: a3d6e8f1b2c7
+Revises: f7a2c9d4e6b1
+Create Date: 2026-10-18 12:51:22.604197
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d6e8f1b2c7'
+down_revision: Union[str, None] = 'f7a2c9d4e6b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build the indexes without locking the tables against writes, this can not run inside a transaction
+    with op.get_context().autocommit_block():
+        # Serves the organisation filter in start time order, and the organisation lookups
+        op.create_index(
+            'ix_events_organisation_id_start_at_id', 'events', ['organisation_id', 'start_at', 'id'], unique=False, postgresql_concurrently=True
+        )
+        op.create_index('ix_events_end_at', 'events', ['end_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_events_lower_address_city', 'events', [sa.text('lower(address_city)')], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_events_lower_address_country', 'events', [sa.text('lower(address_country)')], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_events_lower_address_country', table_name='events', postgresql_concurrently=True)
+        op.drop_index('ix_events_lower_address_city', table_name='events', postgresql_concurrently=True)
+        op.drop_index('ix_events_end_at', table_name='events', postgresql_concurrently=True)
+        op.drop_index('ix_events_organisation_id_start_at_id', table_name='events', postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""Add keyset pagination indexes
+
+Revision ID: b7e3f19a2c4d
+Revises: 3c54be1b70e2
+Create Date: 2026-10-18 09:02:11.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f19a2c4d'
+down_revision: Union[str, None] = '3c54be1b70e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build the indexes without locking the tables against writes, this can not run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_events_start_at_id', 'events', ['start_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index(
+            'ix_articles_event_id_published_at_id', 'articles', ['event_id', 'published_at', 'id'], unique=False, postgresql_concurrently=True
+        )
+        op.create_index('ix_organisations_created_at_id', 'organisations', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index(
+            'ix_event_interests_event_id_created_at_id', 'event_interests', ['event_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_event_interests_event_id_created_at_id', table_name='event_interests', postgresql_concurrently=True)
+        op.drop_index('ix_organisations_created_at_id', table_name='organisations', postgresql_concurrently=True)
+        op.drop_index('ix_articles_event_id_published_at_id', table_name='articles', postgresql_concurrently=True)
+        op.drop_index('ix_events_start_at_id', table_name='events', postgresql_concurrently=True)
@@ -0,0 +1,43 @@
+"""Add event interest counts
+
+Revision ID: c5f1a8e2d7b4
+Revises: 4a9d2e6f8c13
+Create Date: 2026-10-18 11:02:45.118320
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f1a8e2d7b4'
+down_revision: Union[str, None] = '4a9d2e6f8c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('event_interest_counts',
+        sa.Column('event_id', sa.UUID(), nullable=False),
+        sa.Column('not_interested', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('interested', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('maybe', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+        sa.PrimaryKeyConstraint('event_id')
+    )
+    # Backfill the counters from the existing interests
+    op.execute(
+        'INSERT INTO event_interest_counts (event_id, not_interested, interested, maybe) '
+        'SELECT event_id, '
+        'SUM(CASE WHEN status = 0 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN status = 1 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN status = 2 THEN 1 ELSE 0 END) '
+        'FROM event_interests WHERE deleted_at IS NULL GROUP BY event_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('event_interest_counts')
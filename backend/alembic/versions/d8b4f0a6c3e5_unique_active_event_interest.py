@@ -0,0 +1,54 @@
+"""Make the active interest of a user in an event unique
+
+Revision ID: d8b4f0a6c3e5
+Revises: a3d6e8f1b2c7
+Create Date: 2026-10-18 13:27:48.915063
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b4f0a6c3e5'
+down_revision: Union[str, None] = 'a3d6e8f1b2c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    # The duplicates are removed, the counters rebuilt and the unique index built in one transaction, with writes to the
+    # interests blocked until it commits, so no duplicate can be added in between and a failure leaves nothing behind
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('LOCK TABLE event_interests, event_interest_counts IN SHARE ROW EXCLUSIVE MODE')
+    # Soft delete duplicate active interests, keeping the most recently changed one
+    op.execute(
+        'UPDATE event_interests SET deleted_at = CURRENT_TIMESTAMP WHERE id IN ('
+        'SELECT id FROM ('
+        'SELECT id, row_number() OVER (PARTITION BY event_id, user_id ORDER BY coalesce(updated_at, created_at) DESC, id) AS position '
+        'FROM event_interests WHERE deleted_at IS NULL'
+        ') AS interests WHERE position > 1)'
+    )
+    # Recompute the interest counters without the duplicates
+    op.execute('DELETE FROM event_interest_counts')
+    op.execute(
+        'INSERT INTO event_interest_counts (event_id, not_interested, interested, maybe) '
+        'SELECT event_id, '
+        'SUM(CASE WHEN status = 0 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN status = 1 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN status = 2 THEN 1 ELSE 0 END) '
+        'FROM event_interests WHERE deleted_at IS NULL GROUP BY event_id'
+    )
+    op.create_index(
+        'uq_event_interests_event_id_user_id_active', 'event_interests', ['event_id', 'user_id'],
+        unique=True, postgresql_where=ACTIVE, sqlite_where=ACTIVE,
+    )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_event_interests_event_id_user_id_active', table_name='event_interests', postgresql_concurrently=True)
@@ -0,0 +1,45 @@
+"""Add indexes for the lookup predicates in the services
+
+Revision ID: e41c8d7a5b90
+Revises: b7e3f19a2c4d
+Create Date: 2026-10-18 09:41:37.205516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41c8d7a5b90'
+down_revision: Union[str, None] = 'b7e3f19a2c4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partial indexes only cover rows that are not soft deleted, as every lookup filters on deleted_at IS NULL
+ACTIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    # Build the indexes without locking the tables against writes, this can not run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_otp_email_used_at_expires_at_active', 'otp', ['email', 'used_at', 'expires_at'],
+            unique=False, postgresql_where=ACTIVE, sqlite_where=ACTIVE, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_events_created_by_id_active', 'events', ['created_by_id'],
+            unique=False, postgresql_where=ACTIVE, sqlite_where=ACTIVE, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_organisations_created_by_id_active', 'organisations', ['created_by_id'],
+            unique=False, postgresql_where=ACTIVE, sqlite_where=ACTIVE, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_organisations_created_by_id_active', table_name='organisations', postgresql_concurrently=True)
+        op.drop_index('ix_events_created_by_id_active', table_name='events', postgresql_concurrently=True)
+        op.drop_index('ix_otp_email_used_at_expires_at_active', table_name='otp', postgresql_concurrently=True)
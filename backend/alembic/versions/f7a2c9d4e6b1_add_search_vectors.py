@@ -0,0 +1,47 @@
+"""Add full-text search vectors to events and articles
+
+Revision ID: f7a2c9d4e6b1
+Revises: c5f1a8e2d7b4
+Create Date: 2026-10-18 12:14:09.530871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2c9d4e6b1'
+down_revision: Union[str, None] = 'c5f1a8e2d7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same documents as EVENT_SEARCH_DOCUMENT and ARTICLE_SEARCH_DOCUMENT in the models
+EVENT_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(address_city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+ARTICLE_SEARCH_DOCUMENT = "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || setweight(to_tsvector('simple', coalesce(content, '')), 'B')"
+
+
+def upgrade() -> None:
+    # Generated tsvector columns only exist on PostgreSQL, other databases fall back to LIKE in the search service
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(f'ALTER TABLE events ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({EVENT_SEARCH_DOCUMENT}) STORED')
+    op.execute(f'ALTER TABLE articles ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({ARTICLE_SEARCH_DOCUMENT}) STORED')
+    # Build the indexes without locking the tables against writes, this can not run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_events_search_vector', 'events', ['search_vector'], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_articles_search_vector', 'articles', ['search_vector'], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_articles_search_vector', table_name='articles', postgresql_concurrently=True)
+        op.drop_index('ix_events_search_vector', table_name='events', postgresql_concurrently=True)
+    op.drop_column('articles', 'search_vector')
+    op.drop_column('events', 'search_vector')
@@ -0,0 +1,277 @@
+import mmap
+import os
+import random
+import struct
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable, Iterable, Optional, Protocol, Tuple
+
+from app.metrics import CACHE_REQUESTS
+
+# File holding the tag versions shared by the workers of the host, set by serve.py when it runs several workers
+TAG_VERSIONS_FILE: Optional[str] = os.environ.get('CACHE_TAG_VERSIONS_FILE')
+TAG_VERSION_SLOTS = 1 << 16
+
+
+class CacheBackend(Protocol):
+    """Interface for cache backends, TTLCache is the in-process default, a shared backend can implement the same methods."""
+
+    def get(self, key: Hashable, default: Any = None) -> Any:  # noqa: D102
+        ...
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:  # noqa: D102
+        ...
+
+    def delete(self, key: Hashable) -> None:  # noqa: D102
+        ...
+
+
+class CacheMetrics:
+    """Hit and miss counters of a cache in the cache_requests metric, bound once so a lookup only increments them."""
+
+    __slots__ = ('hit', 'miss')
+
+    def __init__(self, name: str):  # noqa: D107
+        self.hit = CACHE_REQUESTS.labels(cache=name, result='hit').inc
+        self.miss = CACHE_REQUESTS.labels(cache=name, result='miss').inc
+
+
+class TTLCache:
+    """Thread safe, size bounded LRU cache where every entry expires after a time to live."""
+
+    def __init__(self, max_size: int, ttl: float, name: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        :param max_size: Maximum number of entries, the least recently used entry is evicted first
+        :param ttl: Default time to live for an entry, in seconds
+        :param name: Name of the cache in the cache_requests metric, lookups are not exported without a name
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._metrics = CacheMetrics(name) if name else None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get an entry from the cache.
+
+        :param key: Cache key
+        :param default: Value returned when the key is missing or expired
+        :return: The cached value or the default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                if self._metrics is not None:
+                    self._metrics.miss()
+                return default
+            expires_at, value = entry
+            if expires_at <= monotonic():
+                del self._data[key]
+                self.misses += 1
+                if self._metrics is not None:
+                    self._metrics.miss()
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self._metrics is not None:
+                self._metrics.hit()
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Add or replace an entry in the cache.
+
+        :param key: Cache key
+        :param value: Value to cache
+        :param ttl: Time to live in seconds, defaults to the cache ttl
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove an entry from the cache, if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry from the cache"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache size and hit/miss counters"""
+        return {'size': len(self._data), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+class DictCache:
+    """Unbounded cache without expiry, keeping every entry until it is deleted, for tests and scripts."""
+
+    def __init__(self):  # noqa: D107
+        self.data: Dict[Hashable, Any] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:  # noqa: D102
+        return self.data.get(key, default)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:  # noqa: D102
+        self.data[key] = value
+
+    def delete(self, key: Hashable) -> None:  # noqa: D102
+        self.data.pop(key, None)
+
+    def clear(self) -> None:  # noqa: D102
+        self.data.clear()
+
+
+class TagVersions:
+    """
+    Version of every tag in a fixed table of slots, in memory shared by every worker that maps the same file.
+
+    A tag is hashed to a slot, invalidating it writes a new random version to the slot. Tags sharing a slot are
+    invalidated together, which only costs a cache miss. Without a file the table is private to the process.
+    """
+
+    def __init__(self, path: Optional[str] = None, slots: int = TAG_VERSION_SLOTS):
+        """
+        Map the table of versions.
+
+        :param path: File shared by the workers, created when missing
+        :param slots: Number of slots, every slot takes 8 bytes
+        """
+        self.slots = slots
+        size = slots * 8
+        if path is None:
+            self._map = mmap.mmap(-1, size)
+            return
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _offset(self, tag: str) -> int:
+        # crc32 rather than hash, which is salted differently in every process
+        return (zlib.crc32(tag.encode()) % self.slots) * 8
+
+    def get(self, tag: str) -> int:
+        """Get the current version of a tag"""
+        return struct.unpack_from('<Q', self._map, self._offset(tag))[0]
+
+    def invalidate(self, tag: str) -> None:
+        """Give a tag a new version, random so concurrent invalidations by several workers never end on an old version"""
+        struct.pack_into('<Q', self._map, self._offset(tag), random.getrandbits(64))
+
+
+@lru_cache(maxsize=1)
+def get_tag_versions() -> TagVersions:
+    """Get the tag versions of the process, shared with the other workers when CACHE_TAG_VERSIONS_FILE is set"""
+    return TagVersions(TAG_VERSIONS_FILE)
+
+
+class TaggedCache:
+    """
+    Cache where every entry carries tags, invalidating a tag drops every entry carrying it.
+
+    Works on top of any CacheBackend, the versions of the tags are kept in TagVersions. An entry stores the versions of
+    its tags when it is set, and is only returned while all of them are unchanged. As the versions are shared by the
+    workers of the host, an invalidation by one worker drops the entries of every worker, while the entries themselves
+    stay in the memory of each worker.
+    """
+
+    def __init__(self, backend: CacheBackend, name: Optional[str] = None, tag_versions: Optional[TagVersions] = None):
+        """
+        Initialize the cache.
+
+        :param backend: Cache backend storing the entries
+        :param name: Name of the cache in the cache_requests metric, lookups are not exported without a name
+        :param tag_versions: Versions of the tags, defaults to the versions shared by the workers, see get_tag_versions
+        """
+        self.backend = backend
+        self._metrics = CacheMetrics(name) if name else None
+        self._tag_versions = tag_versions
+
+    @property
+    def tag_versions(self) -> TagVersions:
+        """Versions of the tags, resolved on first use so importing a cache does not map the file"""
+        if self._tag_versions is None:
+            self._tag_versions = get_tag_versions()
+        return self._tag_versions
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get an entry from the cache.
+
+        :param key: Cache key
+        :param default: Value returned when the key is missing, expired or one of its tags was invalidated
+        :return: The cached value or the default
+        """
+        entry = self.backend.get(('entry', key))
+        if entry is not None:
+            versions, value = entry
+            tag_versions = self.tag_versions
+            if all(tag_versions.get(tag) == version for tag, version in versions.items()):
+                if self._metrics is not None:
+                    self._metrics.hit()
+                return value
+        if self._metrics is not None:
+            self._metrics.miss()
+        return default
+
+    def versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        """
+        Get the current versions of tags.
+
+        Take the versions before reading the data to cache and pass them to set, so an invalidation while the data is
+        read is not lost.
+
+        :param tags: Tags
+        :return: Version per tag
+        """
+        tag_versions = self.tag_versions
+        return {tag: tag_versions.get(tag) for tag in tags}
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str], versions: Dict[str, int]) -> Any:
+        """
+        Add or replace an entry in the cache.
+
+        Every tag needs a version taken before the value was read, a version taken now could already include an
+        invalidation the value misses. Tags of rows only known after the read are covered by a tag of their collection.
+
+        :param key: Cache key
+        :param value: Value to cache
+        :param tags: Tags of the entry, every write changing the value invalidates one of them
+        :param versions: Tag versions taken before the value was read, see versions
+        :raises ValueError: When a tag has no version
+        :return: The value
+        """
+        tags = list(tags)
+        missing = [tag for tag in tags if tag not in versions]
+        if missing:
+            raise ValueError(f'No version taken before the read for the tags: {", ".join(missing)}')
+        self.backend.set(('entry', key), ({tag: versions[tag] for tag in tags}, value))
+        return value
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying one of the tags, in every worker"""
+        tag_versions = self.tag_versions
+        for tag in tags:
+            tag_versions.invalidate(tag)
@@ -1,11 +1,106 @@
-from fastapi import Request
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+import logging
+from threading import Lock
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Union
 
+from sqlalchemy import Engine, Result, Row, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+
+from app.metrics import instrument_pool
+from app.timing import get_timed_pool_class, instrument_engine
 from config import Config
 
+# Process-wide registries, keyed by database URL, so every caller shares one connection pool
+_engines: Dict[str, Engine] = {}
+_session_factories: Dict[str, sessionmaker] = {}
+_async_engines: Dict[str, AsyncEngine] = {}
+_async_session_factories: Dict[str, async_sessionmaker] = {}
+_registry_lock = Lock()
+
+# Async drivers used in place of the synchronous drivers from the configured database URL
+_ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+class SyncCompatSession:
+    """
+    Expose the awaitable AsyncSession API on top of a synchronous Session.
 
-def get_db(request: Request):
+    Used when Config.DATABASE_SYNC_COMPAT is set, so the services can await their queries while still running on the
+    synchronous driver, e.g. under tests.
+    """
+
+    def __init__(self, session: Session):  # noqa: D107
+        self.sync_session = session
+
+    @property
+    def bind(self):  # noqa: D102
+        return self.sync_session.bind
+
+    def add(self, instance: Any) -> None:  # noqa: D102
+        self.sync_session.add(instance)
+
+    def add_all(self, instances: Any) -> None:  # noqa: D102
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kwargs):  # noqa: D102
+        return self.sync_session.execute(statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):  # noqa: D102
+        return self.sync_session.scalar(statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):  # noqa: D102
+        return self.sync_session.scalars(statement, params, **kwargs)
+
+    async def stream(self, statement, params=None, execution_options=None, **kwargs):  # noqa: D102
+        execution_options = {**(execution_options or {}), 'stream_results': True}
+        return SyncCompatResult(self.sync_session.execute(statement, params, execution_options=execution_options, **kwargs))
+
+    async def get(self, entity, ident, **kwargs):  # noqa: D102
+        return self.sync_session.get(entity, ident, **kwargs)
+
+    async def merge(self, instance, **kwargs):  # noqa: D102
+        return self.sync_session.merge(instance, **kwargs)
+
+    async def refresh(self, instance, attribute_names=None, **kwargs):  # noqa: D102
+        self.sync_session.refresh(instance, attribute_names=attribute_names, **kwargs)
+
+    async def delete(self, instance) -> None:  # noqa: D102
+        self.sync_session.delete(instance)
+
+    async def flush(self, objects=None) -> None:  # noqa: D102
+        self.sync_session.flush(objects)
+
+    async def commit(self) -> None:  # noqa: D102
+        self.sync_session.commit()
+
+    async def rollback(self) -> None:  # noqa: D102
+        self.sync_session.rollback()
+
+    async def close(self) -> None:  # noqa: D102
+        self.sync_session.close()
+
+
+class SyncCompatResult:
+    """Expose the async iteration of an AsyncResult, as returned by AsyncSession.stream, on top of a synchronous Result."""
+
+    def __init__(self, result: Result):  # noqa: D107
+        self.result = result
+
+    async def partitions(self, size: Optional[int] = None) -> AsyncIterator[Sequence[Row]]:  # noqa: D102
+        for partition in self.result.partitions(size):
+            yield partition
+
+    async def __aiter__(self) -> AsyncIterator[Row]:  # noqa: D105
+        for row in self.result:
+            yield row
+
+
+DbSession = Union[AsyncSession, SyncCompatSession]
+
+
+async def get_db(request: Request) -> DbSession:
     """
     Return SQLAlchemy database session from the request state.
 
@@ -15,29 +110,170 @@ def get_db(request: Request):
     return request.state.db
 
 
-def get_db_engine(url: str = Config.SQLALCHEMY_DATABASE_URI, pool_size: int = 10):
+def get_db_engine(url: str = Config.SQLALCHEMY_DATABASE_URI, pool_size: int = Config.DATABASE_POOL_SIZE) -> Engine:
     """
-    Return SQLAlchemy database engine.
+    Return the shared SQLAlchemy database engine for the given URL.
+
+    The engine is created on first use and reused afterwards, the pool settings are only applied on creation.
 
     :param url: SQLAlchemy database URL.
     :param pool_size: Pool size for SQLAlchemy. Default 10.
     :return: SQLAlchemy database engine.
     """
-    return create_engine(
-        url=url,
-        pool_size=pool_size,  # Set pool size to 10 connections
-        max_overflow=10,  # Allow 10 connections to overflow
-        pool_timeout=10,  # In seconds
-        pool_recycle=1800,  # Adjust pool recycle to prevent stale connections
-        pool_pre_ping=True,  # Enable pre-ping to avoid using stale connections
-        echo=Config.DATABASE_DEBUG,  # Set echo to True to enable logging
-    )
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+    with _registry_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            sa_url = make_url(url)
+            engine = create_engine(
+                url=url,
+                poolclass=get_timed_pool_class(sa_url.get_dialect().get_pool_class(sa_url)),
+                pool_size=pool_size,  # Set pool size to 10 connections
+                max_overflow=Config.DATABASE_MAX_OVERFLOW,  # Allow 10 connections to overflow
+                pool_timeout=Config.DATABASE_POOL_TIMEOUT,  # In seconds
+                pool_recycle=Config.DATABASE_POOL_RECYCLE,  # Adjust pool recycle to prevent stale connections
+                pool_pre_ping=True,  # Enable pre-ping to avoid using stale connections
+                echo=Config.DATABASE_DEBUG,  # Set echo to True to enable logging
+            )
+            instrument_engine(engine)
+            instrument_pool(engine.pool, name='sync')
+            _engines[url] = engine
+            logging.debug(f'Database engine created: {engine.url!r}')
+    return engine
+
+
+def get_session_factory(url: str = Config.SQLALCHEMY_DATABASE_URI) -> sessionmaker:
+    """
+    Return the shared session factory bound to the engine for the given URL.
+
+    :param url: SQLAlchemy database URL.
+    :return: Session factory.
+    """
+    factory = _session_factories.get(url)
+    if factory is None:
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=get_db_engine(url=url))
+        _session_factories[url] = factory
+    return factory
 
 
-def get_local_session(url: str = Config.SQLALCHEMY_DATABASE_URI):
+def get_local_session(url: str = Config.SQLALCHEMY_DATABASE_URI) -> Session:
     """
     Return a local session.
 
     :return: Local session.
     """
-    return scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=get_db_engine(url=url)))
+    return get_session_factory(url=url)()
+
+
+def get_async_db_url(url: str = Config.SQLALCHEMY_DATABASE_URI) -> str:
+    """
+    Return the given database URL with its driver swapped for the matching async driver.
+
+    :param url: SQLAlchemy database URL.
+    :return: SQLAlchemy database URL using an async driver.
+    """
+    sa_url = make_url(url)
+    async_driver = _ASYNC_DRIVERS.get(sa_url.get_backend_name())
+    if async_driver is None:
+        return url
+    return sa_url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+def get_async_db_engine(url: str = Config.SQLALCHEMY_DATABASE_URI, pool_size: int = Config.DATABASE_POOL_SIZE) -> AsyncEngine:
+    """
+    Return the shared async SQLAlchemy database engine for the given URL.
+
+    :param url: SQLAlchemy database URL, the driver is swapped for its async counterpart.
+    :param pool_size: Pool size for SQLAlchemy. Default 10.
+    :return: Async SQLAlchemy database engine.
+    """
+    engine = _async_engines.get(url)
+    if engine is not None:
+        return engine
+    with _registry_lock:
+        engine = _async_engines.get(url)
+        if engine is None:
+            sa_url = make_url(get_async_db_url(url=url))
+            engine = create_async_engine(
+                url=sa_url,
+                poolclass=get_timed_pool_class(sa_url.get_dialect().get_pool_class(sa_url)),
+                pool_size=pool_size,
+                max_overflow=Config.DATABASE_MAX_OVERFLOW,
+                pool_timeout=Config.DATABASE_POOL_TIMEOUT,
+                pool_recycle=Config.DATABASE_POOL_RECYCLE,
+                pool_pre_ping=True,
+                echo=Config.DATABASE_DEBUG,
+            )
+            instrument_engine(engine.sync_engine)
+            instrument_pool(engine.sync_engine.pool, name='async')
+            _async_engines[url] = engine
+            logging.debug(f'Async database engine created: {engine.url!r}')
+    return engine
+
+
+def get_async_session_factory(url: str = Config.SQLALCHEMY_DATABASE_URI) -> async_sessionmaker:
+    """
+    Return the shared async session factory bound to the async engine for the given URL.
+
+    Objects are not expired on commit, as lazy loading an expired attribute is not possible with an async session.
+
+    :param url: SQLAlchemy database URL.
+    :return: Async session factory.
+    """
+    factory = _async_session_factories.get(url)
+    if factory is None:
+        factory = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=get_async_db_engine(url=url))
+        _async_session_factories[url] = factory
+    return factory
+
+
+def get_async_session(url: str = Config.SQLALCHEMY_DATABASE_URI) -> DbSession:
+    """
+    Return a session for the async data-access layer.
+
+    :param url: SQLAlchemy database URL.
+    :return: Async session, or a synchronous session wrapped in SyncCompatSession when in compatibility mode.
+    """
+    if Config.DATABASE_SYNC_COMPAT:
+        return SyncCompatSession(get_local_session(url=url))
+    return get_async_session_factory(url=url)()
+
+
+def get_db_pool_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Return connection pool statistics for every registered engine.
+
+    :return: Pool statistics keyed by the database URL, with the password masked.
+    """
+    stats = {}
+    engines = list(_engines.values()) + [engine.sync_engine for engine in _async_engines.values()]
+    for engine in engines:
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        stats[repr(engine.url)] = {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        }
+    return stats
+
+
+async def dispose_db_engines() -> None:
+    """Dispose every registered engine and close their pooled connections."""
+    with _registry_lock:
+        engines = list(_engines.values())
+        async_engines = list(_async_engines.values())
+        _engines.clear()
+        _session_factories.clear()
+        _async_engines.clear()
+        _async_session_factories.clear()
+    for engine in engines:
+        engine.dispose()
+        logging.debug(f'Database engine disposed: {engine.url!r}')
+    for engine in async_engines:
+        await engine.dispose()
+        logging.debug(f'Async database engine disposed: {engine.url!r}')
@@ -0,0 +1,72 @@
+import os
+from typing import Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import Pool, QueuePool
+
+# Prometheus metrics of the application. When PROMETHEUS_MULTIPROC_DIR is set, e.g. by serve.py for several workers,
+# every worker writes its values to files in that directory and the metrics endpoint aggregates them.
+MULTIPROCESS_DIR: Optional[str] = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time to handle a request, by route name', ['route', 'method', 'status'])
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled', multiprocess_mode='livesum')
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Database connections checked out of the pool', ['pool'], multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = Gauge('db_pool_overflow', 'Database connections open beyond the pool size', ['pool'], multiprocess_mode='livesum')
+PASSWORD_HASH_QUEUE_DEPTH = Gauge('password_hash_queue_depth', 'Password hash calls waiting for a free worker', multiprocess_mode='livesum')
+PASSWORD_HASH_REJECTED = Counter('password_hash_rejected', 'Password hash calls rejected as the queue was full')
+EMAIL_SEND_LATENCY = Histogram(
+    'email_send_duration_seconds', 'Time to send a batch of emails, by provider', ['provider'], buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+EMAILS_SENT = Counter('emails_sent', 'Emails handed to the provider, by result', ['provider', 'result'])
+CACHE_REQUESTS = Counter('cache_requests', 'Cache lookups, by cache and result, hit or miss', ['cache', 'result'])
+
+
+def instrument_pool(pool: Pool, name: str) -> None:
+    """
+    Keep the checked out and overflow connection gauges of a pool up to date.
+
+    :param pool: Connection pool, only a QueuePool reports its connections
+    :type pool: Pool
+    :param name: Value of the pool label, e.g. async
+    :type name: str
+    """
+    if not isinstance(pool, QueuePool):
+        return
+    checked_out_gauge = DB_POOL_CHECKED_OUT.labels(pool=name)
+    overflow_gauge = DB_POOL_OVERFLOW.labels(pool=name)
+
+    def update(checked_out: int) -> None:
+        checked_out_gauge.set(checked_out)
+        # Overflow connections are closed when they are returned to a full pool, so they match the connections beyond the pool size
+        overflow_gauge.set(max(checked_out - pool.size(), 0))
+
+    def on_checkout(*args) -> None:
+        update(pool.checkedout())
+
+    def on_checkin(*args) -> None:
+        # The event fires before the connection is returned to the pool, so it still counts as checked out
+        update(pool.checkedout() - 1)
+
+    event.listen(pool, 'checkout', on_checkout)
+    event.listen(pool, 'checkin', on_checkin)
+
+
+def render_metrics() -> bytes:
+    """
+    Render the metrics in the Prometheus text format, aggregated over every worker in multiprocess mode.
+
+    :return: Metrics
+    :rtype: bytes
+    """
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead() -> None:
+    """Remove the live gauges of the current worker, on shutdown in multiprocess mode"""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1 +1 @@
-from app.models import article, base, event, event_interest, organisation, user  # noqa: F401
+from app.models import article, base, email, event, event_interest, organisation, user  # noqa: F401
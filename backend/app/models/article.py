@@ -1,4 +1,5 @@
-from sqlalchemy import UUID, Column, DateTime, ForeignKey, String, Text
+from sqlalchemy import DDL, UUID, Column, DateTime, ForeignKey, Index, String, Text
+from sqlalchemy.event import listen
 from sqlalchemy.orm import declarative_base, relationship
 
 from app.models.base import BaseModel
@@ -10,6 +11,7 @@ class Article(BaseModel):
     """Article model for events."""
 
     __tablename__ = 'articles'
+    __table_args__ = (Index('ix_articles_event_id_published_at_id', 'event_id', 'published_at', 'id'),)
 
     title = Column(String(255), nullable=False, index=True)
     slug = Column(String(255), nullable=False, index=True)
@@ -22,3 +24,13 @@ class Article(BaseModel):
     created_by = relationship('User', back_populates='articles')
 
     published_at = Column(DateTime, nullable=True)
+
+
+# Full-text search document of an article, see EVENT_SEARCH_DOCUMENT
+ARTICLE_SEARCH_DOCUMENT = "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || setweight(to_tsvector('simple', coalesce(content, '')), 'B')"
+listen(
+    Article.__table__,
+    'after_create',
+    DDL(f'ALTER TABLE articles ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({ARTICLE_SEARCH_DOCUMENT}) STORED').execute_if(dialect='postgresql'),
+)
+listen(Article.__table__, 'after_create', DDL('CREATE INDEX ix_articles_search_vector ON articles USING gin (search_vector)').execute_if(dialect='postgresql'))
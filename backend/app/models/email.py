@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.orm import declarative_base
+
+from app.models.base import BaseModel
+
+Base = declarative_base()
+
+# Outbox email statuses
+EMAIL_STATUS_PENDING = 0
+EMAIL_STATUS_SENT = 1
+EMAIL_STATUS_FAILED = 2
+
+
+class OutboxEmail(BaseModel):
+    """Email waiting to be sent by the email outbox worker."""
+
+    __tablename__ = 'email_outbox'
+
+    to_email = Column(String(320), nullable=False)
+    from_email = Column(String(320), nullable=True)
+    subject = Column(String(998), nullable=False)
+    html_content = Column(Text, nullable=False)
+
+    # 0 = pending, 1 = sent, 2 = failed
+    status = Column(Integer, nullable=False, default=EMAIL_STATUS_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=lambda: datetime.now(tz=timezone.utc).replace(tzinfo=None))  # In UTC
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index(
+            'ix_email_outbox_next_attempt_at_pending',
+            'next_attempt_at',
+            postgresql_where=text('status = 0'),
+            sqlite_where=text('status = 0'),
+        ),
+    )
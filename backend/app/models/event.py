@@ -1,4 +1,5 @@
-from sqlalchemy import UUID, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import DDL, UUID, Column, DateTime, ForeignKey, Index, Integer, String, Text, func, text
+from sqlalchemy.event import listen
 from sqlalchemy.orm import declarative_base, relationship
 
 from app.models.base import BaseModel
@@ -10,6 +11,12 @@ class Event(BaseModel):
     """Event model."""
 
     __tablename__ = 'events'
+    __table_args__ = (
+        Index('ix_events_start_at_id', 'start_at', 'id'),
+        Index('ix_events_organisation_id_start_at_id', 'organisation_id', 'start_at', 'id'),
+        Index('ix_events_end_at', 'end_at'),
+        Index('ix_events_created_by_id_active', 'created_by_id', postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+    )
 
     title = Column(String(255), nullable=False, index=True)
     description = Column(Text, nullable=True)
@@ -38,3 +45,23 @@ class Event(BaseModel):
 
     interests = relationship('EventInterest', back_populates='event')
     articles = relationship('Article', back_populates='event')
+
+
+# Case-insensitive indexes for the city and country filters of the event list
+Index('ix_events_lower_address_city', func.lower(Event.address_city))
+Index('ix_events_lower_address_country', func.lower(Event.address_country))
+
+
+# Full-text search document of an event, weighted by field. It is stored in a generated tsvector column with a GIN index,
+# on PostgreSQL only, so the column is not mapped and the search service falls back to LIKE on other databases.
+EVENT_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(address_city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+listen(
+    Event.__table__,
+    'after_create',
+    DDL(f'ALTER TABLE events ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({EVENT_SEARCH_DOCUMENT}) STORED').execute_if(dialect='postgresql'),
+)
+listen(Event.__table__, 'after_create', DDL('CREATE INDEX ix_events_search_vector ON events USING gin (search_vector)').execute_if(dialect='postgresql'))
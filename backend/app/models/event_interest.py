@@ -1,6 +1,7 @@
-from sqlalchemy import UUID, Column, ForeignKey, Integer
+from sqlalchemy import UUID, Column, DateTime, ForeignKey, Index, Integer, func, text
 from sqlalchemy.orm import declarative_base, relationship
 
+from app.models import base
 from app.models.base import BaseModel
 
 Base = declarative_base()
@@ -10,6 +11,18 @@ class EventInterest(BaseModel):
     """Event interest model - tracks user's interest in attending an event"""
 
     __tablename__ = 'event_interests'
+    __table_args__ = (
+        Index('ix_event_interests_event_id_created_at_id', 'event_id', 'created_at', 'id'),
+        # One active interest per user and event, the conflict target of the interest upserts
+        Index(
+            'uq_event_interests_event_id_user_id_active',
+            'event_id',
+            'user_id',
+            unique=True,
+            postgresql_where=text('deleted_at IS NULL'),
+            sqlite_where=text('deleted_at IS NULL'),
+        ),
+    )
 
     event_id = Column(UUID(as_uuid=True), ForeignKey('events.id'), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
@@ -19,3 +32,19 @@ class EventInterest(BaseModel):
     # Relationships
     event = relationship('Event', back_populates='interests')
     user = relationship('User', back_populates='event_interests')
+
+
+# Columns of EventInterestCount for every interest status
+INTEREST_STATUS_COLUMNS = {0: 'not_interested', 1: 'interested', 2: 'maybe'}
+
+
+class EventInterestCount(base.Base):
+    """Number of interests per status for an event, kept up to date by the event interest services"""
+
+    __tablename__ = 'event_interest_counts'
+
+    event_id = Column(UUID(as_uuid=True), ForeignKey('events.id'), primary_key=True)
+    not_interested = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    interested = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    maybe = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import UUID, Column, ForeignKey, String, Text
+from sqlalchemy import UUID, Column, ForeignKey, Index, String, Text, text
 from sqlalchemy.orm import declarative_base, relationship
 
 from app.models.base import BaseModel
@@ -10,6 +10,10 @@ class Organisation(BaseModel):
     """Organisation model."""
 
     __tablename__ = 'organisations'
+    __table_args__ = (
+        Index('ix_organisations_created_at_id', 'created_at', 'id'),
+        Index('ix_organisations_created_by_id_active', 'created_by_id', postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+    )
 
     name = Column(String(255), nullable=False, index=True)
     description = Column(Text, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, String, UniqueConstraint
+from sqlalchemy import Column, DateTime, Index, String, UniqueConstraint, text
 from sqlalchemy.orm import declarative_base, relationship
 
 from .base import BaseModel
@@ -47,3 +47,14 @@ class Otp(BaseModel):
     email = Column(String(320), nullable=True)
     used_at = Column(DateTime)
     expires_at = Column(DateTime)
+
+    __table_args__ = (
+        Index(
+            'ix_otp_email_used_at_expires_at_active',
+            'email',
+            'used_at',
+            'expires_at',
+            postgresql_where=text('deleted_at IS NULL'),
+            sqlite_where=text('deleted_at IS NULL'),
+        ),
+    )
@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Iterator, List, Optional, Type
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+
+class RequestTimings:
+    """Time spent by a request in the database, waiting for a connection and serializing, collected by RequestTimingMiddleware"""
+
+    __slots__ = ('db_secs', 'pool_wait_secs', 'queries', 'serialization_secs', 'started_at')
+
+    def __init__(self):  # noqa: D107
+        self.started_at = perf_counter()
+        self.db_secs = 0.0
+        self.pool_wait_secs = 0.0
+        self.queries = 0
+        self.serialization_secs = 0.0
+
+    @property
+    def total_secs(self) -> float:  # noqa: D102
+        return perf_counter() - self.started_at
+
+    def server_timing(self) -> str:
+        """
+        Format the timings as a Server-Timing header, durations are in milliseconds.
+
+        :return: Header value, e.g. total;dur=12.1, db;dur=4.2;desc="3 queries", pool;dur=0.0, serialize;dur=1.3
+        """
+        return (
+            f'total;dur={self.total_secs * 1000:.1f}, db;dur={self.db_secs * 1000:.1f};desc="{self.queries} queries", '
+            f'pool;dur={self.pool_wait_secs * 1000:.1f}, serialize;dur={self.serialization_secs * 1000:.1f}'
+        )
+
+
+# Timings of the request being handled, None outside of a request, e.g. in the background tasks
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def collect_request_timings() -> Iterator[RequestTimings]:
+    """
+    Collect the timings of the queries and serialization inside the block, for the current context.
+
+    Usage:
+    with collect_request_timings() as timings:
+        await get_events(db=db)
+    print(timings.server_timing())
+    """
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def record_serialization(secs: float) -> None:
+    """Add time spent serializing a response to the timings of the current request"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.serialization_secs += secs
+
+
+def _before_cursor_execute(conn, *args) -> None:
+    conn.info.setdefault('query_started_at', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, *args) -> None:
+    started_at: List[float] = conn.info.get('query_started_at')
+    if not started_at:
+        return
+    duration = perf_counter() - started_at.pop()
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.db_secs += duration
+        timings.queries += 1
+
+
+def _handle_error(context) -> None:
+    started_at = context.connection.info.get('query_started_at') if context.connection is not None else None
+    if started_at:
+        started_at.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Record the time and number of queries of every request on an engine.
+
+    :param engine: Engine, the sync_engine of an async engine
+    :type engine: Engine
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+class _TimedPoolMixin:
+    """Record the time a request waits for a connection from the pool, including the time to open a new connection"""
+
+    def _do_get(self) -> Any:
+        started_at = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            timings = _current_timings.get()
+            if timings is not None:
+                timings.pool_wait_secs += perf_counter() - started_at
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool recording the wait for a connection"""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool recording the wait for a connection"""
+
+
+_TIMED_POOLS = {QueuePool: TimedQueuePool, AsyncAdaptedQueuePool: TimedAsyncAdaptedQueuePool}
+
+
+def get_timed_pool_class(pool_class: Type[Pool]) -> Type[Pool]:
+    """Get the timed counterpart of a pool class, other pools, e.g. for an in-memory SQLite database, are returned as is"""
+    return _TIMED_POOLS.get(pool_class, pool_class)
@@ -6,6 +6,7 @@ from app.v3.auth import endpoints as auth_endpoints
 from app.v3.event_interests import endpoints as event_interests_endpoints
 from app.v3.events import endpoints as events_endpoints
 from app.v3.organisations import endpoints as organisations_endpoints
+from app.v3.search import endpoints as search_endpoints
 from app.v3.system import endpoints as system_endpoints
 from app.v3.user import endpoints as user_endpoints
 
@@ -20,4 +21,5 @@ router.include_router(organisations_endpoints.router, tags=['organisations'], pr
 router.include_router(events_endpoints.router, tags=['events'], prefix='/events')
 router.include_router(event_interests_endpoints.router, tags=['event interests'])
 router.include_router(articles_endpoints.router, tags=['event articles'])
+router.include_router(search_endpoints.router, tags=['search'], prefix='/search')
 router.include_router(system_endpoints.router, tags=['system'], prefix='/system')  # Should be last
@@ -1,11 +1,10 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
 
-from app.dependencies import get_db
+from app.dependencies import DbSession, get_db
 from app.models.user import User
 from app.v3.articles.schemas import ArticleCreate, ArticleResponse, ArticleUpdate
 from app.v3.articles.service import (
@@ -16,6 +15,7 @@ from app.v3.articles.service import (
     update_article,
 )
 from app.v3.auth.utils import get_current_user
+from app.v3.responses import ConditionalRequest, get_conditional_request
 
 router = APIRouter()
 
@@ -26,10 +26,10 @@ router = APIRouter()
     response_model=ArticleResponse,
 )
 async def post_create_article(
-    event_id: UUID, article_data: ArticleCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    event_id: UUID, article_data: ArticleCreate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Create a new article"""
-    return create_article(db=db, event_id=event_id, current_user=current_user, article_data=article_data)
+    return await create_article(db=db, event_id=event_id, current_user=current_user, article_data=article_data)
 
 
 @router.get(
@@ -37,9 +37,16 @@ async def post_create_article(
     name='EA-2',
     response_model=List[ArticleResponse],
 )
-async def get_articles_list(event_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_articles_list(  # noqa: PLR0913
+    event_id: UUID,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    conditional: ConditionalRequest = Depends(get_conditional_request),
+    db: DbSession = Depends(get_db),
+) -> JSONResponse:
     """Get published articles for an event"""
-    return get_articles(db=db, event_id=event_id, skip=skip, limit=limit)
+    return await get_articles(db=db, event_id=event_id, skip=skip, limit=limit, cursor=cursor, conditional=conditional)
 
 
 @router.get(
@@ -47,9 +54,11 @@ async def get_articles_list(event_id: UUID, skip: int = 0, limit: int = 100, db:
     name='EA-3',
     response_model=ArticleResponse,
 )
-async def get_article_by_id(event_id: UUID, article_id: UUID, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_article_by_id(
+    event_id: UUID, article_id: UUID, conditional: ConditionalRequest = Depends(get_conditional_request), db: DbSession = Depends(get_db)
+) -> JSONResponse:
     """Get article by ID"""
-    return get_article(db=db, event_id=event_id, article_id=article_id)
+    return await get_article(db=db, event_id=event_id, article_id=article_id, conditional=conditional)
 
 
 @router.put(
@@ -58,19 +67,21 @@ async def get_article_by_id(event_id: UUID, article_id: UUID, db: Session = Depe
     response_model=ArticleResponse,
 )
 async def put_update_article(
-    event_id: UUID, article_id: UUID, article_data: ArticleUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    event_id: UUID, article_id: UUID, article_data: ArticleUpdate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Update article"""
-    return update_article(db=db, event_id=event_id, article_id=article_id, current_user=current_user, article_data=article_data)
+    return await update_article(db=db, event_id=event_id, article_id=article_id, current_user=current_user, article_data=article_data)
 
 
 @router.delete(
     '/events/{event_id}/articles/{article_id}',
     name='EA-5',
 )
-async def delete_article_by_id(event_id: UUID, article_id: UUID, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def delete_article_by_id(
+    event_id: UUID, article_id: UUID, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
+) -> JSONResponse:
     """Delete article"""
-    return delete_article(db=db, event_id=event_id, article_id=article_id, current_user=current_user)
+    return await delete_article(db=db, event_id=event_id, article_id=article_id, current_user=current_user)
 
 
 @router.get(
@@ -78,6 +89,6 @@ async def delete_article_by_id(event_id: UUID, article_id: UUID, current_user: U
     name='EA-6',
     response_model=List[ArticleResponse],
 )
-async def get_all_articles(event_id: UUID, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_all_articles(event_id: UUID, db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get all articles for an event"""
     return get_all_articles(db=db, event_id=event_id)
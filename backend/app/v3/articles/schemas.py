@@ -4,7 +4,7 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
-from app.v3.auth.schemas import UserResponse
+from app.v3.auth.schemas import UserPublicResponse
 
 
 class ArticleBase(BaseModel):
@@ -33,7 +33,7 @@ class ArticleResponse(ArticleBase):
 
     id: UUID
     event_id: UUID
-    created_by: UserResponse
+    created_by: UserPublicResponse
     created_at: datetime
     updated_at: datetime
     deleted_at: Optional[datetime]
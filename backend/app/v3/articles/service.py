@@ -1,89 +1,125 @@
 import logging
+from typing import Optional
 
-from pydantic import TypeAdapter
 from pydantic.v1 import UUID4
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 from tunsberg.responses import (
     response_bad_request,
     response_conflict,
-    response_created,
     response_no_content,
     response_not_found,
-    response_success,
 )
 
+from app.dependencies import DbSession
 from app.models.article import Article
 from app.models.event import Event
 from app.models.user import User
 from app.v3.articles.schemas import ArticleCreate, ArticleResponse, ArticleUpdate
+from app.v3.loaders import select_for
+from app.v3.responses import (
+    ConditionalRequest,
+    build_cached_response,
+    get_last_modified,
+    get_serializer,
+    response_cache,
+    response_cacheable,
+    response_created,
+    response_success,
+)
+from app.v3.utils import get_keyset_page, paginate_keyset
+
+article_serializer = get_serializer(ArticleResponse)
+articles_serializer = get_serializer(list[ArticleResponse])
+
+# Sort key for paginated article lists, newest first, matches the ix_articles_event_id_published_at_id index
+ARTICLES_SORT_KEY = (Article.published_at, Article.id)
+
+
+def select_articles():
+    """Select articles together with the relationships serialized by ArticleResponse"""
+    return select_for(Article, ArticleResponse)
+
 
+async def _reload_article(db: DbSession, article: Article) -> Article:
+    """Reload an article after commit, including server generated columns and its relationships"""
+    return await db.scalar(select_articles().where(Article.id == article.id).execution_options(populate_existing=True))
 
-def create_article(db: Session, event_id: UUID4, current_user: User, article_data: ArticleCreate):
+
+async def _event_exists(db: DbSession, event_id: UUID4) -> bool:
+    """Check if an event exists"""
+    return await db.scalar(select(Event.id).where(Event.id == event_id).limit(1)) is not None
+
+
+async def create_article(db: DbSession, event_id: UUID4, current_user: User, article_data: ArticleCreate):
     """Create a new article"""
     # Check if event exists
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
+    if not await _event_exists(db=db, event_id=event_id):
         return response_bad_request(message='Event not found')
 
     try:
         article = Article(**article_data.model_dump(), created_by_id=current_user.id, event_id=event_id)
         db.add(article)
-        db.commit()
-        db.refresh(article)
+        await db.commit()
+        article = await _reload_article(db=db, article=article)
+        response_cache.invalidate(f'articles:{event_id}')
 
-        adapter = TypeAdapter(ArticleResponse)
-        return response_created(message='Article created', data=adapter.dump_json(article))
+        return response_created(message='Article created', data=article_serializer.dump_json(article))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error creating article: {e}')
         return response_conflict(message='Error creating article')
 
 
-def get_articles(db: Session, event_id: UUID4, skip: int = 0, limit: int = 100):
+async def get_articles(  # noqa: PLR0913
+    db: DbSession, event_id: UUID4, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, conditional: Optional[ConditionalRequest] = None
+):
     """Get published articles for an event"""
-    # Check if event exists
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
-        return response_bad_request(message='Event not found')
+    key = ('articles', str(event_id), skip, limit, cursor)
+    cached = response_cache.get(key)
+    if cached is None:
+        tags = [f'articles:{event_id}', f'event:{event_id}']
+        versions = response_cache.versions(tags)
+        # Check if event exists
+        if not await _event_exists(db=db, event_id=event_id):
+            return response_bad_request(message='Event not found')
 
-    articles = (
-        db.query(Article)
-        .filter(Article.event_id == event_id, Article.deleted_at.is_(None), Article.published_at.isnot(None))
-        .order_by(Article.published_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+        query = select_articles().where(Article.event_id == event_id, Article.deleted_at.is_(None), Article.published_at.isnot(None))
+        query = paginate_keyset(query, columns=ARTICLES_SORT_KEY, limit=limit, cursor=cursor, skip=skip, descending=True)
+        articles, pagination = get_keyset_page((await db.scalars(query)).all(), columns=ARTICLES_SORT_KEY, limit=limit)
+        cached = build_cached_response('Articles retrieved', articles_serializer, articles, last_modified=get_last_modified(articles), pagination=pagination)
+        response_cache.set(key, cached, tags=tags, versions=versions)
 
-    adapter = TypeAdapter(list[ArticleResponse])
-    data = adapter.dump_json(articles)
-    return response_success(message='Articles retrieved', data=data)
+    return response_cacheable(conditional, cached)
 
 
-def get_article(db: Session, event_id: UUID4, article_id: UUID4):
+async def get_article(db: DbSession, event_id: UUID4, article_id: UUID4, conditional: Optional[ConditionalRequest] = None):
     """Get article by ID"""
-    # Check if event exists
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
-        return response_bad_request(message='Event not found')
+    key = ('article', str(event_id), str(article_id))
+    cached = response_cache.get(key)
+    if cached is None:
+        tags = [f'article:{article_id}', f'event:{event_id}']
+        versions = response_cache.versions(tags)
+        # Check if event exists
+        if not await _event_exists(db=db, event_id=event_id):
+            return response_bad_request(message='Event not found')
 
-    article = db.query(Article).filter(Article.id == article_id, Article.event_id == event_id, Article.deleted_at.is_(None)).first()
-    if not article:
-        return response_not_found(message='Article not found')
+        article = await db.scalar(select_articles().where(Article.id == article_id, Article.event_id == event_id, Article.deleted_at.is_(None)).limit(1))
+        if not article:
+            return response_not_found(message='Article not found')
+        cached = build_cached_response('Article retrieved', article_serializer, article, last_modified=get_last_modified([article]))
+        response_cache.set(key, cached, tags=tags, versions=versions)
 
-    adapter = TypeAdapter(ArticleResponse)
-    return response_success(message='Article retrieved', data=adapter.dump_json(article))
+    return response_cacheable(conditional, cached)
 
 
-def update_article(db: Session, event_id: UUID4, article_id: UUID4, current_user: User, article_data: ArticleUpdate):
+async def update_article(db: DbSession, event_id: UUID4, article_id: UUID4, current_user: User, article_data: ArticleUpdate):
     """Update article"""
     # Check if event exists
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
+    if not await _event_exists(db=db, event_id=event_id):
         return response_bad_request(message='Event not found')
 
-    article = db.query(Article).filter(Article.id == article_id, Article.deleted_at.is_(None)).first()
+    article = await db.scalar(select(Article).where(Article.id == article_id, Article.deleted_at.is_(None)).limit(1))
     if not article:
         return response_not_found(message='Article not found')
 
@@ -91,36 +127,35 @@ def update_article(db: Session, event_id: UUID4, article_id: UUID4, current_user
         for field, value in article_data.model_dump(exclude_unset=True).items():
             setattr(article, field, value)
 
-        db.commit()
-        db.refresh(article)
+        await db.commit()
+        response_cache.invalidate(f'articles:{article.event_id}', f'article:{article.id}')
+        article = await _reload_article(db=db, article=article)
 
-        adapter = TypeAdapter(ArticleResponse)
-        return response_success(message='Article updated', data=adapter.dump_json(article))
+        return response_success(message='Article updated', data=article_serializer.dump_json(article))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error updating article: {e}')
         return response_conflict(message='Error updating article')
 
 
-def delete_article(db: Session, event_id: UUID4, article_id: UUID4, current_user: User):
+async def delete_article(db: DbSession, event_id: UUID4, article_id: UUID4, current_user: User):
     """Delete article"""
-    article = db.query(Article).filter(Article.id == article_id, Article.event_id == event_id, Article.deleted_at.is_(None)).first()
+    article = await db.scalar(select(Article).where(Article.id == article_id, Article.event_id == event_id, Article.deleted_at.is_(None)).limit(1))
     if not article:
         return response_not_found(message='Article not found')
 
     try:
-        db.delete(article)
-        db.commit()
+        await db.delete(article)
+        await db.commit()
+        response_cache.invalidate(f'articles:{event_id}', f'article:{article_id}')
         return response_no_content()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error deleting article: {e}')
         return response_bad_request(message='Could not delete article')
 
 
-def get_all_articles(db: Session, event_id: UUID4):
+async def get_all_articles(db: DbSession, event_id: UUID4):
     """Get all articles for an event"""
-    articles = db.query(Article).filter(Article.event_id == event_id, Article.deleted_at.is_(None)).all()
-    adapter = TypeAdapter(list[ArticleResponse])
-    data = adapter.dump_json(articles)
-    return response_success(message='Articles retrieved', data=data)
+    articles = (await db.scalars(select_articles().where(Article.event_id == event_id, Article.deleted_at.is_(None)))).all()
+    return response_success(message='Articles retrieved', data=articles_serializer.dump_json(articles))
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Optional
+
+from passlib.context import CryptContext
+from starlette import status
+
+from app.metrics import PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+from app.v3.utils import CustomExceptionError
+from config import Config
+
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+
+def _hash_password(password: str) -> str:
+    """Hash a password, runs inside the executor"""
+    return pwd_context.hash(password)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash, runs inside the executor"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHashExecutor:
+    """
+    Bounded executor for the CPU heavy bcrypt calls, so they do not block the event loop.
+
+    Calls beyond the number of workers wait in a queue, when the queue is full the call is rejected with a 503, so a
+    burst of logins fails fast instead of stalling every other request on the worker.
+    """
+
+    def __init__(self, executor_type: str, max_workers: int, max_queue: int):  # noqa: D107
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._lock = Lock()
+        self._in_flight = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._seconds_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        """Create the executor on first use"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_type == 'process':
+                        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+                    logging.debug(f'Password hash executor created: {self.executor_type} with {self.max_workers} workers')
+        return self._executor
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run a hashing function in the executor.
+
+        :param fn: Module level function to run, it must be picklable for the process executor
+        :param args: Arguments for the function
+        :return: The return value of the function
+        :raises CustomExceptionError: When the queue is full
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                PASSWORD_HASH_REJECTED.inc()
+                raise CustomExceptionError(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, message='Server is busy, please try again shortly.')
+            self._in_flight += 1
+            self._submitted += 1
+            PASSWORD_HASH_QUEUE_DEPTH.set(self.queue_depth)
+        start = perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._seconds_total += perf_counter() - start
+                PASSWORD_HASH_QUEUE_DEPTH.set(self.queue_depth)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a free worker"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def stats(self) -> Dict[str, float]:
+        """Return the executor metrics"""
+        return {
+            'workers': self.max_workers,
+            'in_flight': self._in_flight,
+            'queue_depth': self.queue_depth,
+            'submitted': self._submitted,
+            'rejected': self._rejected,
+            'seconds_total': self._seconds_total,
+        }
+
+    def shutdown(self) -> None:
+        """Shut down the executor, waiting for running calls to finish"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+password_hasher = PasswordHashExecutor(
+    executor_type=Config.PASSWORD_HASH_EXECUTOR,
+    max_workers=Config.PASSWORD_HASH_WORKERS,
+    max_queue=Config.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the password hash executor"""
+    return await password_hasher.run(_hash_password, password)
+
+
+async def verify_password_hash(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash in the password hash executor"""
+    return await password_hasher.run(_verify_password, plain_password, hashed_password)
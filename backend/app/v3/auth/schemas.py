@@ -143,6 +143,18 @@ class UserResponse(UserBase):
         orm_mode = True  # Enables compatibility with SQLAlchemy models
 
 
+class UserPublicResponse(BaseModel):
+    """Public user model, e.g. the author of an event or article, without contact details or credentials"""
+
+    id: UUID
+    name: str
+
+    class Config:
+        """Pydantic config"""
+
+        orm_mode = True
+
+
 class A10Input(BaseModel):
     """Input model for resending OTP"""
 
@@ -3,20 +3,17 @@ from datetime import datetime, timedelta, timezone
 
 import jwt
 import pyotp
-from pydantic import TypeAdapter
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 from tunsberg.responses import (
     response_bad_request,
     response_conflict,
-    response_created,
     response_internal_server_error,
     response_not_found,
-    response_success,
     response_unauthorized,
 )
 
+from app.dependencies import DbSession
 from app.models.user import Otp, User
 from app.v3.auth.schemas import (
     A1Input,
@@ -38,28 +35,34 @@ from app.v3.auth.utils import (
     create_user_tokens,
     format_email_from_input,
     get_hashed_password,
+    get_signing_key,
     get_user_by_email,
     get_user_id_from_token,
+    invalidate_cached_user_record,
     validate_token,
     verify_password,
     verify_reset_token,
 )
-from app.v3.utils import get_avatar_url, get_portal_url, send_email
+from app.v3.mailer import email_outbox, queue_email
+from app.v3.responses import get_serializer, response_created, response_success
+from app.v3.utils import get_avatar_url, get_portal_url
 from config import Config
 
+user_serializer = get_serializer(UserResponse)
 
-def signup_generate_otp(request_data: A1Input, db: Session):
+
+async def signup_generate_otp(request_data: A1Input, db: DbSession):
     """Start signup by generating an OTP"""
     # Check if the user already exists
-    user = db.query(User).filter(User.email == request_data.email, User.email_verified_at.is_(None)).first()
+    user = await db.scalar(select(User).where(User.email == request_data.email, User.email_verified_at.is_(None)).limit(1))
     if user:
         return response_conflict(message='User with the email already exists')
 
     # Check if the user already has an OTP that has not been used and has not expired
-    otp = (
-        db.query(Otp)
-        .filter(Otp.email == request_data.email, Otp.used_at.is_(None), Otp.expires_at > datetime.now(tz=timezone.utc), Otp.deleted_at.is_(None))
-        .first()
+    otp = await db.scalar(
+        select(Otp)
+        .where(Otp.email == request_data.email, Otp.used_at.is_(None), Otp.expires_at > datetime.now(tz=timezone.utc), Otp.deleted_at.is_(None))
+        .limit(1)
     )
     if otp:
         return response_conflict(message='User with the email already has an OTP that has not been used and has not expired')
@@ -75,28 +78,22 @@ def signup_generate_otp(request_data: A1Input, db: Session):
     )
     try:
         db.add(otp)
-        db.commit()
+        # Send the OTP via email, the email is stored with the OTP and sent by the email outbox worker
+        queue_email(db=db, to=request_data.email, subject='OTP for account verification', html_content=f'Your OTP is: {otp.code}')
+        await db.commit()
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error creating OTP: {e}')
         return response_internal_server_error(message='Could not generate OTP. Please contact support!')
-
-    # Send the OTP via email
-    email_sent = send_email(
-        to=request_data.email,
-        subject='OTP for account verification',
-        html_content=f'Your OTP is: {otp.code}',
-    )
-    if not email_sent:
-        return response_internal_server_error(message='Could not send OTP. Please contact support!')
+    email_outbox.wake()
 
     return response_success(message='An OTP has been sent to your email')
 
 
-def signup_verify_otp(request_data: A2Input, db: Session):
+async def signup_verify_otp(request_data: A2Input, db: DbSession):
     """Verify an OTP"""
     # Check if the user already exists
-    user = db.query(User).filter(User.email == request_data.email, User.email_verified_at.is_(None)).first()
+    user = await db.scalar(select(User).where(User.email == request_data.email, User.email_verified_at.is_(None)).limit(1))
     if user:
         return response_conflict(message='User with the email already exists')
 
@@ -104,16 +101,16 @@ def signup_verify_otp(request_data: A2Input, db: Session):
     logging.debug(f'Code: {request_data.code}')
 
     # Get the OTP
-    otp = (
-        db.query(Otp)
-        .filter(
+    otp = await db.scalar(
+        select(Otp)
+        .where(
             Otp.email == request_data.email,
             Otp.code == request_data.code,
             Otp.used_at.is_(None),
             Otp.expires_at > datetime.now(tz=timezone.utc),
             Otp.deleted_at.is_(None),
         )
-        .first()
+        .limit(1)
     )
     if not otp:
         return response_bad_request(message='Invalid code or it has expired, please request a new OTP')
@@ -121,16 +118,16 @@ def signup_verify_otp(request_data: A2Input, db: Session):
     # Mark the OTP as used
     try:
         otp.used_at = datetime.now(tz=timezone.utc)
-        db.commit()
+        await db.commit()
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error updating OTP: {e}')
         return response_internal_server_error(message='Could not verify OTP. Please contact support!')
 
     return response_success(message='OTP verified')
 
 
-def signup_details(request_data: A3Input, db: Session):
+async def signup_details(request_data: A3Input, db: DbSession):
     """Signup details for a user"""
     # Build filter conditions based on the request data
     filter_conditions = [User.email == request_data.email]
@@ -139,12 +136,12 @@ def signup_details(request_data: A3Input, db: Session):
 
     # Query for user
     # This query checks if a user exists with either the given email or phone number if provided
-    user = db.query(User).filter(or_(*filter_conditions), User.deleted_at.is_(None)).first()
+    user = await db.scalar(select(User).where(or_(*filter_conditions), User.deleted_at.is_(None)).limit(1))
     if user:
         return response_conflict(message='User with the email or phone number already exists')
 
     # Verify that the user has validated an OTP for the email
-    otp = db.query(Otp).filter(Otp.email == request_data.email, Otp.used_at.isnot(None), Otp.deleted_at.is_(None)).first()
+    otp = await db.scalar(select(Otp).where(Otp.email == request_data.email, Otp.used_at.isnot(None), Otp.deleted_at.is_(None)).limit(1))
     if not otp:
         return response_bad_request(message='Please verify your email with the OTP sent to your email')
 
@@ -154,7 +151,7 @@ def signup_details(request_data: A3Input, db: Session):
         phone_code=request_data.phone_code,
         phone_number=request_data.phone_number,
         email=request_data.email,
-        password=get_hashed_password(request_data.password),
+        password=await get_hashed_password(request_data.password),
         photo_url=get_avatar_url(request_data.name),
         referrer=request_data.referrer,
         terms_of_service_accepted_at=datetime.now(tz=timezone.utc),
@@ -162,21 +159,19 @@ def signup_details(request_data: A3Input, db: Session):
     )
     try:
         db.add(user)
-        db.commit()
+        await db.commit()
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error creating user profile: {e}')
         return response_internal_server_error(message='Could not create user using these details. Please contact support!')
 
     # Return the user
-    adapter = TypeAdapter(UserResponse)
-    returned_user = adapter.dump_json(user)
-    return response_created(message='User registration successful', data=returned_user)
+    return response_created(message='User registration successful', data=user_serializer.dump_json(user))
 
 
-def login(request_data: A4Input, db: Session):
+async def login(request_data: A4Input, db: DbSession):
     """User login"""
-    user = authenticate_user(email=request_data.email, password=request_data.password, db=db)
+    user = await authenticate_user(email=request_data.email, password=request_data.password, db=db)
     if not user:
         return response_bad_request(message='Invalid credentials')
     try:
@@ -184,7 +179,8 @@ def login(request_data: A4Input, db: Session):
         access_token = tokens.get('access_token')
         refresh_token = tokens.get('refresh_token')
         user.refresh_token = refresh_token
-        db.commit()
+        await db.commit()
+        invalidate_cached_user_record(user.id)
     except Exception as e:
         logging.error(f'Error creating tokens: {e}')
         return response_internal_server_error(message='Could not create tokens. Please contact support!')
@@ -192,13 +188,13 @@ def login(request_data: A4Input, db: Session):
     return response_success(message='Login successful', data=token)
 
 
-def post_refresh_token(request_data: A6Input, db: Session):
+async def post_refresh_token(request_data: A6Input, db: DbSession):
     """Get refresh token"""
     payload = validate_token(request_data.refresh_token)
     if not payload:
         return response_unauthorized(message='Invalid token')
     user_id: int = payload.get('sub')
-    user = db.query(User).filter_by(id=user_id).one_or_none()
+    user = (await db.scalars(select(User).filter_by(id=user_id))).one_or_none()
     if user and user.refresh_token != request_data.refresh_token:
         return response_unauthorized(message='Please log in again!')
 
@@ -209,68 +205,75 @@ def post_refresh_token(request_data: A6Input, db: Session):
     return response_success(message='Token refreshed', data=data)
 
 
-def logout(current_user, token, db: Session):
+async def logout(current_user, token, db: DbSession):
     """Logout"""
     current_user.refresh_token = None
 
-    payload = jwt.decode(token, Config.JWT_PUBLIC_KEY, algorithms=[Config.JWT_ALGORITHM])
+    # Copy the payload, as the verified payload is shared with the token cache
+    payload = dict(validate_token(token))
     payload['exp'] = datetime.now(tz=timezone.utc) - timedelta(seconds=60)
-    encoded_jwt = jwt.encode(payload, Config.JWT_PRIVATE_KEY, algorithm=Config.JWT_ALGORITHM)
+    encoded_jwt = jwt.encode(payload, get_signing_key(), algorithm=Config.JWT_ALGORITHM)
 
     db.add(current_user)
-    db.commit()
+    await db.commit()
+    invalidate_cached_user_record(current_user.id)
     expired_token = A6Output(access_token=encoded_jwt, token_type='bearer').model_dump()
 
     return response_success(message='Logout successful', data=expired_token)
 
 
-def password_change(request_data: A7Input, current_user, db: Session):
+async def password_change(request_data: A7Input, current_user, db: DbSession):
     """Change Password"""
-    if not verify_password(plain_password=request_data.old_password, hashed_password=current_user.password):
+    # The user may come from the user cache, verify the old password against the hash in the database
+    await db.refresh(current_user)
+    if not await verify_password(plain_password=request_data.old_password, hashed_password=current_user.password):
         return response_bad_request(message='The password does not match with the current password')
 
     if request_data.password != request_data.password_confirmation:
         return response_bad_request(message='The new password fields do not match')
 
-    if verify_password(plain_password=request_data.password, hashed_password=current_user.password):
+    # The old password matches the current hash, so comparing against it avoids a second bcrypt round
+    if request_data.password.get_secret_value() == request_data.old_password.get_secret_value():
         return response_bad_request(message='The new password cannot be the same as the current password')
 
     if len(request_data.password) < Config.PASSWORD_MIN_LENGTH:
         return response_bad_request(message=f'Password must be at least {Config.PASSWORD_MIN_LENGTH} characters long')
 
-    current_user.password = get_hashed_password(request_data.password)
-    db.commit()
+    current_user.password = await get_hashed_password(request_data.password)
+    await db.commit()
+    invalidate_cached_user_record(current_user.id)
     return response_success(message='Password successfully changed')
 
 
-def password_forgot(request_data, db):
+async def password_forgot(request_data, db: DbSession):
     """Forgot password"""
     email = format_email_from_input(request_data.email)
-    user = get_user_by_email(email=email, db=db)
+    user = await get_user_by_email(email=email, db=db)
     if not user:
         return response_not_found(message='User not found')
 
     # Send email
     reset_token = create_reset_token(user=user)
-    email_sent = send_email(
+    queue_email(
+        db=db,
         to=email,
         subject='Password reset link',
         html_content=f'Your password reset link is: {get_portal_url(path=f"/auth/reset-password?reset_token={reset_token}")}',
     )
-    if not email_sent:
-        return response_internal_server_error(message='Could not send email. Please contact support!')
+    await db.commit()
+    email_outbox.wake()
 
     return response_success(message='Password reset link sent to your email')
 
 
-def password_reset(request_data: A9Input, db: Session):
+async def password_reset(request_data: A9Input, db: DbSession):
     """Reset Password"""
     reset_token_verified = verify_reset_token(request_data.reset_token)
     if not reset_token_verified:
         return response_bad_request(message='Invalid or expired token, please request a new one')
 
     user_id = get_user_id_from_token(request_data.reset_token)
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id).limit(1))
     if not user:
         return response_not_found(message='User not found')
 
@@ -280,24 +283,25 @@ def password_reset(request_data: A9Input, db: Session):
     if len(request_data.password) < Config.PASSWORD_MIN_LENGTH:
         return response_bad_request(message=f'Password must be at least {Config.PASSWORD_MIN_LENGTH} characters long')
 
-    user.password = get_hashed_password(request_data.password)
-    db.commit()
+    user.password = await get_hashed_password(request_data.password)
+    await db.commit()
+    invalidate_cached_user_record(user.id)
     return response_success(message='Password successfully reset')
 
 
-def resend_otp(request_data: A10Input, db: Session):
+async def resend_otp(request_data: A10Input, db: DbSession):
     """Resend OTP to user's email"""
     # Check if there's an existing unused and unexpired OTP
-    otp = (
-        db.query(Otp)
-        .filter(Otp.email == request_data.email, Otp.used_at.is_(None), Otp.expires_at > datetime.now(tz=timezone.utc), Otp.deleted_at.is_(None))
-        .first()
+    otp = await db.scalar(
+        select(Otp)
+        .where(Otp.email == request_data.email, Otp.used_at.is_(None), Otp.expires_at > datetime.now(tz=timezone.utc), Otp.deleted_at.is_(None))
+        .limit(1)
     )
 
     if otp:
         # Invalidate the existing OTP
         otp.soft_delete()
-        db.commit()
+        await db.commit()
 
     # Generate new OTP
     generated_otp = pyotp.TOTP(s=Config.OTP_SECRET_KEY, digits=Config.OTP_DIGITS, issuer=Config.MICRO_SERVICE_NAME, name=request_data.email)
@@ -310,19 +314,13 @@ def resend_otp(request_data: A10Input, db: Session):
     )
     try:
         db.add(new_otp)
-        db.commit()
+        # Send the OTP via email, the email is stored with the OTP and sent by the email outbox worker
+        queue_email(db=db, to=request_data.email, subject='OTP for account verification', html_content=f'Your OTP is: {new_otp.code}')
+        await db.commit()
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error creating OTP: {e}')
         return response_internal_server_error(message='Could not generate OTP. Please contact support!')
-
-    # Send the OTP via email
-    email_sent = send_email(
-        to=request_data.email,
-        subject='OTP for account verification',
-        html_content=f'Your OTP is: {new_otp.code}',
-    )
-    if not email_sent:
-        return response_internal_server_error(message='Could not send OTP. Please contact support!')
+    email_outbox.wake()
 
     return response_success(message='A new OTP has been sent to your email')
@@ -2,22 +2,33 @@ import logging
 import secrets
 import string
 from datetime import datetime, timedelta, timezone
-from typing import Dict
+from functools import lru_cache
+from typing import Any, Dict
+from uuid import UUID
 
 import jwt
 from fastapi import Depends, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from passlib.context import CryptContext
 from pydantic import SecretStr
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import make_transient_to_detached
 from starlette import status
 
-from app.dependencies import get_db
+from app.cache import CacheBackend, TaggedCache, TTLCache
+from app.dependencies import DbSession, get_db
 from app.models.user import User
+from app.v3.auth.hashing import hash_password, verify_password_hash
 from app.v3.utils import CustomExceptionError
 from config import Config
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# Verified token payloads, kept until the token expires, so repeated calls with the same token skip the RSA verification.
+# Access tokens cannot be revoked before they expire, so caching the payload per worker does not extend what a token
+# grants, the state of the user behind the token is kept in _user_cache.
+_verified_tokens = TTLCache(max_size=Config.JWT_CACHE_MAX_SIZE, ttl=Config.JWT_CACHE_TTL_SECS, name='jwt')
+
+# Column values of the users resolved by get_current_user, keyed by user ID. Invalidating a user drops the cached record
+# on every worker of the host, see TaggedCache.
+_user_cache = TaggedCache(TTLCache(max_size=Config.USER_CACHE_MAX_SIZE, ttl=Config.USER_CACHE_TTL_SECS), name='user')
 
 
 def generate_random_password(length: int = Config.PASSWORD_MIN_LENGTH) -> SecretStr:
@@ -29,6 +40,18 @@ def generate_random_password(length: int = Config.PASSWORD_MIN_LENGTH) -> Secret
     return SecretStr(''.join(secrets.choice(alphabet) for _ in range(length)))
 
 
+@lru_cache(maxsize=1)
+def get_signing_key() -> Any:
+    """Get Config.JWT_PRIVATE_KEY parsed once, loading an RSA key validates it, which takes longer than signing a token"""
+    return jwt.get_algorithm_by_name(Config.JWT_ALGORITHM).prepare_key(Config.JWT_PRIVATE_KEY)
+
+
+@lru_cache(maxsize=1)
+def get_verification_key() -> Any:
+    """Get Config.JWT_PUBLIC_KEY parsed once"""
+    return jwt.get_algorithm_by_name(Config.JWT_ALGORITHM).prepare_key(Config.JWT_PUBLIC_KEY)
+
+
 def create_user_tokens(user: User) -> Dict[str, str]:
     """
     Create access and refresh tokens for the user.
@@ -51,9 +74,9 @@ def create_user_tokens(user: User) -> Dict[str, str]:
     return {'access_token': access_token, 'refresh_token': refresh_token}
 
 
-def verify_password(plain_password: SecretStr, hashed_password: str) -> bool:
+async def verify_password(plain_password: SecretStr, hashed_password: str) -> bool:
     """
-    Verify plain password with hashed password
+    Verify plain password with hashed password, in the password hash executor
 
     :param plain_password: Plain password
     :type plain_password: str
@@ -62,19 +85,19 @@ def verify_password(plain_password: SecretStr, hashed_password: str) -> bool:
     :return: True if password is verified, False otherwise
     :rtype: bool
     """
-    return pwd_context.verify(plain_password.get_secret_value(), hashed_password)
+    return await verify_password_hash(plain_password.get_secret_value(), hashed_password)
 
 
-def get_hashed_password(password: SecretStr) -> str:
+async def get_hashed_password(password: SecretStr) -> str:
     """
-    Util function for hashing a password
+    Util function for hashing a password, in the password hash executor
 
     :param password: Password
     :type password: str
     :return: Hashed password
     :rtype: str
     """
-    return pwd_context.hash(password.get_secret_value())
+    return await hash_password(password.get_secret_value())
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -91,7 +114,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta if expires_delta else datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({'exp': expire})
-    return jwt.encode(payload=to_encode, key=Config.JWT_PRIVATE_KEY, algorithm=Config.JWT_ALGORITHM)
+    return jwt.encode(payload=to_encode, key=get_signing_key(), algorithm=Config.JWT_ALGORITHM)
 
 
 def create_refresh_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -108,24 +131,24 @@ def create_refresh_token(data: dict, expires_delta: timedelta | None = None) ->
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta if expires_delta else datetime.now(timezone.utc) + timedelta(days=1)
     to_encode.update({'exp': expire})
-    return jwt.encode(payload=to_encode, key=Config.JWT_PRIVATE_KEY, algorithm=Config.JWT_ALGORITHM)
+    return jwt.encode(payload=to_encode, key=get_signing_key(), algorithm=Config.JWT_ALGORITHM)
 
 
-def get_user_by_email(email: str, db: Session) -> User or None:
+async def get_user_by_email(email: str, db: DbSession) -> User or None:
     """
     Get user by email
 
     :param email: Email
     :type email: str
     :param db: Database session
-    :type db: Session
+    :type db: DbSession
     :return: A user object
     :rtype: User or None
     """
-    return db.query(User).filter_by(email=email, deleted_at=None).one_or_none()
+    return (await db.scalars(select(User).filter_by(email=email, deleted_at=None))).one_or_none()
 
 
-def authenticate_user(email: str, password: SecretStr, db: Session) -> User or None:
+async def authenticate_user(email: str, password: SecretStr, db: DbSession) -> User or None:
     """
     Authenticate user
 
@@ -134,12 +157,12 @@ def authenticate_user(email: str, password: SecretStr, db: Session) -> User or N
     :param password: Password
     :type password: SecretStr
     :param db: Database session
-    :type db: Session
+    :type db: DbSession
     :return: A user object
     :rtype: User or None
     """
-    user = get_user_by_email(email, db)
-    if user and verify_password(plain_password=password, hashed_password=user.password):
+    user = await get_user_by_email(email, db)
+    if user and await verify_password(plain_password=password, hashed_password=user.password):
         return user
     return None
 
@@ -148,22 +171,31 @@ def validate_token(token: str) -> dict or None:
     """
     Validate token
 
+    Verified payloads are cached until the token expires, so the returned payload must not be modified.
+
     :param token: Token
     :type token: str
     :return: Payload
     :rtype: dict or None
     """
+    now = datetime.now(timezone.utc).timestamp()
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        return payload if payload['exp'] >= now else None
     try:
-        payload = jwt.decode(jwt=token, key=Config.JWT_PUBLIC_KEY, algorithms=[Config.JWT_ALGORITHM])
+        payload = jwt.decode(jwt=token, key=get_verification_key(), algorithms=[Config.JWT_ALGORITHM])
         logging.debug(f'payload: {payload}')
         logging.debug(f'exp: {payload["exp"]}')
-        logging.debug(f'now: {datetime.now(timezone.utc).timestamp()}')
-        logging.debug(f'expires in seconds: {payload["exp"] - datetime.now(timezone.utc).timestamp()}')
-        return payload if payload['exp'] >= datetime.now(timezone.utc).timestamp() else None
+        logging.debug(f'now: {now}')
+        logging.debug(f'expires in seconds: {payload["exp"] - now}')
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    if payload['exp'] < now:
+        return None
+    _verified_tokens.set(token, payload, ttl=payload['exp'] - now)
+    return payload
 
 
 def verify_jwt(token: str) -> bool:
@@ -183,47 +215,122 @@ def verify_jwt(token: str) -> bool:
 
 
 class JWTBearer(HTTPBearer):
-    """JWT Bearer Token Authentication"""
+    """
+    JWT Bearer Token Authentication
+
+    The verified token and its payload are stored on the request state, so the token is only validated once per request,
+    however many times the dependency is used.
+    """
 
     def __init__(self, auto_error: bool = False):  # noqa: D107
         super().__init__(auto_error=auto_error)
 
     async def __call__(self, request: Request):  # noqa: D102
+        token = getattr(request.state, 'token', None)
+        if token is not None:
+            return token
         credentials: HTTPAuthorizationCredentials = await super().__call__(request)
         if credentials:
             if not credentials.scheme == 'Bearer':
                 raise CustomExceptionError(status_code=status.HTTP_401_UNAUTHORIZED, message='Invalid authentication scheme.')
-            if not verify_jwt(credentials.credentials):
+            payload = validate_token(credentials.credentials)
+            if not payload:
                 raise CustomExceptionError(status_code=status.HTTP_401_UNAUTHORIZED, message='Invalid or expired token.')
+            request.state.token = credentials.credentials
+            request.state.token_payload = payload
             return credentials.credentials
 
         raise CustomExceptionError(status_code=status.HTTP_401_UNAUTHORIZED, message='Not authenticated.')
 
 
-async def get_current_user(token: str = Depends(JWTBearer()), db: Session = Depends(get_db)) -> User or None:
+def set_user_cache_backend(backend: CacheBackend) -> None:
+    """
+    Replace the in-process user cache, e.g. with a backend shared between workers
+
+    :param backend: Cache backend storing the user snapshots
+    :type backend: CacheBackend
+    """
+    _user_cache.backend = backend
+
+
+def _user_record_tag(user_id) -> str:
+    return f'user-record:{user_id}'
+
+
+def invalidate_cached_user_record(user_id) -> None:
+    """
+    Remove a user from the user cache on every worker, must be called whenever the user record is changed
+
+    Cached responses only embed the public fields of users, see UserPublicResponse, which no endpoint changes yet.
+
+    :param user_id: User ID
+    :type user_id: UUID or str
+    """
+    _user_cache.invalidate(_user_record_tag(user_id))
+
+
+def _snapshot_user(user: User) -> dict:
+    """Return the column values of a user"""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+async def _get_cached_user(user_id: str, db: DbSession) -> User or None:
+    """Rebuild a user from the user cache and attach it to the session, without querying the database"""
+    snapshot = _user_cache.get(str(user_id))
+    if snapshot is None:
+        return None
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+async def get_current_user(request: Request, token: str = Depends(JWTBearer()), db: DbSession = Depends(get_db)) -> User or None:
     """
     Get current user
 
+    :param request: Request, holding the token payload verified by JWTBearer
+    :type request: Request
     :param token: Token
     :type token: str
     :param db: Database session
-    :type db: Session
+    :type db: DbSession
     :return: A user object
     :rtype: User or None
     """
-    try:
-        payload = jwt.decode(token, Config.JWT_PUBLIC_KEY, algorithms=[Config.JWT_ALGORITHM])
-        user_id: str = payload.get('sub')
-        if user_id is None:
-            raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='Invalid token.')
-        user = db.query(User).filter(User.id == user_id).one_or_none()
-        if user is None:
-            raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='User not found.')
+    payload = request.state.token_payload
+    user_id: str = payload.get('sub')
+    if user_id is None:
+        raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='Invalid token.')
+    user = await _get_cached_user(user_id=user_id, db=db)
+    if user is not None:
         return user
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
+    try:
+        # The subject is a string, SQLite only compares the id column with a UUID
+        user_uuid = UUID(user_id)
+    except ValueError:
+        raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='Invalid token.') from None
+    # Taken before the query, so an invalidation while the user is read is not lost
+    tag = _user_record_tag(user_uuid)
+    versions = _user_cache.versions([tag])
+    user = (await db.scalars(select(User).where(User.id == user_uuid))).one_or_none()
+    if user is None:
+        raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='User not found.')
+    _user_cache.set(str(user.id), _snapshot_user(user), tags=[tag], versions=versions)
+    return user
+
+
+async def get_current_super_admin(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Get current user, who must be one of the super admins in Config.SUPER_ADMINS
+
+    :param current_user: Current user
+    :type current_user: User
+    :return: A user object
+    :rtype: User
+    """
+    if not current_user.email or current_user.email not in Config.SUPER_ADMINS:
+        raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='Super admin access required.')
+    return current_user
 
 
 def create_reset_token(user: User) -> str:
@@ -237,7 +344,7 @@ def create_reset_token(user: User) -> str:
     """
     expire = datetime.now(timezone.utc) + timedelta(minutes=Config.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {'sub': str(user.id), 'exp': expire, 'type': 'reset'}
-    return jwt.encode(to_encode, Config.JWT_PRIVATE_KEY, algorithm=Config.JWT_ALGORITHM)
+    return jwt.encode(to_encode, get_signing_key(), algorithm=Config.JWT_ALGORITHM)
 
 
 def verify_reset_token(token: str) -> bool:
@@ -249,15 +356,11 @@ def verify_reset_token(token: str) -> bool:
     :return: True if token is valid, False otherwise
     :rtype: bool
     """
-    try:
-        payload = jwt.decode(token, Config.JWT_PUBLIC_KEY, algorithms=[Config.JWT_ALGORITHM])
-        user_id = payload.get('sub')
-        if user_id is None or payload.get('exp') < datetime.now(timezone.utc).timestamp():
-            raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='Invalid or expired token.')
-    except jwt.ExpiredSignatureError:
-        return False
-    except jwt.InvalidTokenError:
+    payload = validate_token(token)
+    if not payload:
         return False
+    if payload.get('sub') is None:
+        raise CustomExceptionError(status_code=status.HTTP_403_FORBIDDEN, message='Invalid or expired token.')
     return True
 
 
@@ -275,5 +378,7 @@ def get_user_id_from_token(token: str) -> str:
     :return: User ID
     :rtype: str
     """
-    payload = jwt.decode(token, Config.JWT_PUBLIC_KEY, algorithms=[Config.JWT_ALGORITHM])
+    payload = validate_token(token)
+    if payload is None:
+        payload = jwt.decode(token, get_verification_key(), algorithms=[Config.JWT_ALGORITHM])
     return payload.get('sub')
@@ -1,20 +1,28 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app.dependencies import get_db
+from app.dependencies import DbSession, get_db
 from app.models.user import User
-from app.v3.auth.utils import get_current_user
-from app.v3.event_interests.schemas import EventInterestCountResponse, EventInterestCreate, EventInterestResponse, EventInterestUpdate
+from app.v3.auth.utils import get_current_super_admin, get_current_user
+from app.v3.event_interests.schemas import (
+    EventInterestBatch,
+    EventInterestCountResponse,
+    EventInterestCreate,
+    EventInterestImport,
+    EventInterestResponse,
+    EventInterestUpdate,
+)
 from app.v3.event_interests.service import (
     create_interest,
+    export_event_interests,
     get_event_interest_count,
     get_event_interests,
     get_user_interest,
     update_interest,
+    upsert_interests,
 )
 
 router = APIRouter()
@@ -26,10 +34,10 @@ router = APIRouter()
     response_model=EventInterestResponse,
 )
 async def post_create_interest(
-    event_id: UUID, interest_data: EventInterestCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    event_id: UUID, interest_data: EventInterestCreate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Register interest in an event"""
-    return create_interest(db=db, event_id=event_id, current_user=current_user, interest_data=interest_data)
+    return await create_interest(db=db, event_id=event_id, current_user=current_user, interest_data=interest_data)
 
 
 @router.get(
@@ -37,9 +45,11 @@ async def post_create_interest(
     name='EI-2',
     response_model=List[EventInterestResponse],
 )
-async def get_interests_list(event_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_interests_list(
+    event_id: UUID, skip: int = 0, limit: int = Query(100, ge=1, le=100), cursor: Optional[str] = None, db: DbSession = Depends(get_db)
+) -> JSONResponse:
     """Get all interests for an event"""
-    return get_event_interests(db=db, event_id=event_id, skip=skip, limit=limit)
+    return await get_event_interests(db=db, event_id=event_id, skip=skip, limit=limit, cursor=cursor)
 
 
 @router.put(
@@ -48,10 +58,10 @@ async def get_interests_list(event_id: UUID, skip: int = 0, limit: int = 100, db
     response_model=EventInterestResponse,
 )
 async def put_update_interest(
-    event_id: UUID, interest_data: EventInterestUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    event_id: UUID, interest_data: EventInterestUpdate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Update interest status"""
-    return update_interest(db=db, event_id=event_id, current_user=current_user, interest_data=interest_data)
+    return await update_interest(db=db, event_id=event_id, current_user=current_user, interest_data=interest_data)
 
 
 @router.get(
@@ -59,12 +69,44 @@ async def put_update_interest(
     name='EI-4',
     response_model=EventInterestResponse,
 )
-async def get_my_interest(event_id: UUID, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def get_my_interest(event_id: UUID, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get current user's interest status for an event"""
-    return get_user_interest(db=db, event_id=event_id, current_user=current_user)
+    return await get_user_interest(db=db, event_id=event_id, current_user=current_user)
 
 
 @router.get('/events/{event_id}/interests/count', name='EI-5', response_model=EventInterestCountResponse)
-async def get_interest_count(event_id: UUID, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_interest_count(event_id: UUID, db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get count of interests for an event"""
-    return get_event_interest_count(db=db, event_id=event_id)
+    return await get_event_interest_count(db=db, event_id=event_id)
+
+
+@router.put(
+    '/interests',
+    name='EI-6',
+    response_model=List[EventInterestResponse],
+)
+async def put_batch_interests(batch: EventInterestBatch, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
+    """Register or update the current user's interest in many events"""
+    return await upsert_interests(db=db, entries=[(entry.event_id, current_user.id, entry.status) for entry in batch.interests])
+
+
+@router.put(
+    '/interests/import',
+    name='EI-7',
+    response_model=List[EventInterestResponse],
+)
+async def put_import_interests(batch: EventInterestImport, _: User = Depends(get_current_super_admin), db: DbSession = Depends(get_db)) -> JSONResponse:
+    """Register or update the interests of many users, super admins only"""
+    return await upsert_interests(db=db, entries=[(entry.event_id, entry.user_id, entry.status) for entry in batch.interests])
+
+
+@router.get('/events/{event_id}/interests/export', name='EI-8', response_class=StreamingResponse)
+async def get_interests_export(
+    event_id: UUID,
+    export_format: str = Query('csv', alias='format', pattern='^(csv|ndjson)$'),
+    status: Optional[int] = Query(None, ge=0, le=2),
+    current_user: User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+) -> StreamingResponse:
+    """Export the interests of an event, with the name and email of every user, as CSV or NDJSON"""
+    return await export_event_interests(db=db, event_id=event_id, current_user=current_user, export_format=export_format, status=status)
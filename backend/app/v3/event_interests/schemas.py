@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field
@@ -23,6 +23,30 @@ class EventInterestUpdate(EventInterestBase):
     pass
 
 
+class EventInterestBatchEntry(EventInterestBase):
+    """Interest of the current user in one event, in a batch"""
+
+    event_id: UUID
+
+
+class EventInterestBatch(BaseModel):
+    """Register or update the current user's interest in many events"""
+
+    interests: List[EventInterestBatchEntry] = Field(min_length=1, max_length=100)
+
+
+class EventInterestImportEntry(EventInterestBatchEntry):
+    """Interest of a user in one event, in an import"""
+
+    user_id: UUID
+
+
+class EventInterestImport(BaseModel):
+    """Register or update the interests of many users"""
+
+    interests: List[EventInterestImportEntry] = Field(min_length=1, max_length=1000)
+
+
 class EventInterestResponse(EventInterestBase):
     """Event interest response model"""
 
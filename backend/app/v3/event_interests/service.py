@@ -1,33 +1,131 @@
+import csv
+import io
 import logging
-from uuid import UUID
+from typing import AsyncIterator, Dict, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
 
-from pydantic import TypeAdapter
-from sqlalchemy import func
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, case, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 from tunsberg.responses import (
+    response_bad_request,
     response_conflict,
-    response_created,
+    response_forbidden,
     response_not_found,
-    response_success,
 )
 
+from app.dependencies import DbSession
 from app.models.event import Event
-from app.models.event_interest import EventInterest
+from app.models.event_interest import INTEREST_STATUS_COLUMNS, EventInterest, EventInterestCount
 from app.models.user import User
 from app.v3.event_interests.schemas import EventInterestCreate, EventInterestResponse, EventInterestUpdate
+from app.v3.loaders import select_for
+from app.v3.responses import get_serializer, response_cache, response_created, response_success
+from app.v3.utils import get_keyset_page, paginate_keyset
 
+interest_serializer = get_serializer(EventInterestResponse)
+interests_serializer = get_serializer(list[EventInterestResponse])
 
-def create_interest(db: Session, event_id: UUID, current_user: User, interest_data: EventInterestCreate):
+# Sort key for paginated interest lists, matches the ix_event_interests_event_id_created_at_id index
+INTERESTS_SORT_KEY = (EventInterest.created_at, EventInterest.id)
+
+# Rows fetched from the server-side cursor, and written to the response, at a time by the interest exports
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ('user_id', 'name', 'email', 'status', 'created_at', 'updated_at')
+EXPORT_MEDIA_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+# Counter rows locked and recomputed at a time by the reconcile, interest changes of these events wait for the batch
+RECONCILE_BATCH_SIZE = 500
+
+# Upsert support for the interest counters, per database dialect
+_UPSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
+
+async def _update_interest_counts(db: DbSession, changes: Dict[UUID, Dict[int, int]]) -> None:
+    """Add the changes, in number of interests per status for every event, to the interest counters, in the current transaction"""
+    rows = []
+    # In event order, the order the reconcile locks the counters in, so concurrent updates do not deadlock
+    for event_id, event_changes in sorted(changes.items()):
+        deltas = dict.fromkeys(INTEREST_STATUS_COLUMNS.values(), 0)
+        for status, change in event_changes.items():
+            if status in INTEREST_STATUS_COLUMNS:
+                deltas[INTEREST_STATUS_COLUMNS[status]] += change
+        if any(deltas.values()):
+            rows.append({'event_id': event_id, **deltas})
+    if not rows:
+        return
+    counts = EventInterestCount.__table__
+    statement = _UPSERTS[db.bind.dialect.name](counts).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[counts.c.event_id],
+        set_={**{column: counts.c[column] + statement.excluded[column] for column in INTEREST_STATUS_COLUMNS.values()}, 'updated_at': func.now()},
+    )
+    await db.execute(statement)
+
+
+def _count_interests(status: int):
+    """Count the active interests with the status, of the event of the interest counter row"""
+    counts = EventInterestCount.__table__
+    query = select(func.count()).where(EventInterest.event_id == counts.c.event_id, EventInterest.status == status, EventInterest.deleted_at.is_(None))
+    return query.scalar_subquery()
+
+
+async def reconcile_interest_counts(db: DbSession, event_id: Optional[UUID] = None) -> int:
+    """
+    Recompute the interest counters from the interests, for one or every event.
+
+    The counter rows are locked before the interests are counted, in batches, so increments committed before the count
+    are included and the ones after it wait for the new counters instead of being overwritten.
+
+    :return: Number of events with recomputed counters
+    """
+    counts = EventInterestCount.__table__
+    existing = select(counts.c.event_id).order_by(counts.c.event_id)
+    if event_id is not None:
+        existing = existing.where(counts.c.event_id == event_id)
+    event_ids = list(await db.scalars(existing))
+
+    for start in range(0, len(event_ids), RECONCILE_BATCH_SIZE):
+        batch = event_ids[start : start + RECONCILE_BATCH_SIZE]
+        # Ignored by SQLite, which only has one writer at a time
+        await db.execute(select(counts.c.event_id).where(counts.c.event_id.in_(batch)).order_by(counts.c.event_id).with_for_update())
+        # A statement of its own, so the count sees every interest committed while waiting for the locks
+        await db.execute(
+            update(counts)
+            .where(counts.c.event_id.in_(batch))
+            .values(**{column: _count_interests(status) for status, column in INTEREST_STATUS_COLUMNS.items()}, updated_at=func.now())
+        )
+        await db.commit()
+
+    # Counters of events with interests but without a counter row, left alone when a concurrent increment creates the row first
+    missing = select(
+        EventInterest.event_id,
+        *[func.sum(case((EventInterest.status == status, 1), else_=0)) for status in INTEREST_STATUS_COLUMNS],
+    ).where(EventInterest.deleted_at.is_(None), ~select(counts.c.event_id).where(counts.c.event_id == EventInterest.event_id).exists())
+    if event_id is not None:
+        missing = missing.where(EventInterest.event_id == event_id)
+    statement = _UPSERTS[db.bind.dialect.name](counts).from_select(['event_id', *INTEREST_STATUS_COLUMNS.values()], missing.group_by(EventInterest.event_id))
+    created = (await db.execute(statement.on_conflict_do_nothing(index_elements=[counts.c.event_id]))).rowcount
+    await db.commit()
+    response_cache.invalidate('interest_counts')
+    return len(event_ids) + max(created, 0)
+
+
+async def create_interest(db: DbSession, event_id: UUID, current_user: User, interest_data: EventInterestCreate):
     """Register user's interest in an event"""
     # Check if event exists
-    event = db.query(Event).filter(Event.id == event_id, Event.deleted_at.is_(None)).first()
-    if not event:
+    event_exists = await db.scalar(select(Event.id).where(Event.id == event_id, Event.deleted_at.is_(None)).limit(1))
+    if not event_exists:
         return response_not_found(message='Event not found')
 
     # Check if user already registered interest
-    existing_interest = (
-        db.query(EventInterest).filter(EventInterest.event_id == event_id, EventInterest.user_id == current_user.id, EventInterest.deleted_at.is_(None)).first()
+    existing_interest = await db.scalar(
+        select(EventInterest.id)
+        .where(EventInterest.event_id == event_id, EventInterest.user_id == current_user.id, EventInterest.deleted_at.is_(None))
+        .limit(1)
     )
 
     if existing_interest:
@@ -36,71 +134,210 @@ def create_interest(db: Session, event_id: UUID, current_user: User, interest_da
     try:
         interest = EventInterest(event_id=event_id, user_id=current_user.id, status=interest_data.status)
         db.add(interest)
-        db.commit()
-        db.refresh(interest)
+        await _update_interest_counts(db=db, changes={event_id: {interest.status: 1}})
+        await db.commit()
+        response_cache.invalidate('interest_counts')
+        await db.refresh(interest)
 
-        adapter = TypeAdapter(EventInterestResponse)
-        return response_created(message='Interest registered', data=adapter.dump_json(interest))
+        return response_created(message='Interest registered', data=interest_serializer.dump_json(interest))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error registering interest: {e}')
         return response_conflict(message='Error registering interest')
 
 
-def get_event_interests(db: Session, event_id: UUID, skip: int = 0, limit: int = 100):
+async def get_event_interests(db: DbSession, event_id: UUID, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
     """Get all interests for an event"""
-    interests = db.query(EventInterest).filter(EventInterest.event_id == event_id, EventInterest.deleted_at.is_(None)).offset(skip).limit(limit).all()
+    query = select_for(EventInterest, EventInterestResponse).where(EventInterest.event_id == event_id, EventInterest.deleted_at.is_(None))
+    query = paginate_keyset(query, columns=INTERESTS_SORT_KEY, limit=limit, cursor=cursor, skip=skip)
+    interests, pagination = get_keyset_page((await db.scalars(query)).all(), columns=INTERESTS_SORT_KEY, limit=limit)
 
-    adapter = TypeAdapter(EventInterestResponse)
-    data = adapter.dump_python(interests, mode='json')
-    return response_success(message='Event interests retrieved', data=data)
+    return response_success(message='Event interests retrieved', data=interests_serializer.dump_json(interests), pagination=pagination)
 
 
-def update_interest(db: Session, event_id: UUID, current_user: User, interest_data: EventInterestUpdate):
+async def update_interest(db: DbSession, event_id: UUID, current_user: User, interest_data: EventInterestUpdate):
     """Update interest status"""
-    interest = (
-        db.query(EventInterest).filter(EventInterest.event_id == event_id, EventInterest.user_id == current_user.id, EventInterest.deleted_at.is_(None)).first()
+    # Lock the interest, so concurrent updates move the counters from the status they read
+    interest = await db.scalar(
+        select(EventInterest)
+        .where(EventInterest.event_id == event_id, EventInterest.user_id == current_user.id, EventInterest.deleted_at.is_(None))
+        .limit(1)
+        .with_for_update()
     )
 
     if not interest:
         return response_not_found(message='Interest record not found')
 
     try:
+        if interest.status != interest_data.status:
+            await _update_interest_counts(db=db, changes={event_id: {interest.status: -1, interest_data.status: 1}})
         interest.status = interest_data.status
-        db.commit()
-        db.refresh(interest)
+        await db.commit()
+        response_cache.invalidate('interest_counts')
+        await db.refresh(interest)
 
-        adapter = TypeAdapter(EventInterestResponse)
-        return response_success(message='Interest updated', data=adapter.dump_json(interest))
+        return response_success(message='Interest updated', data=interest_serializer.dump_json(interest))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error updating interest: {e}')
         return response_conflict(message='Error updating interest')
 
 
-def get_user_interest(db: Session, event_id: UUID, current_user: User):
+async def upsert_interests(db: DbSession, entries: Sequence[Tuple[UUID, UUID, int]]):
+    """
+    Register or update many interests in one transaction.
+
+    The interests are written with a single INSERT ... ON CONFLICT DO UPDATE on the unique (event_id, user_id) index of
+    the active interests, and the counters of every event with one more statement.
+
+    :param db: Database session
+    :type db: DbSession
+    :param entries: Event ID, user ID and status of every interest, the last entry wins for the same event and user
+    :type entries: Sequence[Tuple[UUID, UUID, int]]
+    :return: The registered interests
+    """
+    statuses = {(event_id, user_id): status for event_id, user_id, status in entries}
+    event_ids = {event_id for event_id, _ in statuses}
+
+    found = set(await db.scalars(select(Event.id).where(Event.id.in_(event_ids), Event.deleted_at.is_(None))))
+    if event_ids - found:
+        return response_not_found(message=f'Events not found: {", ".join(sorted(str(event_id) for event_id in event_ids - found))}')
+
+    try:
+        # Lock the existing interests, so the counters are moved from the status they have when they are overwritten
+        existing = await db.execute(
+            select(EventInterest.event_id, EventInterest.user_id, EventInterest.status)
+            .where(tuple_(EventInterest.event_id, EventInterest.user_id).in_(list(statuses)), EventInterest.deleted_at.is_(None))
+            .with_for_update()
+        )
+        previous = {(event_id, user_id): status for event_id, user_id, status in existing}
+        changes: Dict[UUID, Dict[int, int]] = {}
+        for (event_id, user_id), status in statuses.items():
+            old_status = previous.get((event_id, user_id))
+            if old_status == status:
+                continue
+            event_changes = changes.setdefault(event_id, {})
+            event_changes[status] = event_changes.get(status, 0) + 1
+            if old_status is not None:
+                event_changes[old_status] = event_changes.get(old_status, 0) - 1
+
+        statement = _UPSERTS[db.bind.dialect.name](EventInterest).values(
+            [{'id': uuid4(), 'event_id': event_id, 'user_id': user_id, 'status': status} for (event_id, user_id), status in statuses.items()]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[EventInterest.event_id, EventInterest.user_id],
+            index_where=EventInterest.deleted_at.is_(None),
+            set_={'status': statement.excluded.status, 'updated_at': func.now()},
+        )
+        interests = (await db.scalars(statement.returning(EventInterest), execution_options={'populate_existing': True})).all()
+        await _update_interest_counts(db=db, changes=changes)
+        data = interests_serializer.dump_json(interests)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        logging.error(f'Error registering interests: {e}')
+        return response_bad_request(message='Error registering interests')
+
+    response_cache.invalidate('interest_counts')
+    return response_success(message='Interests registered', data=data)
+
+
+async def get_user_interest(db: DbSession, event_id: UUID, current_user: User):
     """Get user's interest status for an event"""
-    interest = (
-        db.query(EventInterest).filter(EventInterest.event_id == event_id, EventInterest.user_id == current_user.id, EventInterest.deleted_at.is_(None)).first()
+    interest = await db.scalar(
+        select_for(EventInterest, EventInterestResponse)
+        .where(EventInterest.event_id == event_id, EventInterest.user_id == current_user.id, EventInterest.deleted_at.is_(None))
+        .limit(1)
     )
 
     if not interest:
         return response_not_found(message='No interest record found for this event')
 
-    adapter = TypeAdapter(EventInterestResponse)
-    return response_success(message='Interest status retrieved', data=adapter.dump_json(interest))
+    return response_success(message='Interest status retrieved', data=interest_serializer.dump_json(interest))
 
 
-def get_event_interest_count(db: Session, event_id: UUID):
+async def get_event_interest_count(db: DbSession, event_id: UUID):
     """Get count of interests for an event grouped by status"""
-    base_query = (
-        db.query(EventInterest.status, func.count().label('count'))
-        .filter(EventInterest.event_id == event_id, EventInterest.deleted_at.is_(None))
-        .group_by(EventInterest.status)
+    interest_counts = await db.get(EventInterestCount, event_id)
+
+    counts = {column: getattr(interest_counts, column) if interest_counts else 0 for column in ('interested', 'not_interested', 'maybe')}
+
+    return response_success(message='Interest count retrieved', data=counts)
+
+
+async def export_event_interests(db: DbSession, event_id: UUID, current_user: User, export_format: str = 'csv', status: Optional[int] = None):
+    """
+    Export the interests of an event with the name and email of every user, for the organiser of the event.
+
+    The rows are read from a server-side cursor and streamed in batches of EXPORT_BATCH_SIZE, without building ORM
+    objects, so the memory used does not grow with the number of interests.
+
+    :param db: Database session, it stays open until the response has been streamed
+    :type db: DbSession
+    :param event_id: Event ID
+    :type event_id: UUID
+    :param current_user: Current user, must have created the event
+    :type current_user: User
+    :param export_format: Either csv or ndjson
+    :type export_format: str
+    :param status: Only export the interests with this status, e.g. 1 for the participants
+    :type status: Optional[int]
+    :return: Streaming response
+    """
+    created_by_id = await db.scalar(select(Event.created_by_id).where(Event.id == event_id, Event.deleted_at.is_(None)).limit(1))
+    if created_by_id is None:
+        return response_not_found(message='Event not found')
+    if created_by_id != current_user.id:
+        return response_forbidden(message="You don't have permission to export the interests of this event")
+
+    query = (
+        select(EventInterest.user_id, User.name, User.email, EventInterest.status, EventInterest.created_at, EventInterest.updated_at)
+        .join(User, User.id == EventInterest.user_id)
+        .where(EventInterest.event_id == event_id, EventInterest.deleted_at.is_(None))
+        .order_by(*INTERESTS_SORT_KEY)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
     )
+    if status is not None:
+        query = query.where(EventInterest.status == status)
+    result = await db.stream(query)
 
-    results = {row.status: row.count for row in base_query.all()}
+    encode = _encode_csv if export_format == 'csv' else _encode_ndjson
+    return StreamingResponse(
+        encode(result.partitions()),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="event-{event_id}-interests.{export_format}"'},
+    )
 
-    counts = {'interested': results.get(1, 0), 'not_interested': results.get(0, 0), 'maybe': results.get(2, 0)}
 
-    return response_success(message='Interest count retrieved', data=counts)
+def _export_row(row: Row) -> Tuple:
+    """Replace the status of an exported row by its name"""
+    return (*row[:3], INTEREST_STATUS_COLUMNS.get(row.status, row.status), *row[4:])
+
+
+def _csv_value(value) -> str:
+    """Format a CSV value, user input starting like a formula is quoted so spreadsheets do not evaluate it"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return f"'{value}" if value[:1] in ('=', '+', '-', '@', '\t', '\r') else value
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+async def _encode_csv(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[str]:
+    """Encode the exported rows as CSV, one chunk per partition"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for partition in partitions:
+        writer.writerows([_csv_value(value) for value in _export_row(row)] for row in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def _encode_ndjson(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    """Encode the exported rows as newline delimited JSON, one chunk per partition"""
+    async for partition in partitions:
+        yield b''.join(orjson.dumps(dict(zip(EXPORT_COLUMNS, _export_row(row)))) + b'\n' for row in partition)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.dependencies import get_async_session
+from app.v3.event_interests.service import reconcile_interest_counts
+from config import Config
+
+# Key of the Postgres advisory lock held while reconciling, every worker runs the task but only one reconciles at a time
+RECONCILE_LOCK_KEY = 7_214_031_582
+
+
+async def reconcile_all_interest_counts() -> int:
+    """Recompute the interest counters of every event, in a session of its own, unless another process is already doing so"""
+    # The lock is held by the transaction of a session of its own, as the reconcile commits after every batch
+    lock = get_async_session()
+    db = get_async_session()
+    try:
+        if lock.bind.dialect.name == 'postgresql' and not await lock.scalar(text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': RECONCILE_LOCK_KEY}):
+            logging.debug('Interest counters are reconciled by another process')
+            return 0
+        events = await reconcile_interest_counts(db=db)
+        logging.debug(f'Interest counters reconciled for {events} events')
+        return events
+    finally:
+        await db.close()
+        await lock.close()
+
+
+async def reconcile_interest_counts_periodically(interval: float = Config.INTEREST_COUNTS_RECONCILE_SECS) -> None:
+    """Recompute the interest counters every interval seconds, until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_all_interest_counts()
+        except Exception as e:
+            logging.error(f'Error reconciling interest counters: {e}')
+
+
+if __name__ == '__main__':
+    # Usage, from the backend directory: python -m app.v3.event_interests.tasks
+    asyncio.run(reconcile_all_interest_counts())
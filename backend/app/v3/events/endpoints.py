@@ -1,13 +1,14 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi_filter import FilterDepends
 
-from app.dependencies import get_db
+from app.dependencies import DbSession, get_db
 from app.models.user import User
 from app.v3.auth.utils import get_current_user
+from app.v3.events.filters import EventFilter
 from app.v3.events.schemas import EventCreate, EventResponse, EventUpdate
 from app.v3.events.service import (
     create_event,
@@ -16,6 +17,7 @@ from app.v3.events.service import (
     get_events,
     update_event,
 )
+from app.v3.responses import ConditionalRequest, get_conditional_request
 
 router = APIRouter()
 
@@ -25,9 +27,9 @@ router = APIRouter()
     name='E-1',
     response_model=EventResponse,
 )
-async def post_create_event(event_data: EventCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def post_create_event(event_data: EventCreate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Create a new event"""
-    return create_event(db=db, current_user=current_user, event_data=event_data)
+    return await create_event(db=db, current_user=current_user, event_data=event_data)
 
 
 @router.get(
@@ -35,9 +37,16 @@ async def post_create_event(event_data: EventCreate, current_user: User = Depend
     name='E-2',
     response_model=List[EventResponse],
 )
-async def get_events_list(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> JSONResponse:
-    """Get all events"""
-    return get_events(db=db, skip=skip, limit=limit)
+async def get_events_list(  # noqa: PLR0913
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    event_filter: EventFilter = FilterDepends(EventFilter),
+    conditional: ConditionalRequest = Depends(get_conditional_request),
+    db: DbSession = Depends(get_db),
+) -> JSONResponse:
+    """Get all events, optionally filtered"""
+    return await get_events(db=db, skip=skip, limit=limit, cursor=cursor, event_filter=event_filter, conditional=conditional)
 
 
 @router.get(
@@ -45,9 +54,9 @@ async def get_events_list(skip: int = 0, limit: int = 100, db: Session = Depends
     name='E-3',
     response_model=EventResponse,
 )
-async def get_event_by_id(event_id: UUID, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_event_by_id(event_id: UUID, conditional: ConditionalRequest = Depends(get_conditional_request), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get event by ID"""
-    return get_event(db=db, event_id=event_id)
+    return await get_event(db=db, event_id=event_id, conditional=conditional)
 
 
 @router.put(
@@ -56,16 +65,16 @@ async def get_event_by_id(event_id: UUID, db: Session = Depends(get_db)) -> JSON
     response_model=EventResponse,
 )
 async def put_update_event(
-    event_id: UUID, event_data: EventUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    event_id: UUID, event_data: EventUpdate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Update event"""
-    return update_event(db=db, event_id=event_id, current_user_id=current_user.id, event_data=event_data)
+    return await update_event(db=db, event_id=event_id, current_user_id=current_user.id, event_data=event_data)
 
 
 @router.delete(
     '/{event_id}',
     name='E-5',
 )
-async def delete_event_by_id(event_id: UUID, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def delete_event_by_id(event_id: UUID, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Delete event"""
-    return delete_event(db=db, event_id=event_id, current_user_id=current_user.id)
+    return await delete_event(db=db, event_id=event_id, current_user_id=current_user.id)
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi_filter.contrib.sqlalchemy import Filter
+from pydantic import field_validator
+from sqlalchemy import Select, and_, func, or_, select
+
+from app.models.event import Event
+from app.models.event_interest import EventInterestCount
+
+# Orderings of the event list, both are served by the keyset index on (start_at, id)
+EVENT_ORDERINGS = ('start_at', '-start_at')
+
+# Filters applied by EventFilter.filter itself instead of fastapi-filter
+CUSTOM_FILTERS = ('address_city', 'address_country', 'upcoming', 'has_capacity')
+
+
+class EventFilter(Filter):
+    """
+    Filters for the event list, e.g. ?start_at__gte=2024-01-01T00:00:00&address_city=oslo&upcoming=true.
+
+    Every filter is applied in SQL, the date ranges use ix_events_start_at_id and ix_events_end_at, the organisation
+    ix_events_organisation_id_start_at_id and the city and country their case-insensitive indexes.
+    """
+
+    start_at__gte: Optional[datetime] = None
+    start_at__lt: Optional[datetime] = None
+    end_at__gte: Optional[datetime] = None
+    end_at__lt: Optional[datetime] = None
+    organisation_id: Optional[UUID] = None
+    organisation_id__in: Optional[List[UUID]] = None
+    address_city: Optional[str] = None
+    address_country: Optional[str] = None
+    upcoming: Optional[bool] = None
+    has_capacity: Optional[bool] = None
+    order_by: Optional[List[str]] = None
+
+    class Constants(Filter.Constants):
+        """Filter config"""
+
+        model = Event
+
+    @field_validator('order_by')
+    @classmethod
+    def validate_ordering(cls, value: Optional[List[str]]) -> Optional[List[str]]:
+        """Only allow the orderings supported by the keyset pagination"""
+        if value and (len(value) > 1 or value[0] not in EVENT_ORDERINGS):
+            raise ValueError(f'order_by must be one of {", ".join(EVENT_ORDERINGS)}')
+        return value
+
+    @property
+    def descending(self) -> bool:
+        """Whether the events are ordered by start time in descending order"""
+        return self.order_by == ['-start_at']
+
+    def filter(self, query: Select) -> Select:
+        """Apply the filters to a query selecting events"""
+        # The plain field filters are applied by fastapi-filter, the others need expressions it can not build
+        query = Filter.filter(self.model_copy(update=dict.fromkeys(CUSTOM_FILTERS)), query)
+        if self.address_city is not None:
+            query = query.where(func.lower(Event.address_city) == self.address_city.lower())
+        if self.address_country is not None:
+            query = query.where(func.lower(Event.address_country) == self.address_country.lower())
+        if self.upcoming is not None:
+            now = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+            query = query.where(Event.end_at >= now if self.upcoming else Event.end_at < now)
+        if self.has_capacity is not None:
+            interested = func.coalesce(select(EventInterestCount.interested).where(EventInterestCount.event_id == Event.id).scalar_subquery(), 0)
+            if self.has_capacity:
+                query = query.where(or_(Event.max_participants.is_(None), Event.max_participants > interested))
+            else:
+                query = query.where(and_(Event.max_participants.isnot(None), Event.max_participants <= interested))
+        return query
+
+    @property
+    def cache_key(self) -> str:
+        """Key of the filter values, for the response cache"""
+        return self.model_dump_json(exclude_none=True)
@@ -4,7 +4,7 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
-from app.v3.auth.schemas import UserResponse
+from app.v3.auth.schemas import UserPublicResponse
 from app.v3.organisations.schemas import OrganisationResponse
 
 
@@ -71,7 +71,7 @@ class EventResponse(EventBase):
 
     organisation: OrganisationResponse
 
-    created_by: UserResponse
+    created_by: UserPublicResponse
 
     created_at: datetime
     updated_at: datetime
@@ -1,61 +1,117 @@
 import logging
+from typing import List, Optional
 
-from pydantic import TypeAdapter
 from pydantic.v1 import UUID4
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 from tunsberg.responses import (
     response_bad_request,
     response_conflict,
-    response_created,
     response_forbidden,
     response_not_found,
-    response_success,
 )
 
+from app.dependencies import DbSession
 from app.models.event import Event
 from app.models.user import User
+from app.v3.events.filters import EventFilter
 from app.v3.events.schemas import EventCreate, EventResponse, EventUpdate
+from app.v3.loaders import select_for
+from app.v3.responses import (
+    ConditionalRequest,
+    build_cached_response,
+    get_last_modified,
+    get_serializer,
+    response_cache,
+    response_cacheable,
+    response_created,
+    response_success,
+)
+from app.v3.utils import get_keyset_page, paginate_keyset
+
+event_serializer = get_serializer(EventResponse)
+events_serializer = get_serializer(list[EventResponse])
+
+# Sort key for paginated event lists, matches the ix_events_start_at_id index
+EVENTS_SORT_KEY = (Event.start_at, Event.id)
+
+
+def event_tags(*tags: str) -> List[str]:
+    """Response cache tags for event responses, the tags of the events and the tag of the organisations they embed"""
+    # The organisations of the events are only known after the read, every organisation write invalidates the collection
+    return [*tags, 'organisations']
 
 
-def create_event(db: Session, current_user: User, event_data: EventCreate):
+def select_events():
+    """Select events together with the relationships serialized by EventResponse"""
+    return select_for(Event, EventResponse)
+
+
+async def _reload_event(db: DbSession, event: Event) -> Event:
+    """Reload an event after commit, including server generated columns and its relationships"""
+    return await db.scalar(select_events().where(Event.id == event.id).execution_options(populate_existing=True))
+
+
+async def create_event(db: DbSession, current_user: User, event_data: EventCreate):
     """Create a new event"""
     try:
         event = Event(**event_data.model_dump(), created_by_id=current_user.id)
         db.add(event)
-        db.commit()
-        db.refresh(event)
+        await db.commit()
+        event = await _reload_event(db=db, event=event)
+        response_cache.invalidate('events')
 
-        adapter = TypeAdapter(EventResponse)
-        return response_created(message='Event created', data=adapter.dump_json(event))
+        return response_created(message='Event created', data=event_serializer.dump_json(event))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error creating event: {e}')
         return response_conflict(message='Error creating event')
 
 
-def get_events(db: Session, skip: int = 0, limit: int = 100):
-    """Get all events"""
-    events = db.query(Event).filter(Event.deleted_at.is_(None)).offset(skip).limit(limit).all()
-
-    adapter = TypeAdapter(list[EventResponse])
-    data = adapter.dump_json(events)
-    return response_success(message='Events retrieved', data=data)
-
-
-def get_event(db: Session, event_id: UUID4):
+async def get_events(  # noqa: PLR0913
+    db: DbSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    event_filter: Optional[EventFilter] = None,
+    conditional: Optional[ConditionalRequest] = None,
+):
+    """Get events matching the filter, ordered by start time"""
+    event_filter = event_filter or EventFilter()
+    key = ('events', skip, limit, cursor, event_filter.cache_key)
+    cached = response_cache.get(key)
+    if cached is None:
+        # Lists filtered on capacity change with the interest counters
+        tags = event_tags('events', 'interest_counts') if event_filter.has_capacity is not None else event_tags('events')
+        versions = response_cache.versions(tags)
+        query = event_filter.filter(select_events().where(Event.deleted_at.is_(None)))
+        query = paginate_keyset(query, columns=EVENTS_SORT_KEY, limit=limit, cursor=cursor, skip=skip, descending=event_filter.descending)
+        events, pagination = get_keyset_page((await db.scalars(query)).all(), columns=EVENTS_SORT_KEY, limit=limit)
+        cached = build_cached_response('Events retrieved', events_serializer, events, last_modified=get_last_modified(events), pagination=pagination)
+        response_cache.set(key, cached, tags=tags, versions=versions)
+
+    return response_cacheable(conditional, cached)
+
+
+async def get_event(db: DbSession, event_id: UUID4, conditional: Optional[ConditionalRequest] = None):
     """Get event by ID"""
-    event = db.query(Event).filter(Event.id == event_id, Event.deleted_at.is_(None)).first()
-    if not event:
-        return response_not_found(message='Event not found')
+    key = ('event', str(event_id))
+    cached = response_cache.get(key)
+    if cached is None:
+        tags = event_tags(f'event:{event_id}')
+        versions = response_cache.versions(tags)
+        event = await db.scalar(select_events().where(Event.id == event_id, Event.deleted_at.is_(None)).limit(1))
+        if not event:
+            return response_not_found(message='Event not found')
+        cached = build_cached_response('Event retrieved', event_serializer, event, last_modified=get_last_modified([event]))
+        response_cache.set(key, cached, tags=tags, versions=versions)
 
-    adapter = TypeAdapter(EventResponse)
-    return response_success(message='Event retrieved', data=adapter.dump_json(event))
+    return response_cacheable(conditional, cached)
 
 
-def update_event(db: Session, event_id: UUID4, current_user_id: int, event_data: EventUpdate):
+async def update_event(db: DbSession, event_id: UUID4, current_user_id: int, event_data: EventUpdate):
     """Update event"""
-    event = db.query(Event).filter(Event.id == event_id, Event.deleted_at.is_(None)).first()
+    event = await db.scalar(select(Event).where(Event.id == event_id, Event.deleted_at.is_(None)).limit(1))
     if not event:
         return response_not_found(message='Event not found')
 
@@ -66,20 +122,20 @@ def update_event(db: Session, event_id: UUID4, current_user_id: int, event_data:
         for field, value in event_data.model_dump(exclude_unset=True).items():
             setattr(event, field, value)
 
-        db.commit()
-        db.refresh(event)
+        await db.commit()
+        response_cache.invalidate('events', f'event:{event.id}')
+        event = await _reload_event(db=db, event=event)
 
-        adapter = TypeAdapter(EventResponse)
-        return response_success(message='Event updated', data=adapter.dump_json(event))
+        return response_success(message='Event updated', data=event_serializer.dump_json(event))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error updating event: {e}')
         return response_conflict(message='Error updating event')
 
 
-def delete_event(db: Session, event_id: UUID4, current_user_id: int):
+async def delete_event(db: DbSession, event_id: UUID4, current_user_id: int):
     """Delete event"""
-    event = db.query(Event).filter(Event.id == event_id, Event.deleted_at.is_(None)).first()
+    event = await db.scalar(select(Event).where(Event.id == event_id, Event.deleted_at.is_(None)).limit(1))
     if not event:
         return response_not_found(message='Event not found')
 
@@ -87,10 +143,11 @@ def delete_event(db: Session, event_id: UUID4, current_user_id: int):
         return response_forbidden(message="You don't have permission to delete this event")
 
     try:
-        db.delete(event)
-        db.commit()
+        await db.delete(event)
+        await db.commit()
+        response_cache.invalidate('events', f'event:{event_id}')
         return response_success(message='Event deleted')
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error deleting event: {e}')
         return response_bad_request(message='Could not delete event')
@@ -0,0 +1,81 @@
+from typing import Any, Dict, Optional, Tuple, Type, get_args
+
+from pydantic import BaseModel
+from sqlalchemy import Select, inspect, select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+# Fields that must never be serialized for a related row, e.g. the author of a public article
+SECRET_FIELDS = frozenset({'password', 'refresh_token'})
+
+# Loader options per (model, response schema), derived once from the fields of the schema
+_loader_options: Dict[Tuple[Any, Any], Tuple[LoaderOption, ...]] = {}
+
+
+def _nested_schema(annotation: Any) -> Optional[Type[BaseModel]]:
+    """Return the response schema inside an annotation, e.g. UserResponse for Optional[UserResponse] or list[UserResponse]"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in get_args(annotation):
+        schema = _nested_schema(arg)
+        if schema is not None:
+            return schema
+    return None
+
+
+def _build_loader_options(model: Any, schema: Type[BaseModel]) -> Tuple[LoaderOption, ...]:
+    """Build eager loader options for every relationship of the model that the schema serializes"""
+    relationships = inspect(model).relationships
+    options = []
+    for name, field in schema.model_fields.items():
+        relationship = relationships.get(name)
+        if relationship is None:
+            continue
+        # Many-to-one relationships are joined into the same query, collections are loaded with one extra query
+        option = selectinload(getattr(model, name)) if relationship.uselist else joinedload(getattr(model, name))
+        nested_schema = _nested_schema(field.annotation)
+        if nested_schema is not None:
+            secrets = SECRET_FIELDS.intersection(nested_schema.model_fields)
+            if secrets:
+                raise ValueError(f'{schema.__name__}.{name} would serialize {", ".join(sorted(secrets))} of every related row, use a public schema')
+            nested_options = get_loader_options(relationship.mapper.class_, nested_schema)
+            if nested_options:
+                option = option.options(*nested_options)
+        options.append(option)
+    return tuple(options)
+
+
+def get_loader_options(model: Any, schema: Type[BaseModel]) -> Tuple[LoaderOption, ...]:
+    """
+    Get the eager loader options needed to serialize a model with a response schema.
+
+    The options are derived from the schema, every field that is a relationship on the model is eager loaded, including
+    nested relationships, so serializing a list of rows never lazy loads a relationship per row. A nested schema must not
+    include SECRET_FIELDS, a ValueError is raised otherwise.
+
+    :param model: SQLAlchemy model, e.g. Event
+    :type model: Any
+    :param schema: Response schema, e.g. EventResponse
+    :type schema: Type[BaseModel]
+    :return: Loader options
+    :rtype: Tuple[LoaderOption, ...]
+    """
+    key = (model, schema)
+    options = _loader_options.get(key)
+    if options is None:
+        options = _loader_options[key] = _build_loader_options(model, schema)
+    return options
+
+
+def select_for(model: Any, schema: Type[BaseModel]) -> Select:
+    """
+    Select rows of a model together with every relationship serialized by the response schema.
+
+    :param model: SQLAlchemy model, e.g. Event
+    :type model: Any
+    :param schema: Response schema, e.g. EventResponse
+    :type schema: Type[BaseModel]
+    :return: Select statement
+    :rtype: Select
+    """
+    return select(model).options(*get_loader_options(model, schema))
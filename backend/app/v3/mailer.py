@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import signal
+import smtplib
+import uuid
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from functools import lru_cache
+from os import makedirs, path
+from time import monotonic, perf_counter
+from typing import List, NamedTuple, Optional, Protocol, Sequence
+
+from sqlalchemy import delete, select
+
+from app.dependencies import DbSession, get_async_session
+from app.metrics import EMAIL_SEND_LATENCY, EMAILS_SENT
+from app.models.email import EMAIL_STATUS_FAILED, EMAIL_STATUS_PENDING, EMAIL_STATUS_SENT, OutboxEmail
+from app.v3.utils import postmark_client, sendgrid_client
+from config import Config
+
+
+class Email(NamedTuple):
+    """Email to be sent by a provider"""
+
+    to: str
+    subject: str
+    html_content: str
+    from_email: str
+
+
+class EmailProvider(Protocol):
+    """Interface for email providers, send_batch returns the error for every email, or None when it was sent."""
+
+    name: str
+
+    def send_batch(self, emails: Sequence[Email]) -> List[Optional[str]]:  # noqa: D102
+        ...
+
+
+class SendGridProvider:
+    """Send emails with SendGrid, one request per email as every email has its own content"""
+
+    name = 'sendgrid'
+
+    def send_batch(self, emails: Sequence[Email]) -> List[Optional[str]]:  # noqa: D102
+        client = sendgrid_client()
+        errors = []
+        for email in emails:
+            message = {
+                'personalizations': [{'to': [{'email': email.to}]}],
+                'from': {'email': email.from_email},
+                'subject': email.subject,
+                'content': [{'type': 'text/html', 'value': email.html_content}],
+            }
+            try:
+                client.send(message)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+
+class PostmarkProvider:
+    """Send emails with the Postmark batch API, up to 500 emails per request"""
+
+    name = 'postmark'
+
+    def send_batch(self, emails: Sequence[Email]) -> List[Optional[str]]:  # noqa: D102
+        messages = [{'From': email.from_email, 'To': email.to, 'Subject': email.subject, 'HtmlBody': email.html_content} for email in emails]
+        responses = postmark_client().emails.send_batch(*messages)
+        return [None if response.get('ErrorCode') == 0 else response.get('Message', 'Unknown error') for response in responses]
+
+
+class SMTPProvider:
+    """Send emails to an SMTP server, over one connection per batch"""
+
+    name = 'smtp'
+
+    def send_batch(self, emails: Sequence[Email]) -> List[Optional[str]]:  # noqa: D102
+        errors = []
+        with smtplib.SMTP(host=Config.SMTP_HOST, port=Config.SMTP_PORT, timeout=30) as smtp:
+            if Config.SMTP_STARTTLS:
+                smtp.starttls()
+            if Config.SMTP_USERNAME:
+                smtp.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+            for email in emails:
+                try:
+                    smtp.send_message(_to_message(email))
+                    errors.append(None)
+                except smtplib.SMTPException as e:
+                    errors.append(str(e))
+        return errors
+
+
+class FileProvider:
+    """Write emails as .eml files to Config.EMAIL_FILE_DIR, for local development and tests"""
+
+    name = 'file'
+
+    def send_batch(self, emails: Sequence[Email]) -> List[Optional[str]]:  # noqa: D102
+        if not path.exists(Config.EMAIL_FILE_DIR):
+            makedirs(Config.EMAIL_FILE_DIR)
+        for email in emails:
+            filename = f'{datetime.now(tz=timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex}.eml'
+            with open(path.join(Config.EMAIL_FILE_DIR, filename), 'w') as file:
+                file.write(_to_message(email).as_string())
+        return [None] * len(emails)
+
+
+def _to_message(email: Email) -> EmailMessage:
+    """Build a MIME message from an email"""
+    message = EmailMessage()
+    message['From'] = email.from_email
+    message['To'] = email.to
+    message['Subject'] = email.subject
+    message.set_content(email.html_content, subtype='html')
+    return message
+
+
+_PROVIDERS = {provider.name: provider for provider in (SendGridProvider, PostmarkProvider, SMTPProvider, FileProvider)}
+
+
+@lru_cache(maxsize=1)
+def get_email_provider() -> Optional[EmailProvider]:
+    """
+    Get the configured email provider.
+
+    Defaults to the provider with an API key set, and to the file provider in local development.
+
+    :return: Email provider, or None when no provider is configured
+    :rtype: Optional[EmailProvider]
+    """
+    name = Config.EMAIL_PROVIDER
+    if not name:
+        if Config.SENDGRID_API_KEY:
+            name = SendGridProvider.name
+        elif Config.POSTMARK_API_KEY:
+            name = PostmarkProvider.name
+        elif Config.IN_LOCAL_DEVELOPMENT_ENV:
+            name = FileProvider.name
+    provider = _PROVIDERS.get(name)
+    if provider is None:
+        logging.error('No email provider configured, please set EMAIL_PROVIDER or either SendGrid or Postmark API key')
+        return None
+    logging.debug(f'Email provider: {provider.name}')
+    return provider()
+
+
+def queue_email(db: DbSession, to: str, subject: str, html_content: str, from_email: str = Config.FROM_EMAIL) -> OutboxEmail:
+    """
+    Add an email to the outbox, it is stored when the session is committed.
+
+    Call email_outbox.wake() after the commit to have the worker send it right away.
+
+    :param db: Database session
+    :type db: DbSession
+    :param to: Email address of the recipient
+    :type to: str
+    :param subject: Subject of the email
+    :type subject: str
+    :param html_content: HTML content of the email
+    :type html_content: str
+    :param from_email: Email address of the sender
+    :type from_email: str
+    :return: The outbox email
+    :rtype: OutboxEmail
+    """
+    email = OutboxEmail(to_email=to, from_email=from_email, subject=subject, html_content=html_content, next_attempt_at=_utcnow())
+    db.add(email)
+    return email
+
+
+def _utcnow() -> datetime:
+    """Return the current time in UTC, without time zone as stored in the outbox"""
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
+class EmailOutboxWorker:
+    """
+    Background task sending the emails in the outbox.
+
+    Due emails are claimed in batches by pushing their next attempt past a lease, so several workers can run at the same
+    time, on PostgreSQL the rows are also locked with SKIP LOCKED while they are claimed. Failed emails are retried with
+    exponential backoff, until the maximum number of attempts.
+
+    Emails hold one-time codes and reset links, so the content of sent emails is cleared, and sent and failed emails are
+    deleted once their last attempt is older than the retention.
+    """
+
+    # Seconds between the deletes of the sent and failed emails past the retention
+    purge_interval = 3600
+
+    def __init__(  # noqa: D107, PLR0913
+        self, batch_size: int, poll_interval: float, lease_secs: int, max_attempts: int, backoff_secs: int, retention_secs: int
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_secs = lease_secs
+        self.max_attempts = max_attempts
+        self.backoff_secs = backoff_secs
+        self.retention_secs = retention_secs
+        self._purged_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start the worker on the running event loop"""
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name='email-outbox')
+            logging.debug('Email outbox worker started')
+
+    async def stop(self) -> None:
+        """Stop the worker, waiting for the batch being sent"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logging.debug('Email outbox worker stopped')
+
+    def wake(self) -> None:
+        """Check the outbox now, instead of at the next poll"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Send due emails until stopped"""
+        while not self._stopping:
+            self._wakeup.clear()
+            if self._purged_at is None or monotonic() - self._purged_at >= self.purge_interval:
+                self._purged_at = monotonic()
+                try:
+                    await self.purge()
+                except Exception as e:
+                    logging.error(f'Error purging the email outbox: {e}')
+            try:
+                sent = await self.process_batch()
+            except Exception as e:
+                logging.error(f'Error processing the email outbox: {e}')
+                sent = 0
+            if sent < self.batch_size:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+
+    async def process_batch(self) -> int:
+        """
+        Claim and send one batch of due emails.
+
+        :return: Number of emails in the batch
+        """
+        provider = get_email_provider()
+        if provider is None:
+            return 0
+
+        db = get_async_session()
+        try:
+            emails = await self._claim(db)
+            if not emails:
+                return 0
+            batch = [Email(to=email.to_email, subject=email.subject, html_content=email.html_content, from_email=email.from_email) for email in emails]
+            started_at = perf_counter()
+            try:
+                errors = await asyncio.to_thread(provider.send_batch, batch)
+            except Exception as e:
+                errors = [str(e)] * len(batch)
+            EMAIL_SEND_LATENCY.labels(provider=provider.name).observe(perf_counter() - started_at)
+            EMAILS_SENT.labels(provider=provider.name, result='sent').inc(errors.count(None))
+            EMAILS_SENT.labels(provider=provider.name, result='failed').inc(len(errors) - errors.count(None))
+
+            now = _utcnow()
+            for email, error in zip(emails, errors):
+                if error is None:
+                    email.status = EMAIL_STATUS_SENT
+                    email.sent_at = now
+                    email.last_error = None
+                    email.html_content = ''
+                    continue
+                email.last_error = error
+                if email.attempts >= self.max_attempts:
+                    email.status = EMAIL_STATUS_FAILED
+                    logging.error(f'Giving up on email {email.id} after {email.attempts} attempts: {error}')
+                else:
+                    email.next_attempt_at = now + timedelta(seconds=self.backoff_secs * 2 ** (email.attempts - 1))
+                    logging.warning(f'Error sending email {email.id}, attempt {email.attempts}: {error}')
+            await db.commit()
+            logging.debug(f'Email outbox batch processed: {errors.count(None)} of {len(emails)} sent with {provider.name}')
+            return len(emails)
+        finally:
+            await db.close()
+
+    async def _claim(self, db: DbSession) -> List[OutboxEmail]:
+        """Claim a batch of due emails, by moving their next attempt past the lease"""
+        now = _utcnow()
+        emails = (
+            await db.scalars(
+                select(OutboxEmail)
+                .where(OutboxEmail.status == EMAIL_STATUS_PENDING, OutboxEmail.next_attempt_at <= now)
+                .order_by(OutboxEmail.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        for email in emails:
+            email.attempts += 1
+            email.next_attempt_at = now + timedelta(seconds=self.lease_secs)
+        await db.commit()
+        return list(emails)
+
+    async def purge(self) -> int:
+        """
+        Delete the sent and failed emails whose last attempt is older than the retention.
+
+        :return: Number of deleted emails
+        """
+        # The next attempt of sent and failed emails is the end of the lease of their last attempt
+        cutoff = _utcnow() - timedelta(seconds=self.retention_secs)
+        db = get_async_session()
+        try:
+            result = await db.execute(
+                delete(OutboxEmail).where(OutboxEmail.status.in_([EMAIL_STATUS_SENT, EMAIL_STATUS_FAILED]), OutboxEmail.next_attempt_at < cutoff)
+            )
+            await db.commit()
+            logging.debug(f'Email outbox purged: {result.rowcount} emails deleted')
+            return result.rowcount
+        finally:
+            await db.close()
+
+
+email_outbox = EmailOutboxWorker(
+    batch_size=Config.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_interval=Config.EMAIL_OUTBOX_POLL_SECS,
+    lease_secs=Config.EMAIL_OUTBOX_LEASE_SECS,
+    max_attempts=Config.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    backoff_secs=Config.EMAIL_OUTBOX_BACKOFF_SECS,
+    retention_secs=Config.EMAIL_OUTBOX_RETENTION_SECS,
+)
+
+
+async def run_email_outbox() -> None:
+    """Run the email outbox worker until interrupted or terminated, in a process of its own"""
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+    email_outbox.start()
+    try:
+        await stopped.wait()
+    finally:
+        await email_outbox.stop()
+
+
+if __name__ == '__main__':
+    # Usage, from the backend directory, with EMAIL_OUTBOX_WORKER_DISABLED set for the server: python -m app.v3.mailer
+    asyncio.run(run_email_outbox())
@@ -1,11 +1,10 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.responses import JSONResponse
 from pydantic import UUID4
-from sqlalchemy.orm import Session
 
-from app.dependencies import get_db
+from app.dependencies import DbSession, get_db
 from app.models.user import User
 from app.v3.auth.utils import get_current_user
 from app.v3.events.schemas import EventResponse
@@ -19,6 +18,7 @@ from app.v3.organisations.service import (
     get_organisations,
     update_organisation,
 )
+from app.v3.responses import ConditionalRequest, get_conditional_request
 
 router = APIRouter()
 
@@ -29,10 +29,10 @@ router = APIRouter()
     response_model=OrganisationResponse,
 )
 async def post_create_organisation(
-    organisation_data: OrganisationCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    organisation_data: OrganisationCreate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Create a new organisation"""
-    return create_organisation(db=db, current_user=current_user, organisation_data=organisation_data)
+    return await create_organisation(db=db, current_user=current_user, organisation_data=organisation_data)
 
 
 @router.get(
@@ -40,9 +40,15 @@ async def post_create_organisation(
     name='O-2',
     response_model=List[OrganisationResponse],
 )
-async def get_organisations_list(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_organisations_list(
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    conditional: ConditionalRequest = Depends(get_conditional_request),
+    db: DbSession = Depends(get_db),
+) -> JSONResponse:
     """Get all organisations"""
-    return get_organisations(db=db, skip=skip, limit=limit)
+    return await get_organisations(db=db, skip=skip, limit=limit, cursor=cursor, conditional=conditional)
 
 
 @router.get(
@@ -50,9 +56,11 @@ async def get_organisations_list(skip: int = 0, limit: int = 100, db: Session =
     name='O-3',
     response_model=OrganisationResponse,
 )
-async def get_organisation_by_id(organisation_id: UUID4, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_organisation_by_id(
+    organisation_id: UUID4, conditional: ConditionalRequest = Depends(get_conditional_request), db: DbSession = Depends(get_db)
+) -> JSONResponse:
     """Get organisation by ID"""
-    return get_organisation(db=db, organisation_id=organisation_id)
+    return await get_organisation(db=db, organisation_id=organisation_id, conditional=conditional)
 
 
 @router.put(
@@ -61,28 +69,30 @@ async def get_organisation_by_id(organisation_id: UUID4, db: Session = Depends(g
     response_model=OrganisationResponse,
 )
 async def put_update_organisation(
-    organisation_id: int, organisation_data: OrganisationUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    organisation_id: int, organisation_data: OrganisationUpdate, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)
 ) -> JSONResponse:
     """Update organisation"""
-    return update_organisation(db=db, organisation_id=organisation_id, current_user=current_user, organisation_data=organisation_data)
+    return await update_organisation(db=db, organisation_id=organisation_id, current_user=current_user, organisation_data=organisation_data)
 
 
 @router.delete(
     '/{organisation_id}',
     name='O-5',
 )
-async def delete_organisation_by_id(organisation_id: UUID4, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def delete_organisation_by_id(organisation_id: UUID4, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Delete organisation"""
-    return delete_organisation(db=db, organisation_id=organisation_id, current_user=current_user)
+    return await delete_organisation(db=db, organisation_id=organisation_id, current_user=current_user)
 
 
 @router.get('/{organisation_id}/events', name='O-6', response_model=List[EventResponse])
-async def get_organisation_events(organisation_id: UUID4, db: Session = Depends(get_db)) -> JSONResponse:
+async def get_organisation_events(
+    organisation_id: UUID4, conditional: ConditionalRequest = Depends(get_conditional_request), db: DbSession = Depends(get_db)
+) -> JSONResponse:
     """Get non-deleted events associated with the organisation"""
-    return fetch_organisation_events(organisation_id=organisation_id, db=db)
+    return await fetch_organisation_events(organisation_id=organisation_id, db=db, conditional=conditional)
 
 
 @router.get('/{organisation_id}/events/all', name='O-7', response_model=List[EventResponse])
-async def get_organisation_events_all(organisation_id: UUID4, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def get_organisation_events_all(organisation_id: UUID4, current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get all events associated with the organisation"""
-    return fetch_organisation_events_all(organisation_id=organisation_id, current_user=current_user, db=db)
+    return await fetch_organisation_events_all(organisation_id=organisation_id, current_user=current_user, db=db)
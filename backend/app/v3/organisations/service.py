@@ -1,63 +1,97 @@
 import logging
 from datetime import datetime
+from typing import Optional
 
-from pydantic import UUID4, TypeAdapter
+from pydantic import UUID4
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 from tunsberg.responses import (
     response_bad_request,
     response_conflict,
-    response_created,
     response_forbidden,
     response_not_found,
-    response_success,
 )
 
+from app.dependencies import DbSession
 from app.models.event import Event
 from app.models.organisation import Organisation
 from app.models.user import User
 from app.v3.events.schemas import EventResponse
+from app.v3.events.service import event_tags, select_events
+from app.v3.loaders import select_for
 from app.v3.organisations.schemas import OrganisationCreate, OrganisationResponse, OrganisationUpdate
+from app.v3.responses import (
+    ConditionalRequest,
+    build_cached_response,
+    get_last_modified,
+    get_serializer,
+    response_cache,
+    response_cacheable,
+    response_created,
+    response_success,
+)
+from app.v3.utils import get_keyset_page, paginate_keyset
+
+organisation_serializer = get_serializer(OrganisationResponse)
+organisations_serializer = get_serializer(list[OrganisationResponse])
+events_serializer = get_serializer(list[EventResponse])
+
+# Sort key for paginated organisation lists, matches the ix_organisations_created_at_id index
+ORGANISATIONS_SORT_KEY = (Organisation.created_at, Organisation.id)
 
 
-def create_organisation(db: Session, current_user: User, organisation_data: OrganisationCreate):
+async def create_organisation(db: DbSession, current_user: User, organisation_data: OrganisationCreate):
     """Create a new organisation"""
     try:
         organisation = Organisation(**organisation_data.model_dump(), created_by_id=current_user.id)
         db.add(organisation)
-        db.commit()
-        db.refresh(organisation)
+        await db.commit()
+        await db.refresh(organisation)
+        response_cache.invalidate('organisations')
 
-        adapter = TypeAdapter(OrganisationResponse)
-        return response_created(message='Organisation created', data=adapter.dump_json(organisation))
+        return response_created(message='Organisation created', data=organisation_serializer.dump_json(organisation))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error creating organisation: {e}')
         return response_conflict(message='Organisation with this name already exists')
 
 
-def get_organisations(db: Session, skip: int = 0, limit: int = 100):
+async def get_organisations(db: DbSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, conditional: Optional[ConditionalRequest] = None):
     """Get all organisations"""
-    organisations = db.query(Organisation).offset(skip).limit(limit).all()
-
-    adapter = TypeAdapter(OrganisationResponse)
-    data = adapter.dump_python(organisations, mode='json')
-    return response_success(message='Organisations retrieved', data=data)
-
-
-def get_organisation(db: Session, organisation_id: int):
+    key = ('organisations', skip, limit, cursor)
+    cached = response_cache.get(key)
+    if cached is None:
+        tags = ['organisations']
+        versions = response_cache.versions(tags)
+        query = paginate_keyset(select_for(Organisation, OrganisationResponse), columns=ORGANISATIONS_SORT_KEY, limit=limit, cursor=cursor, skip=skip)
+        organisations, pagination = get_keyset_page((await db.scalars(query)).all(), columns=ORGANISATIONS_SORT_KEY, limit=limit)
+        cached = build_cached_response(
+            'Organisations retrieved', organisations_serializer, organisations, last_modified=get_last_modified(organisations), pagination=pagination
+        )
+        response_cache.set(key, cached, tags=tags, versions=versions)
+
+    return response_cacheable(conditional, cached)
+
+
+async def get_organisation(db: DbSession, organisation_id: int, conditional: Optional[ConditionalRequest] = None):
     """Get organisation by ID"""
-    organisation = db.query(Organisation).filter(Organisation.id == organisation_id).first()
-    if not organisation:
-        return response_not_found(message='Organisation not found')
+    key = ('organisation', str(organisation_id))
+    cached = response_cache.get(key)
+    if cached is None:
+        tags = [f'organisation:{organisation_id}']
+        versions = response_cache.versions(tags)
+        organisation = await db.scalar(select_for(Organisation, OrganisationResponse).where(Organisation.id == organisation_id).limit(1))
+        if not organisation:
+            return response_not_found(message='Organisation not found')
+        cached = build_cached_response('Organisation retrieved', organisation_serializer, organisation, last_modified=get_last_modified([organisation]))
+        response_cache.set(key, cached, tags=tags, versions=versions)
 
-    adapter = TypeAdapter(OrganisationResponse)
-    return response_success(message='Organisation retrieved', data=adapter.dump_json(organisation))
+    return response_cacheable(conditional, cached)
 
 
-def update_organisation(db: Session, organisation_id: UUID4, current_user: User, organisation_data: OrganisationUpdate):
+async def update_organisation(db: DbSession, organisation_id: UUID4, current_user: User, organisation_data: OrganisationUpdate):
     """Update organisation"""
-    organisation = db.query(Organisation).filter(Organisation.id == organisation_id).first()
+    organisation = await db.scalar(select(Organisation).where(Organisation.id == organisation_id).limit(1))
     if not organisation:
         return response_not_found(message='Organisation not found')
 
@@ -70,20 +104,20 @@ def update_organisation(db: Session, organisation_id: UUID4, current_user: User,
             setattr(organisation, field, value)
 
         organisation.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(organisation)
+        await db.commit()
+        response_cache.invalidate('organisations', f'organisation:{organisation_id}')
+        await db.refresh(organisation)
 
-        adapter = TypeAdapter(OrganisationResponse)
-        return response_success(message='Organisation updated', data=adapter.dump_json(organisation))
+        return response_success(message='Organisation updated', data=organisation_serializer.dump_json(organisation))
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error updating organisation: {e}')
         return response_conflict(message='Organisation with this name already exists')
 
 
-def delete_organisation(db: Session, organisation_id: UUID4, current_user: User):
+async def delete_organisation(db: DbSession, organisation_id: UUID4, current_user: User):
     """Delete organisation"""
-    organisation = db.query(Organisation).filter(Organisation.id == organisation_id).first()
+    organisation = await db.scalar(select(Organisation).where(Organisation.id == organisation_id).limit(1))
     if not organisation:
         return response_not_found(message='Organisation not found')
 
@@ -91,30 +125,32 @@ def delete_organisation(db: Session, organisation_id: UUID4, current_user: User)
         return response_forbidden(message="You don't have permission to delete this organisation")
 
     try:
-        db.delete(organisation)
-        db.commit()
+        await db.delete(organisation)
+        await db.commit()
+        response_cache.invalidate('organisations', f'organisation:{organisation_id}')
         return response_success(message='Organisation deleted')
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f'Error deleting organisation: {e}')
         return response_bad_request(message='Could not delete organisation')
 
 
-def fetch_organisation_events(organisation_id: UUID4, db: Session):
+async def fetch_organisation_events(organisation_id: UUID4, db: DbSession, conditional: Optional[ConditionalRequest] = None):
     """Get events associated with the organisation"""
-    events = db.query(Event).filter(Event.organisation_id == organisation_id, Event.deleted_at.is_(None)).all()
-
-    adapter = TypeAdapter(list[EventResponse])
-    events = adapter.dump_json(events)
+    key = ('organisation_events', str(organisation_id))
+    cached = response_cache.get(key)
+    if cached is None:
+        tags = event_tags('events')
+        versions = response_cache.versions(tags)
+        events = (await db.scalars(select_events().where(Event.organisation_id == organisation_id, Event.deleted_at.is_(None)))).all()
+        cached = build_cached_response('Events successfully fetched', events_serializer, events, last_modified=get_last_modified(events))
+        response_cache.set(key, cached, tags=tags, versions=versions)
 
-    return response_success(message='Events successfully fetched', data=events)
+    return response_cacheable(conditional, cached)
 
 
-def fetch_organisation_events_all(organisation_id: UUID4, current_user: User, db: Session):
+async def fetch_organisation_events_all(organisation_id: UUID4, current_user: User, db: DbSession):
     """Get events associated with the organisation"""
-    events = db.query(Event).filter(Event.organisation_id == organisation_id).all()
-
-    adapter = TypeAdapter(list[EventResponse])
-    events = adapter.dump_json(events)
+    events = (await db.scalars(select_events().where(Event.organisation_id == organisation_id))).all()
 
-    return response_success(message='Events successfully fetched', data=events)
+    return response_success(message='Events successfully fetched', data=events_serializer.dump_json(events))
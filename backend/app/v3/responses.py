@@ -0,0 +1,255 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+from time import perf_counter
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+import orjson
+from fastapi import Request
+from pydantic import TypeAdapter
+from starlette import status
+from starlette.responses import Response
+
+from app.cache import CacheBackend, TaggedCache, TTLCache
+from app.timing import record_serialization
+from config import Config
+
+
+class Serializer:
+    """TypeAdapter for a response schema, adding the time spent in dump_json to the timings of the current request."""
+
+    __slots__ = ('adapter',)
+
+    def __init__(self, adapter: TypeAdapter):  # noqa: D107
+        self.adapter = adapter
+
+    def dump_json(self, value: Any, **kwargs) -> bytes:  # noqa: D102
+        started_at = perf_counter()
+        try:
+            return self.adapter.dump_json(value, **kwargs)
+        finally:
+            record_serialization(perf_counter() - started_at)
+
+    def __getattr__(self, name: str) -> Any:  # noqa: D105
+        return getattr(self.adapter, name)
+
+
+# Response schemas compiled to TypeAdapters once, and shared by every service
+_serializers: Dict[Any, Serializer] = {}
+
+
+def get_serializer(schema: Any) -> Serializer:
+    """
+    Get the serializer for a response schema, its TypeAdapter is only built the first time the schema is requested.
+
+    :param schema: Response schema, e.g. EventResponse or list[EventResponse]
+    :type schema: Any
+    :return: Serializer for the schema
+    :rtype: Serializer
+    """
+    serializer = _serializers.get(schema)
+    if serializer is None:
+        serializer = _serializers[schema] = Serializer(TypeAdapter(schema))
+    return serializer
+
+
+class JSONBytesResponse(Response):
+    """Response for a body that is already encoded as JSON."""
+
+    media_type = 'application/json'
+
+
+def response_json(
+    status_code: int,
+    message: str,
+    data: Optional[Any] = None,
+    pagination: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> JSONBytesResponse:
+    """
+    Build the standard response body directly as bytes.
+
+    The body matches the format of the tunsberg responses, but data that has already been serialized, e.g. by
+    TypeAdapter.dump_json, is embedded as is instead of being decoded and encoded again.
+
+    :param status_code: HTTP status code
+    :type status_code: int
+    :param message: Message to be returned
+    :type message: str
+    :param data: JSON encoded bytes, or any value orjson can encode
+    :type data: Any
+    :param pagination: Pagination details, e.g. the cursor for the next page
+    :type pagination: Dict[str, Any]
+    :param headers: Additional response headers
+    :type headers: Dict[str, str]
+    :return: JSON response
+    :rtype: JSONBytesResponse
+    """
+    body = b'{"status_code":%d,"message":%s' % (status_code, orjson.dumps(message))
+    if data is not None:
+        body += b',"data":' + (data if isinstance(data, bytes) else orjson.dumps(data))
+    if pagination is not None:
+        body += b',"pagination":' + orjson.dumps(pagination)
+    return JSONBytesResponse(content=body + b'}', status_code=status_code, headers=headers)
+
+
+def response_success(
+    message: str = 'Resources was successfully retrieved', data: Optional[Any] = None, pagination: Optional[Dict[str, Any]] = None
+) -> JSONBytesResponse:
+    """
+    Use this response when a resource is successfully retrieved.
+
+    :param message: Message to be returned
+    :type message: str
+    :param data: JSON encoded bytes, or any value orjson can encode
+    :type data: Any
+    :param pagination: Pagination details, e.g. the cursor for the next page
+    :type pagination: Dict[str, Any]
+    :return: JSON response
+    :rtype: JSONBytesResponse
+    """
+    return response_json(status_code=status.HTTP_200_OK, message=message, data=data, pagination=pagination)
+
+
+def response_created(message: str = 'Resource was successfully created', data: Optional[Any] = None) -> JSONBytesResponse:
+    """
+    Use this response when a resource is successfully created.
+
+    :param message: Message to be returned
+    :type message: str
+    :param data: JSON encoded bytes, or any value orjson can encode
+    :type data: Any
+    :return: JSON response
+    :rtype: JSONBytesResponse
+    """
+    return response_json(status_code=status.HTTP_201_CREATED, message=message, data=data)
+
+
+class ConditionalRequest(NamedTuple):
+    """Validators sent by the client in a conditional GET request"""
+
+    if_none_match: Optional[str] = None
+    if_modified_since: Optional[datetime] = None
+
+
+async def get_conditional_request(request: Request) -> ConditionalRequest:
+    """
+    Return the If-None-Match and If-Modified-Since headers of the request.
+
+    An invalid If-Modified-Since date is ignored, as required by RFC 9110.
+    """
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is not None:
+        try:
+            if_modified_since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            if_modified_since = None
+        if if_modified_since is not None and if_modified_since.tzinfo is None:
+            if_modified_since = if_modified_since.replace(tzinfo=timezone.utc)
+    return ConditionalRequest(if_none_match=request.headers.get('if-none-match'), if_modified_since=if_modified_since)
+
+
+def get_last_modified(rows: Iterable[Any]) -> Optional[datetime]:
+    """
+    Get the last modification time of a resource or a list of resources.
+
+    :param rows: Models with created_at and updated_at columns
+    :type rows: Iterable[Any]
+    :return: Latest updated_at, or created_at for rows that were never updated, in UTC and truncated to seconds
+    :rtype: Optional[datetime]
+    """
+    times = [row.updated_at or row.created_at for row in rows]
+    times = [time for time in times if time is not None]
+    if not times:
+        return None
+    last_modified = max(times)
+    # Timestamps are stored without time zone, in UTC
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, with the weak comparison required for GET"""
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def _not_modified(headers: Dict[str, str]) -> Response:
+    """Build a 304 Not Modified response, without a body"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+class CachedResponse(NamedTuple):
+    """Encoded body and validators of a public response, as kept in the response cache"""
+
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def build_cached_response(
+    message: str, serializer: Serializer, value: Any, last_modified: Optional[datetime] = None, pagination: Optional[Dict[str, Any]] = None
+) -> CachedResponse:
+    """
+    Serialize a public response once, with a strong ETag computed from the hash of the body.
+
+    :param message: Message to be returned
+    :type message: str
+    :param serializer: Serializer for the response schema
+    :type serializer: Serializer
+    :param value: Resource or list of resources to be serialized
+    :type value: Any
+    :param last_modified: Last modification time of the resource, see get_last_modified
+    :type last_modified: Optional[datetime]
+    :param pagination: Pagination details, e.g. the cursor for the next page
+    :type pagination: Dict[str, Any]
+    :return: Cached response
+    :rtype: CachedResponse
+    """
+    body = response_json(status_code=status.HTTP_200_OK, message=message, data=serializer.dump_json(value), pagination=pagination).body
+    return CachedResponse(body=body, etag=f'"{blake2b(body, digest_size=16).hexdigest()}"', last_modified=last_modified)
+
+
+def response_cacheable(conditional: Optional[ConditionalRequest], cached: CachedResponse) -> Response:
+    """
+    Use this response when a public resource is successfully retrieved, answering conditional requests with 304.
+
+    The response carries the ETag and Last-Modified of the cached response. If-None-Match takes precedence over
+    If-Modified-Since, so clients sending the ETag also see rows that were deleted from a list.
+
+    :param conditional: Validators sent by the client, None for an unconditional request
+    :type conditional: Optional[ConditionalRequest]
+    :param cached: Response built by build_cached_response
+    :type cached: CachedResponse
+    :return: JSON response, or an empty 304 Not Modified response
+    :rtype: Response
+    """
+    # Clients revalidate on every use instead of caching by heuristic on Last-Modified
+    headers = {'Cache-Control': 'no-cache', 'ETag': cached.etag}
+    if cached.last_modified is not None:
+        headers['Last-Modified'] = format_datetime(cached.last_modified, usegmt=True)
+    conditional = conditional or ConditionalRequest()
+    if conditional.if_none_match is not None:
+        if _etag_matches(conditional.if_none_match, cached.etag):
+            return _not_modified(headers)
+    elif conditional.if_modified_since is not None and cached.last_modified is not None and cached.last_modified <= conditional.if_modified_since:
+        return _not_modified(headers)
+    return JSONBytesResponse(content=cached.body, status_code=status.HTTP_200_OK, headers=headers)
+
+
+# Public responses, tagged by the resources they contain, see the invalidate calls in the write services
+response_cache = TaggedCache(TTLCache(max_size=Config.RESPONSE_CACHE_MAX_SIZE, ttl=Config.RESPONSE_CACHE_TTL_SECS), name='response')
+
+
+def set_response_cache_backend(backend: CacheBackend) -> None:
+    """
+    Replace the in-process response cache, e.g. with a backend shared between workers, or a DictCache in tests
+
+    The tag versions stay in TagVersions, shared by the workers of the host.
+
+    :param backend: Cache backend storing the responses
+    :type backend: CacheBackend
+    """
+    response_cache.backend = backend
@@ -0,0 +1,35 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse
+
+from app.dependencies import DbSession, get_db
+from app.v3.articles.schemas import ArticleResponse
+from app.v3.events.schemas import EventResponse
+from app.v3.search.service import search_articles, search_events
+
+router = APIRouter()
+
+
+@router.get(
+    '/events',
+    name='SE-1',
+    response_model=List[EventResponse],
+)
+async def get_search_events(
+    q: str = Query(..., min_length=1, max_length=200), limit: int = Query(100, ge=1, le=100), cursor: Optional[str] = None, db: DbSession = Depends(get_db)
+) -> JSONResponse:
+    """Search events"""
+    return await search_events(db=db, q=q, limit=limit, cursor=cursor)
+
+
+@router.get(
+    '/articles',
+    name='SE-2',
+    response_model=List[ArticleResponse],
+)
+async def get_search_articles(
+    q: str = Query(..., min_length=1, max_length=200), limit: int = Query(100, ge=1, le=100), cursor: Optional[str] = None, db: DbSession = Depends(get_db)
+) -> JSONResponse:
+    """Search published articles"""
+    return await search_articles(db=db, q=q, limit=limit, cursor=cursor)
@@ -0,0 +1,90 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, and_, func, literal, literal_column, or_
+from sqlalchemy.sql.elements import ColumnElement, Label
+
+from app.dependencies import DbSession
+from app.models.article import Article
+from app.models.event import Event
+from app.v3.articles.schemas import ArticleResponse
+from app.v3.articles.service import select_articles
+from app.v3.events.schemas import EventResponse
+from app.v3.events.service import select_events
+from app.v3.responses import get_serializer, response_success
+from app.v3.utils import encode_cursor, paginate_keyset
+
+events_serializer = get_serializer(list[EventResponse])
+articles_serializer = get_serializer(list[ArticleResponse])
+
+# Words of a search query, anything else is dropped so the query can not inject tsquery operators
+SEARCH_TERM = re.compile(r'\w+')
+SEARCH_MAX_TERMS = 10
+# Text search configuration of the search documents, without stemming as the content is in several languages
+SEARCH_CONFIG = literal_column("'simple'")
+
+# Generated tsvector columns, created on PostgreSQL only, see EVENT_SEARCH_DOCUMENT and ARTICLE_SEARCH_DOCUMENT
+EVENTS_SEARCH_VECTOR = literal_column('events.search_vector')
+ARTICLES_SEARCH_VECTOR = literal_column('articles.search_vector')
+
+
+def get_search_terms(q: str) -> List[str]:
+    """Split a search query into lower case words"""
+    return SEARCH_TERM.findall(q.lower())[:SEARCH_MAX_TERMS]
+
+
+def _escape_like(term: str) -> str:
+    """Escape the LIKE wildcards and the escape character in a term, for a pattern matched with a backslash as escape"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _match(db: DbSession, terms: List[str], search_vector: ColumnElement, fields: Tuple[ColumnElement, ...]) -> Tuple[ColumnElement, Label]:
+    """
+    Build the filter and rank of a search.
+
+    On PostgreSQL every term is matched as a prefix against the tsvector column, which is served by its GIN index, and
+    rows are ranked with ts_rank. Other databases, e.g. SQLite in development, match every term anywhere in one of the
+    fields and rank every row the same.
+    """
+    if db.bind.dialect.name == 'postgresql':
+        tsquery = func.to_tsquery(SEARCH_CONFIG, ' & '.join(f'{term}:*' for term in terms))
+        return search_vector.op('@@')(tsquery), func.ts_rank(search_vector, tsquery, type_=Float).label('rank')
+    condition = and_(*[or_(*[field.ilike(f'%{_escape_like(term)}%', escape='\\') for field in fields]) for term in terms])
+    return condition, literal(0.0, type_=Float).label('rank')
+
+
+def _search_page(rows: list, limit: int) -> Tuple[list, dict]:
+    """Split the (row, rank) results of a search into the rows of the page and its pagination details"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].rank, rows[-1][0].id])
+    return [row[0] for row in rows], {'limit': limit, 'next_cursor': next_cursor}
+
+
+async def search_events(db: DbSession, q: str, limit: int = 100, cursor: Optional[str] = None):
+    """Search events by title, city and description, best match first"""
+    terms = get_search_terms(q)
+    if not terms:
+        return response_success(message='Events found', data=events_serializer.dump_json([]), pagination={'limit': limit, 'next_cursor': None})
+
+    condition, rank = _match(db, terms, EVENTS_SEARCH_VECTOR, fields=(Event.title, Event.address_city, Event.description))
+    query = select_events().add_columns(rank).where(condition, Event.deleted_at.is_(None))
+    query = paginate_keyset(query, columns=(rank, Event.id), limit=limit, cursor=cursor, descending=True)
+    events, pagination = _search_page((await db.execute(query)).all(), limit=limit)
+
+    return response_success(message='Events found', data=events_serializer.dump_json(events), pagination=pagination)
+
+
+async def search_articles(db: DbSession, q: str, limit: int = 100, cursor: Optional[str] = None):
+    """Search published articles by title and content, best match first"""
+    terms = get_search_terms(q)
+    if not terms:
+        return response_success(message='Articles found', data=articles_serializer.dump_json([]), pagination={'limit': limit, 'next_cursor': None})
+
+    condition, rank = _match(db, terms, ARTICLES_SEARCH_VECTOR, fields=(Article.title, Article.content))
+    query = select_articles().add_columns(rank).where(condition, Article.deleted_at.is_(None), Article.published_at.isnot(None))
+    query = paginate_keyset(query, columns=(rank, Article.id), limit=limit, cursor=cursor, descending=True)
+    articles, pagination = _search_page((await db.execute(query)).all(), limit=limit)
+
+    return response_success(message='Articles found', data=articles_serializer.dump_json(articles), pagination=pagination)
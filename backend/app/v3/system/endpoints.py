@@ -1,9 +1,13 @@
 import logging
 
 from fastapi import APIRouter
-from tunsberg.responses import response_success
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.responses import Response
 
-from app.v3.system.schemas import S0Output
+from app.metrics import render_metrics
+from app.v3.responses import response_success
+from app.v3.system.schemas import S0Output, S2Output
+from app.v3.system.service import get_readiness
 
 router = APIRouter()
 
@@ -13,3 +17,15 @@ def endpoint_system_up():
     """Endpoint to check if the service is up."""
     logging.debug('Up endpoint called')
     return response_success(message='Service is up')
+
+
+@router.get('/metrics', tags=['system'], name='S-1', response_class=Response)
+def endpoint_system_metrics():
+    """Endpoint with the metrics of every worker, in the Prometheus text format."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get('/ready', tags=['system'], name='S-2', response_model=S2Output, responses={503: {'model': S2Output}})
+async def endpoint_system_ready():
+    """Endpoint to check if the service can serve requests: the database answers, the pool is not saturated and it is migrated."""
+    return await get_readiness()
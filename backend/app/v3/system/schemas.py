@@ -1,3 +1,5 @@
+from typing import Any, Dict
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,10 @@ class S0Output(BaseModel):
     """Response model for the system endpoints"""
 
     message: str
+
+
+class S2Output(BaseModel):
+    """Response model for the readiness endpoint, with the result of every check"""
+
+    message: str
+    data: Dict[str, Any]
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from functools import lru_cache
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+from starlette import status
+
+from alembic.script import ScriptDirectory
+from app.cache import TTLCache
+from app.dependencies import get_async_db_engine, get_db_engine
+from app.v3.responses import response_json
+from config import PROJECT_DIR, Config
+
+# Last readiness result of the worker, so frequent probes do not load the database
+_readiness = TTLCache(max_size=1, ttl=Config.READINESS_CACHE_SECS)
+_readiness_lock = asyncio.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_migration_heads() -> Tuple[str, ...]:
+    """Get the head revisions of the Alembic migrations shipped with the code, read once per worker"""
+    return tuple(ScriptDirectory(str(PROJECT_DIR / 'alembic')).get_heads())
+
+
+def _query_database(engine: Engine) -> Optional[str]:
+    """Run SELECT 1 on a pooled connection and return the migration revision of the database, None without Alembic"""
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+        try:
+            return connection.execute(text('SELECT version_num FROM alembic_version')).scalar()
+        except SQLAlchemyError:
+            return None
+
+
+async def _query_async_database() -> Optional[str]:
+    """Run the database queries of _query_database on the async engine"""
+    async with get_async_db_engine().connect() as connection:
+        await connection.execute(text('SELECT 1'))
+        try:
+            return (await connection.execute(text('SELECT version_num FROM alembic_version'))).scalar()
+        except SQLAlchemyError:
+            return None
+
+
+def _get_pool() -> Any:
+    """Get the connection pool of the engine the sessions use"""
+    return get_db_engine().pool if Config.DATABASE_SYNC_COMPAT else get_async_db_engine().sync_engine.pool
+
+
+async def check_readiness() -> Tuple[bool, Dict[str, Any]]:
+    """
+    Check that the worker can serve requests.
+
+    The worker is ready when a pooled connection runs SELECT 1 within Config.READINESS_TIMEOUT_SECS, the pool is not
+    saturated and the database is migrated to the head revision of the code. The migrations are not checked when the
+    tables are created from the models, see Config.DATABASE_CREATE_ALL.
+
+    :return: Whether the worker is ready, and the result of every check
+    :rtype: Tuple[bool, Dict[str, Any]]
+    """
+    checks: Dict[str, Any] = {}
+    ready = True
+
+    started_at = perf_counter()
+    revision = None
+    try:
+        query = asyncio.to_thread(_query_database, get_db_engine()) if Config.DATABASE_SYNC_COMPAT else _query_async_database()
+        revision = await asyncio.wait_for(query, timeout=Config.READINESS_TIMEOUT_SECS)
+        checks['database'] = {'ok': True, 'latency_ms': round((perf_counter() - started_at) * 1000, 1)}
+    except (asyncio.TimeoutError, SQLAlchemyError, OSError) as e:
+        ready = False
+        checks['database'] = {'ok': False, 'error': 'Timed out' if isinstance(e, asyncio.TimeoutError) else e.__class__.__name__}
+        logging.warning(f'Readiness database check failed: {e!r}')
+
+    pool = _get_pool()
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(Config.DATABASE_MAX_OVERFLOW, 0)
+        checked_out = pool.checkedout()
+        saturated = checked_out >= capacity * Config.READINESS_MAX_POOL_USAGE
+        ready = ready and not saturated
+        checks['pool'] = {'ok': not saturated, 'checked_out': checked_out, 'capacity': capacity}
+
+    if not Config.DATABASE_CREATE_ALL and checks['database']['ok']:
+        heads = get_migration_heads()
+        migrated = revision in heads
+        ready = ready and migrated
+        checks['migrations'] = {'ok': migrated, 'database': revision, 'head': list(heads)}
+
+    return ready, checks
+
+
+async def get_readiness():
+    """Respond with the readiness of the worker, checked at most once every Config.READINESS_CACHE_SECS"""
+    async with _readiness_lock:
+        result = _readiness.get('readiness')
+        if result is None:
+            result = await check_readiness()
+            _readiness.set('readiness', result)
+    ready, checks = result
+
+    if ready:
+        return response_json(status_code=status.HTTP_200_OK, message='Service is ready', data=checks)
+    return response_json(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, message='Service is not ready', data=checks)
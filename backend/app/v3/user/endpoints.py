@@ -1,8 +1,7 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
 from starlette.responses import JSONResponse
 
-from app.dependencies import get_db
+from app.dependencies import DbSession, get_db
 from app.models.user import User
 from app.v3.auth.schemas import UserResponse
 from app.v3.auth.utils import JWTBearer, get_current_user
@@ -20,12 +19,12 @@ async def get_user(current_user: User = Depends(get_current_user)) -> JSONRespon
 
 
 @router.get('/organisations', name='U-2', dependencies=[Depends(JWTBearer())], response_model=OrganisationListResponse)
-async def get_user_organisations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def get_user_organisations(current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get organisations the current user has created"""
-    return fetch_user_organisations(current_user=current_user, db=db)
+    return await fetch_user_organisations(current_user=current_user, db=db)
 
 
 @router.get('/events', name='U-3', dependencies=[Depends(JWTBearer())], response_model=EventListResponse)
-async def get_user_events(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> JSONResponse:
+async def get_user_events(current_user: User = Depends(get_current_user), db: DbSession = Depends(get_db)) -> JSONResponse:
     """Get events the current user has created"""
-    return fetch_user_events(current_user=current_user, db=db)
+    return await fetch_user_events(current_user=current_user, db=db)
@@ -1,11 +1,19 @@
+import base64
+import binascii
+import json
 import logging
-from typing import Dict, Optional
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
 
 from fastapi import Query
 from fastapi_pagination import Params
 from postmarker.core import PostmarkClient
 from pydantic_extra_types.phone_numbers import PhoneNumber as PydanticPhoneNumber
 from sendgrid import SendGridAPIClient
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
 from starlette import status
 
 from config import Config
@@ -26,9 +34,10 @@ class CustomExceptionError(Exception):
         self.headers = headers
 
 
+@lru_cache(maxsize=1)
 def sendgrid_client() -> SendGridAPIClient:
     """
-    Get the SendGrid client with the data residency set to Europe.
+    Get the SendGrid client with the data residency set to Europe, it is created once and shared.
 
     :return: SendGrid client
     :rtype: SendGridAPIClient
@@ -41,9 +50,10 @@ def sendgrid_client() -> SendGridAPIClient:
     return SendGridAPIClient(Config.SENDGRID_API_KEY)
 
 
+@lru_cache(maxsize=1)
 def postmark_client() -> PostmarkClient:
     """
-    Get the Postmark client.
+    Get the Postmark client, it is created once and shared, so its HTTP connections are kept alive.
 
     :return: Postmark client
     :rtype: PostmarkClient
@@ -56,81 +66,6 @@ def postmark_client() -> PostmarkClient:
     return PostmarkClient(server_token=Config.POSTMARK_API_KEY)
 
 
-def _send_email_sendgrid(to: str, subject: str, html_content: str, from_email: str = Config.FROM_EMAIL) -> bool:
-    """
-    Send email using SendGrid.
-
-    :param to: Email address of the recipient
-    :type to: str
-    :param subject: Subject of the email
-    :type subject: str
-    :param html_content: HTML content of the email
-    :type html_content: str
-    :param from_email: Email address of the sender
-    :type from_email: str
-
-    :return: True if the email was sent successfully, False otherwise
-    :rtype: bool
-    """
-    client = sendgrid_client()
-    message = {
-        'personalizations': [{'to': [{'email': to}]}],
-        'from': {'email': from_email},
-        'subject': subject,
-        'content': [{'type': 'text/html', 'value': html_content}],
-    }
-    try:
-        response = client.send(message)
-        logging.debug('Email sent successfully: %s', response)
-        return True
-    except Exception as e:
-        logging.error('Error sending email: %s', e)
-        return False
-
-
-def _send_email_postmark(to: str, subject: str, html_content: str, from_email: str = Config.FROM_EMAIL) -> bool:
-    """
-    Send email using Postmark.
-
-    :param to: Email address of the recipient
-    :type to: str
-    :param subject: Subject of the email
-    :type subject: str
-    :param html_content: HTML content of the email
-    :type html_content: str
-    :param from_email: Email address of the sender
-    :type from_email: str
-
-    :return: True if the email was sent successfully, False otherwise
-    :rtype: bool
-    """
-    client = postmark_client()
-    try:
-        response = client.emails.send(
-            From=from_email,
-            To=to,
-            Subject=subject,
-            HtmlBody=html_content,
-        )
-        logging.debug('Email sent successfully: %s', response)
-        return True
-    except Exception as e:
-        logging.error('Error sending email: %s', e)
-        return False
-
-
-def send_email(to: str, subject: str, html_content: str, from_email: str = Config.FROM_EMAIL) -> bool:
-    """Send email using SendGrid or Postmark"""
-    if Config.SENDGRID_API_KEY:
-        logging.debug('Sending email using SendGrid')
-        return _send_email_sendgrid(to=to, subject=subject, html_content=html_content, from_email=from_email)
-    if Config.POSTMARK_API_KEY:
-        logging.debug('Sending email using Postmark')
-        return _send_email_postmark(to=to, subject=subject, html_content=html_content, from_email=from_email)
-    logging.error('No email service provider configured, please set either SendGrid or Postmark API key')
-    return False
-
-
 def get_portal_url(path: str = '') -> str:
     """
     Get the portal URL based on the server environment
@@ -164,6 +99,103 @@ class CustomParams(Params):
     size: int = Query(10, ge=1, le=100, description='Page size')
 
 
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Encode the sort key of the last row of a page as an opaque cursor.
+
+    :param values: Values of the columns the page is ordered by
+    :type values: Sequence[Any]
+    :return: URL safe cursor
+    :rtype: str
+    """
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, columns: Sequence[InstrumentedAttribute]) -> List[Any]:
+    """
+    Decode a cursor created by encode_cursor.
+
+    :param cursor: Cursor from the previous page
+    :type cursor: str
+    :param columns: Columns the page is ordered by, used to convert the values back to their types
+    :type columns: Sequence[InstrumentedAttribute]
+    :return: Values of the columns
+    :rtype: List[Any]
+    :raises CustomExceptionError: When the cursor is not valid
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('Cursor does not match the sort key')
+        return [_parse_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, binascii.Error) as e:
+        logging.debug(f'Invalid cursor {cursor!r}: {e}')
+        raise CustomExceptionError(status_code=status.HTTP_400_BAD_REQUEST, message='Invalid cursor') from e
+
+
+def _parse_cursor_value(column: InstrumentedAttribute, value: str) -> Any:
+    """Convert a cursor value back to the type of its column"""
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is UUID:
+        return UUID(value)
+    return python_type(value)
+
+
+def paginate_keyset(  # noqa: PLR0913
+    query: Select, columns: Sequence[InstrumentedAttribute], limit: int, cursor: Optional[str] = None, skip: int = 0, descending: bool = False
+) -> Select:
+    """
+    Order a query by a unique sort key and limit it to one page.
+
+    With a cursor the page starts right after the row the cursor was created from, so the database can seek to it in
+    the index instead of scanning and discarding skip rows. One extra row is selected to know if there is a next page.
+
+    :param query: Query to paginate
+    :type query: Select
+    :param columns: Columns to order by, the last column must make the sort key unique, e.g. the id
+    :type columns: Sequence[InstrumentedAttribute]
+    :param limit: Page size
+    :type limit: int
+    :param cursor: Cursor from the previous page
+    :type cursor: str
+    :param skip: Number of rows to skip, used when there is no cursor
+    :type skip: int
+    :param descending: Order the rows in descending order
+    :type descending: bool
+    :return: Paginated query
+    :rtype: Select
+    """
+    if cursor:
+        key, values = tuple_(*columns), tuple_(*decode_cursor(cursor=cursor, columns=columns))
+        query = query.where(key < values if descending else key > values)
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(*[column.desc() if descending else column.asc() for column in columns]).limit(limit + 1)
+
+
+def get_keyset_page(rows: Sequence[Any], columns: Sequence[InstrumentedAttribute], limit: int) -> Tuple[Sequence[Any], Dict[str, Any]]:
+    """
+    Split the rows of a query from paginate_keyset into the page and its pagination details.
+
+    :param rows: Rows returned by the query
+    :type rows: Sequence[Any]
+    :param columns: Columns the query is ordered by
+    :type columns: Sequence[InstrumentedAttribute]
+    :param limit: Page size
+    :type limit: int
+    :return: Rows of the page, and the page size and cursor for the next page, which is None on the last page
+    :rtype: Tuple[Sequence[Any], Dict[str, Any]]
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows, {'limit': limit, 'next_cursor': next_cursor}
+
+
 class PhoneNumber(PydanticPhoneNumber):
     """Phone number model"""
 
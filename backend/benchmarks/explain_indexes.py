@@ -0,0 +1,156 @@
+"""
+Check that the lookup queries of the services are served by an index.
+
+Every query is compiled the way the service builds it and explained against the configured database. On PostgreSQL
+sequential scans are disabled for the check, so an empty development database still shows which index the planner
+can use. The script exits with status 1 when a query does not use one of its expected indexes.
+
+Usage, from the backend directory, against a migrated database:
+
+    python -m benchmarks.explain_indexes
+
+Or against a scratch SQLite database, creating the tables from the models:
+
+    SQLALCHEMY_DATABASE_URI=sqlite:///./explain.sqlite python -m benchmarks.explain_indexes --create-tables
+"""
+
+import argparse
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+os.environ.setdefault('ENV', 'test')
+
+from sqlalchemy import Connection, Select, select, text  # noqa: E402
+
+from app.dependencies import get_db_engine  # noqa: E402
+from app.models.article import Article  # noqa: E402
+from app.models.base import Base  # noqa: E402
+from app.models.event import Event  # noqa: E402
+from app.models.event_interest import EventInterest  # noqa: E402
+from app.models.organisation import Organisation  # noqa: E402
+from app.models.user import Otp  # noqa: E402
+from app.v3.articles.service import ARTICLES_SORT_KEY, select_articles  # noqa: E402
+from app.v3.event_interests.service import INTERESTS_SORT_KEY  # noqa: E402
+from app.v3.events.filters import EventFilter  # noqa: E402
+from app.v3.events.service import EVENTS_SORT_KEY, select_events  # noqa: E402
+from app.v3.organisations.service import ORGANISATIONS_SORT_KEY  # noqa: E402
+from app.v3.utils import encode_cursor, paginate_keyset  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def build_queries() -> Dict[str, Tuple[Select, List[str]]]:
+    """Build the service queries, with the indexes that may serve each of them"""
+    event_id, user_id, organisation_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    now = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+    events_cursor = encode_cursor([now, uuid.uuid4()])
+    return {
+        'event_interests.create_interest': (
+            select(EventInterest.id).where(EventInterest.event_id == event_id, EventInterest.user_id == user_id, EventInterest.deleted_at.is_(None)).limit(1),
+            ['uq_event_interests_event_id_user_id_active'],
+        ),
+        'event_interests.update_interest': (
+            select(EventInterest).where(EventInterest.event_id == event_id, EventInterest.user_id == user_id, EventInterest.deleted_at.is_(None)).limit(1),
+            ['uq_event_interests_event_id_user_id_active'],
+        ),
+        'event_interests.get_event_interests': (
+            paginate_keyset(
+                select(EventInterest).where(EventInterest.event_id == event_id, EventInterest.deleted_at.is_(None)), columns=INTERESTS_SORT_KEY, limit=100
+            ),
+            ['ix_event_interests_event_id_created_at_id', 'uq_event_interests_event_id_user_id_active'],
+        ),
+        'auth.signup_generate_otp': (
+            select(Otp).where(Otp.email == 'user@example.com', Otp.used_at.is_(None), Otp.expires_at > now, Otp.deleted_at.is_(None)).limit(1),
+            ['ix_otp_email_used_at_expires_at_active'],
+        ),
+        'auth.signup_details': (
+            select(Otp).where(Otp.email == 'user@example.com', Otp.used_at.isnot(None), Otp.deleted_at.is_(None)).limit(1),
+            ['ix_otp_email_used_at_expires_at_active'],
+        ),
+        'articles.get_articles': (
+            paginate_keyset(
+                select_articles().where(Article.event_id == event_id, Article.deleted_at.is_(None), Article.published_at.isnot(None)),
+                columns=ARTICLES_SORT_KEY,
+                limit=100,
+                descending=True,
+            ),
+            ['ix_articles_event_id_published_at_id'],
+        ),
+        'events.get_events (cursor)': (
+            paginate_keyset(select_events().where(Event.deleted_at.is_(None)), columns=EVENTS_SORT_KEY, limit=100, cursor=events_cursor),
+            ['ix_events_start_at_id'],
+        ),
+        'events.get_events (organisation filter)': (
+            _filtered_events(EventFilter(organisation_id=organisation_id)),
+            ['ix_events_organisation_id_start_at_id'],
+        ),
+        'events.get_events (city filter)': (
+            _filtered_events(EventFilter(address_city='Oslo')),
+            ['ix_events_lower_address_city', 'ix_events_start_at_id'],
+        ),
+        'events.get_events (upcoming filter)': (
+            _filtered_events(EventFilter(upcoming=True)),
+            ['ix_events_end_at', 'ix_events_start_at_id'],
+        ),
+        'organisations.fetch_organisation_events': (
+            select_events().where(Event.organisation_id == organisation_id, Event.deleted_at.is_(None)),
+            ['ix_events_organisation_id_start_at_id'],
+        ),
+        'user.fetch_user_events': (
+            select_events().where(Event.created_by_id == user_id, Event.deleted_at.is_(None)),
+            ['ix_events_created_by_id_active'],
+        ),
+        'user.fetch_user_organisations': (
+            select(Organisation).where(Organisation.created_by_id == user_id, Organisation.deleted_at.is_(None)),
+            ['ix_organisations_created_by_id_active'],
+        ),
+        'organisations.get_organisations (cursor)': (
+            paginate_keyset(select(Organisation), columns=ORGANISATIONS_SORT_KEY, limit=100, cursor=encode_cursor([now, uuid.uuid4()])),
+            ['ix_organisations_created_at_id'],
+        ),
+    }
+
+
+def _filtered_events(event_filter: EventFilter) -> Select:
+    """Build the event list query for a filter, as get_events does"""
+    query = event_filter.filter(select_events().where(Event.deleted_at.is_(None)))
+    return paginate_keyset(query, columns=EVENTS_SORT_KEY, limit=100, descending=event_filter.descending)
+
+
+def explain(connection: Connection, query: Select) -> str:
+    """Return the query plan of a query as text"""
+    sql = str(query.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        return '\n'.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'))
+    return '\n'.join(row[0] for row in connection.exec_driver_sql(f'EXPLAIN {sql}'))
+
+
+def main(create_tables: bool, verbose: bool) -> int:
+    """Explain every query and print whether it uses an expected index"""
+    engine = get_db_engine(url=Config.SQLALCHEMY_DATABASE_URI)
+    if create_tables:
+        Base.metadata.create_all(bind=engine)
+
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+        for name, (query, indexes) in build_queries().items():
+            plan = explain(connection, query)
+            used = next((index for index in indexes if index in plan), None)
+            failures += used is None
+            print(f'{"ok" if used else "FAIL":4}  {name:45} {used or "expected " + " or ".join(indexes)}')  # noqa: T201
+            if verbose or used is None:
+                print('      ' + plan.replace('\n', '\n      '))  # noqa: T201
+        connection.rollback()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--create-tables', action='store_true', help='Create the tables from the models before explaining')
+    parser.add_argument('--verbose', action='store_true', help='Print the query plan of every query')
+    args = parser.parse_args()
+    sys.exit(main(create_tables=args.create_tables, verbose=args.verbose))
@@ -0,0 +1,71 @@
+"""
+Check the time it takes to import the configuration, the models and the application.
+
+Every target is imported in a fresh interpreter with `python -X importtime`, the fastest of a few runs is compared with
+its budget. Importing the configuration and the models, as the Alembic CLI does, must not pull in the web framework or
+the Sentry SDK, those are only needed once the application is served. The script exits with status 1 when a target is
+over its budget or imports a module it should not.
+
+Usage, from the backend directory:
+
+    python -m benchmarks.import_time --repeat 3 --top 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Budget in milliseconds, and modules that must not be imported, per set of modules imported together
+BUDGETS: Dict[str, Tuple[int, Tuple[str, ...]]] = {
+    'config': (100, ('sentry_sdk', 'fastapi', 'sqlalchemy')),
+    'config, app.dependencies, app.models': (1000, ('sentry_sdk', 'fastapi')),
+    'main': (4000, ('sentry_sdk', 'pandas')),
+}
+
+
+def import_time(modules: str) -> Tuple[int, List[Tuple[int, str]]]:
+    """Import the modules in a fresh interpreter, return the total time in microseconds and the time of every module"""
+    env = {'ENV': 'test', 'SQLALCHEMY_DATABASE_URI': 'sqlite://', **os.environ}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modules}'], env=env, capture_output=True, text=True, check=True)
+    total, imported = 0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # The interpreter startup, site and the modules it imports are printed first, they are not part of the target
+        if name.strip() == 'site':
+            total, imported = 0, []
+            continue
+        imported.append((int(cumulative), name.strip()))
+        # Modules imported directly by the statement are not indented, their cumulative times add up to the total
+        if not name.startswith('  '):
+            total += int(cumulative)
+    return total, imported
+
+
+def main(repeat: int, top: int) -> int:
+    """Import every target and print its time against the budget"""
+    failures = 0
+    for modules, (budget, forbidden) in BUDGETS.items():
+        total, imported = min((import_time(modules) for _ in range(repeat)), key=lambda run: run[0])
+        names = {name for _, name in imported}
+        unexpected = [module for module in forbidden if module in names]
+        failed = total / 1000 > budget or bool(unexpected)
+        failures += failed
+        print(f'{"FAIL" if failed else "ok":4}  {modules:40} {total / 1000:7.0f} ms, budget {budget} ms')  # noqa: T201
+        if unexpected:
+            print(f'      imports {", ".join(unexpected)}')  # noqa: T201
+        targets = {module.strip() for module in modules.split(',')}
+        for cumulative, name in sorted((row for row in imported if row[1] not in targets), reverse=True)[:top]:
+            print(f'      {cumulative / 1000:7.0f} ms  {name}')  # noqa: T201
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per target, the fastest one is kept')
+    parser.add_argument('--top', type=int, default=5, help='Number of slowest modules to print per target')
+    args = parser.parse_args()
+    sys.exit(main(repeat=args.repeat, top=args.top))
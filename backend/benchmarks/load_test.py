@@ -0,0 +1,189 @@
+"""
+Load test the v3 API of a running server with the data set of seed_dataset.
+
+Every virtual user logs in as one of the seeded users and then runs weighted scenarios until the duration is over:
+logging in, listing events, listing the articles of an event and toggling the status of one of its interests. Requests
+of the warmup are not counted. The throughput and p50/p95/p99 latencies are printed per scenario, --output saves them
+as a baseline, and --baseline compares a run with a saved one: the script exits with status 1 when a scenario is slower
+or has a lower throughput than the baseline allows, or when requests fail.
+
+Usage, from the backend directory, with the server running, e.g. `python serve.py`:
+
+    python -m benchmarks.seed_dataset --users 1000 --events 200
+    python -m benchmarks.load_test --concurrency 50 --duration 60 --output baseline.json
+    python -m benchmarks.load_test --concurrency 50 --duration 60 --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.seed_dataset import DEFAULT_MANIFEST
+
+
+class Stats:
+    """Latencies and errors of one scenario"""
+
+    def __init__(self):  # noqa: D107
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        """Summarize the number of requests, errors, requests per second and latency percentiles in milliseconds"""
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            # Nearest rank, so every percentile is a measured latency
+            return round(latencies[max(math.ceil(q * len(latencies)) - 1, 0)] * 1000, 1) if latencies else 0.0
+
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'rps': round(len(latencies) / duration, 1),
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': percentile(1),
+        }
+
+
+class VirtualUser:
+    """Client logged in as one seeded user, running the scenarios"""
+
+    def __init__(self, client: httpx.AsyncClient, dataset: Dict[str, Any], index: int, seed: int):  # noqa: D107
+        user = dataset['users'][index % len(dataset['users'])]
+        self.client = client
+        self.email = user['email']
+        self.interest_event_ids = user['interest_event_ids']
+        self.password = dataset['password']
+        self.event_ids = dataset['event_ids']
+        self.rng = random.Random(seed + index)
+        self.headers: Dict[str, str] = {}
+        self.statuses: Dict[str, int] = {}
+
+    async def login(self) -> httpx.Response:  # noqa: D102
+        response = await self.client.post('/v3/auth/login', json={'email': self.email, 'password': self.password})
+        if response.status_code == httpx.codes.OK:
+            self.headers = {'Authorization': f'Bearer {response.json()["data"]["access_token"]}'}
+        return response
+
+    async def list_events(self) -> httpx.Response:  # noqa: D102
+        return await self.client.get('/v3/events', params={'limit': 20})
+
+    async def list_articles(self) -> httpx.Response:  # noqa: D102
+        return await self.client.get(f'/v3/events/{self.rng.choice(self.event_ids)}/articles', params={'limit': 20})
+
+    async def toggle_interest(self) -> httpx.Response:
+        """Move one of the interests of the user to another status"""
+        event_id = self.rng.choice(self.interest_event_ids)
+        status = self.rng.choice([status for status in (0, 1, 2) if status != self.statuses.get(event_id)])
+        self.statuses[event_id] = status
+        return await self.client.put(f'/v3/events/{event_id}/interests', json={'status': status}, headers=self.headers)
+
+
+# Relative number of times every scenario runs
+WEIGHTS: Dict[str, int] = {'login': 1, 'list_events': 10, 'list_articles': 6, 'toggle_interest': 3}
+
+
+async def run_user(user: VirtualUser, stats: Dict[str, Stats], started_at: float, warmup: float, duration: float) -> None:
+    """Run weighted scenarios as the user until the duration is over, the first one is always a login"""
+    scenarios: Dict[str, Callable[[], Awaitable[httpx.Response]]] = {name: getattr(user, name) for name in WEIGHTS}
+    if not user.interest_event_ids:
+        del scenarios['toggle_interest']
+    names, weights = list(scenarios), [WEIGHTS[name] for name in scenarios]
+    name = 'login'
+    while perf_counter() - started_at < warmup + duration:
+        request_started_at = perf_counter()
+        try:
+            failed = (await scenarios[name]()).is_error
+        except httpx.HTTPError:
+            failed = True
+        if request_started_at - started_at >= warmup:
+            stats[name].latencies.append(perf_counter() - request_started_at)
+            stats[name].errors += failed
+        name = user.rng.choices(names, weights)[0] if user.headers else 'login'
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Run the virtual users against the server and return the summary of every scenario"""
+    with open(args.manifest) as file:
+        dataset = json.load(file)
+    stats = {name: Stats() for name in WEIGHTS}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        users = [VirtualUser(client, dataset, index, args.seed) for index in range(args.concurrency)]
+        started_at = perf_counter()
+        await asyncio.gather(*(run_user(user, stats, started_at, args.warmup, args.duration) for user in users))
+        duration = perf_counter() - started_at - args.warmup
+
+    results = {name: stats[name].summary(duration) for name in WEIGHTS}
+    total = Stats()
+    for scenario in stats.values():
+        total.latencies += scenario.latencies
+        total.errors += scenario.errors
+    results['total'] = total.summary(duration)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Describe every scenario that is slower or has a lower throughput than the baseline, beyond the tolerance"""
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None or not expected['requests']:
+            continue
+        if actual['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {actual["p95_ms"]} ms, baseline {expected["p95_ms"]} ms')
+        if actual['rps'] < expected['rps'] * (1 - tolerance):
+            regressions.append(f'{name}: {actual["rps"]} requests/s, baseline {expected["rps"]} requests/s')
+    return regressions
+
+
+def main(args: argparse.Namespace) -> int:
+    """Run the load test, print the results and compare them with the baseline"""
+    results = asyncio.run(run(args))
+    print(f'{"scenario":16} {"requests":>8} {"errors":>6} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')  # noqa: T201
+    for name, result in results.items():
+        print(  # noqa: T201
+            f'{name:16} {result["requests"]:8} {result["errors"]:6} {result["rps"]:8.1f} {result["p50_ms"]:8.1f} {result["p95_ms"]:8.1f} '
+            f'{result["p99_ms"]:8.1f} {result["max_ms"]:8.1f}'
+        )
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    failed = bool(results['total']['errors'])
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'FAIL  {regression}')  # noqa: T201
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='URL of the running server')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help='Manifest written by seed_dataset')
+    parser.add_argument('--concurrency', type=int, default=20, help='Number of virtual users sending requests at the same time')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to measure, after the warmup')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds to run before measuring, e.g. to fill the caches and pools')
+    parser.add_argument('--timeout', type=float, default=30, help='Request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the random scenario choices')
+    parser.add_argument('--output', help='File to save the results to, to use as a baseline')
+    parser.add_argument('--baseline', help='File with the results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 increase and throughput decrease compared to the baseline')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
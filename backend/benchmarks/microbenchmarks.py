@@ -0,0 +1,188 @@
+"""
+Time the helpers on the hot path of every request: tokens, password hashes, response serialization and validation errors.
+
+Every benchmark runs for a few rounds of at least 0.2 seconds, the median time per call of the rounds is reported.
+--output saves the results as a baseline, and --baseline compares a run with a saved one: the script exits with status
+1 when a benchmark is slower than the baseline allows. Baselines are only comparable on the same machine.
+
+Usage, from the backend directory:
+
+    python -m benchmarks.microbenchmarks --baseline benchmarks/baselines/microbenchmarks.json --tolerance 0.25
+    python -m benchmarks.microbenchmarks --rounds 9 --output benchmarks/baselines/microbenchmarks.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+os.environ.setdefault('ENV', 'test')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+if not os.environ.get('JWT_PRIVATE_KEY'):
+    # A throwaway key pair, the time to sign and verify only depends on the key size
+    _key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ['JWT_PRIVATE_KEY'] = _key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+    os.environ['JWT_PUBLIC_KEY'] = _key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+from fastapi.exceptions import RequestValidationError  # noqa: E402
+from pydantic import SecretStr, TypeAdapter, ValidationError  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.models.article import Article  # noqa: E402
+from app.models.event import Event  # noqa: E402
+from app.models.organisation import Organisation  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.v3.articles.service import articles_serializer  # noqa: E402
+from app.v3.auth.hashing import _hash_password  # noqa: E402
+from app.v3.auth.utils import _verified_tokens, create_user_tokens, validate_token, verify_password  # noqa: E402
+from app.v3.events.schemas import EventCreate  # noqa: E402
+from app.v3.events.service import events_serializer  # noqa: E402
+from main import validation_exception_handler  # noqa: E402
+
+LIST_SIZES = (10, 100, 1000)
+
+
+def _user(now: datetime) -> User:
+    return User(id=uuid.uuid4(), name='Benchmark user', email='benchmark@example.com', password='-', email_verified_at=now, created_at=now, updated_at=now)
+
+
+def _events(count: int, now: datetime) -> List[Event]:
+    user = _user(now)
+    organisation = Organisation(id=uuid.uuid4(), name='Benchmark organisation', created_by_id=user.id, created_at=now, updated_at=now)
+    return [
+        Event(
+            id=uuid.uuid4(),
+            title=f'Event {i}',
+            description='Description of the event ' * 10,
+            max_participants=100,
+            website='https://example.com',
+            address_city='Oslo',
+            start_at=now + timedelta(days=i),
+            end_at=now + timedelta(days=i + 1),
+            organisation=organisation,
+            created_by=user,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def _articles(count: int, now: datetime) -> List[Article]:
+    user = _user(now)
+    event_id = uuid.uuid4()
+    return [
+        Article(
+            id=uuid.uuid4(),
+            title=f'Article {i}',
+            slug=f'article-{i}',
+            content='Content of the article ' * 50,
+            event_id=event_id,
+            created_by=user,
+            published_at=now,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def _validation_error() -> RequestValidationError:
+    """Build the validation error of an event with several invalid fields, located in the body as FastAPI reports it"""
+    try:
+        TypeAdapter(EventCreate).validate_python({'title': None, 'max_participants': 'many', 'start_at': 'soon', 'organisation_id': 'acme'})
+    except ValidationError as e:
+        return RequestValidationError([{**error, 'loc': ('body', *error['loc'])} for error in e.errors(include_url=False)])
+    raise AssertionError('The event should not be valid')
+
+
+def get_benchmarks() -> Dict[str, Callable[[], object]]:
+    """Build the inputs of every benchmark, return the call to time by name"""
+    loop = asyncio.new_event_loop()
+    now = datetime.utcnow()
+    user = _user(now)
+    token = create_user_tokens(user)['access_token']
+    password = SecretStr('benchmark-password')
+    hashed_password = _hash_password(password.get_secret_value())
+    request = Request({'type': 'http', 'method': 'POST', 'path': '/v3/events', 'headers': []})
+    validation_error = _validation_error()
+
+    def validate_uncached_token() -> object:
+        _verified_tokens.delete(token)
+        return validate_token(token)
+
+    benchmarks: Dict[str, Callable[[], object]] = {
+        'create_user_tokens': lambda: create_user_tokens(user),
+        'validate_token': lambda: validate_token(token),
+        'validate_token uncached': validate_uncached_token,
+        'verify_password': lambda: loop.run_until_complete(verify_password(password, hashed_password)),
+        'validation_exception_handler': lambda: loop.run_until_complete(validation_exception_handler(request, validation_error)),
+    }
+    for size in LIST_SIZES:
+        events, articles = _events(size, now), _articles(size, now)
+        benchmarks[f'dump_json EventResponse x{size}'] = lambda events=events: events_serializer.dump_json(events)
+        benchmarks[f'dump_json ArticleResponse x{size}'] = lambda articles=articles: articles_serializer.dump_json(articles)
+    return benchmarks
+
+
+def measure(call: Callable[[], object], rounds: int) -> Dict[str, float]:
+    """Time the call in rounds of at least 0.2 seconds, return the median, fastest and slowest time per call in microseconds"""
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    times = [secs / number * 1_000_000 for secs in timer.repeat(repeat=rounds, number=number)]
+    return {'median_us': round(statistics.median(times), 2), 'min_us': round(min(times), 2), 'max_us': round(max(times), 2), 'calls': number}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Describe every benchmark that is slower than the baseline, beyond the tolerance"""
+    return [
+        f'{name}: {results[name]["median_us"]} us, baseline {expected["median_us"]} us'
+        for name, expected in baseline.items()
+        if name in results and results[name]['median_us'] > expected['median_us'] * (1 + tolerance)
+    ]
+
+
+def main(args: argparse.Namespace) -> int:
+    """Run the benchmarks, print the results and compare them with the baseline"""
+    results = {}
+    print(f'{"benchmark":36} {"median us":>12} {"min us":>12} {"max us":>12} {"calls":>8}')  # noqa: T201
+    for name, call in get_benchmarks().items():
+        if args.filter and args.filter not in name:
+            continue
+        result = results[name] = measure(call, args.rounds)
+        print(f'{name:36} {result["median_us"]:12.2f} {result["min_us"]:12.2f} {result["max_us"]:12.2f} {result["calls"]:8}')  # noqa: T201
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f'FAIL  {regression}')  # noqa: T201
+    return 1 if regressions else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds per benchmark, the median is compared')
+    parser.add_argument('--filter', help='Only run the benchmarks with this text in their name')
+    parser.add_argument('--output', help='File to save the results to, to use as a baseline')
+    parser.add_argument('--baseline', help='File with the results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed increase of the median time compared to the baseline')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
@@ -0,0 +1,100 @@
+"""
+Measure the per-request overhead of the session and CORS middlewares.
+
+Compares the previous BaseHTTPMiddleware based implementation with the ASGI middlewares in main.py. A minimal ASGI app
+is called directly, so no network or database time is included, only the middleware overhead.
+
+Usage, from the backend directory:
+
+    python -m benchmarks.middleware_overhead --requests 20000
+"""
+
+import argparse
+import asyncio
+import os
+from time import perf_counter
+
+os.environ.setdefault('ENV', 'test')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///./benchmark.sqlite')
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.dependencies import get_async_session  # noqa: E402
+from config import Config  # noqa: E402
+from main import CORSHeadersMiddleware, SQLAlchemySessionMiddleware  # noqa: E402
+
+
+class LegacySessionMiddleware(BaseHTTPMiddleware):
+    """Session middleware as it was implemented on top of BaseHTTPMiddleware"""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):  # noqa: D102
+        try:
+            request.state.db = get_async_session(url=Config.SQLALCHEMY_DATABASE_URI)
+            return await call_next(request)
+        finally:
+            await request.state.db.close()
+
+
+async def legacy_cors_handler(request: Request, call_next: RequestResponseEndpoint):
+    """Add CORS headers, as the handler registered with @app.middleware('http') did"""
+    response = await call_next(request)
+    response.headers['Access-Control-Allow-Credentials'] = 'true'
+    response.headers['Access-Control-Allow-Origin'] = Config.CORS_ALLOW_ORIGIN or '*'
+    response.headers['Access-Control-Allow-Methods'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = '*'
+    return response
+
+
+async def endpoint(request: Request) -> JSONResponse:
+    """Return a small JSON payload"""
+    return JSONResponse({'status_code': 200, 'message': 'ok'})
+
+
+def build_app(legacy: bool) -> Starlette:
+    """Build a minimal app wrapped in either the legacy or the ASGI middlewares"""
+    if legacy:
+        middleware = [Middleware(BaseHTTPMiddleware, dispatch=legacy_cors_handler), Middleware(LegacySessionMiddleware)]
+    else:
+        middleware = [Middleware(CORSHeadersMiddleware), Middleware(SQLAlchemySessionMiddleware)]
+    return Starlette(routes=[Route('/', endpoint)], middleware=middleware)
+
+
+async def measure(app: Starlette, requests: int) -> float:
+    """Call the app directly and return the mean time per request, in microseconds"""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': '/'}
+    scope.update({'raw_path': b'/', 'root_path': '', 'query_string': b'', 'headers': [], 'client': ('127.0.0.1', 1), 'server': ('testserver', 80)})
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(requests, 500)):  # Warm up
+        await app(dict(scope), receive, send)
+    start = perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (perf_counter() - start) / requests * 1_000_000
+
+
+async def main(requests: int) -> None:
+    """Run the benchmark and print the results"""
+    base = await measure(Starlette(routes=[Route('/', endpoint)]), requests)
+    legacy = await measure(build_app(legacy=True), requests)
+    asgi = await measure(build_app(legacy=False), requests)
+    print(f'No middleware:           {base:8.1f} us/request')  # noqa: T201
+    print(f'BaseHTTPMiddleware:      {legacy:8.1f} us/request (+{legacy - base:.1f} us)')  # noqa: T201
+    print(f'ASGI middleware:         {asgi:8.1f} us/request (+{asgi - base:.1f} us)')  # noqa: T201
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000, help='Number of requests per variant')
+    args = parser.parse_args()
+    asyncio.run(main(requests=args.requests))
@@ -0,0 +1,141 @@
+"""
+Check that the list endpoints run a constant number of queries, whatever the number of rows.
+
+Every list endpoint is called against a small and a large data set in a scratch SQLite database, where every row has
+its own author and organisation. The script exits with status 1 when an endpoint runs more queries for the large data
+set, i.e. a relationship is lazy loaded per row, when it runs more queries than its budget, or when a response of these
+public endpoints contains a password or refresh token.
+
+Usage, from the backend directory:
+
+    python -m benchmarks.query_counts --rows 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+os.environ.setdefault('ENV', 'test')
+os.environ['RESPONSE_CACHE_TTL_SECS'] = '0'  # Measure the queries, not the response cache
+os.environ['DATABASE_CREATE_ALL'] = '1'
+DATABASE_PATH = os.path.join(tempfile.gettempdir(), f'query-counts-{uuid.uuid4().hex}.sqlite')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DATABASE_PATH}'
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import Engine, event  # noqa: E402
+from starlette import status  # noqa: E402
+
+from app.dependencies import get_local_session  # noqa: E402
+from app.models.article import Article  # noqa: E402
+from app.models.event import Event  # noqa: E402
+from app.models.event_interest import EventInterest  # noqa: E402
+from app.models.organisation import Organisation  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.v3.loaders import SECRET_FIELDS  # noqa: E402
+from main import app  # noqa: E402
+
+# Maximum number of queries per endpoint
+BUDGETS = {
+    '/v3/events': 1,
+    '/v3/events/{event_id}/articles': 2,  # Event exists check and the articles
+    '/v3/events/{event_id}/interests': 1,
+    '/v3/organisations': 1,
+    '/v3/organisations/{organisation_id}/events': 1,
+}
+
+
+class QueryCounter:
+    """Statements executed while counting, see count_queries"""
+
+    def __init__(self):  # noqa: D107
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:  # noqa: D102
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, *args) -> None:
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """Count the statements executed by every engine inside the block, from the whole process"""
+    counter = QueryCounter()
+    event.listen(Engine, 'before_cursor_execute', counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, 'before_cursor_execute', counter._before_cursor_execute)
+
+
+def seed(rows: int) -> Dict[str, uuid.UUID]:
+    """Create an event with rows articles and interests, and rows events, each with its own author and organisation"""
+    session = get_local_session()
+    now = datetime.utcnow()
+    users = [User(name=f'User {i}', email=f'{uuid.uuid4().hex}@example.com', password='-') for i in range(rows)]
+    organisations = [Organisation(name=f'Organisation {uuid.uuid4().hex}', created_by=user) for user in users]
+    events = [
+        Event(title=f'Event {i}', start_at=now + timedelta(days=i), end_at=now + timedelta(days=i + 1), organisation=organisation, created_by=user)
+        for i, (user, organisation) in enumerate(zip(users, organisations))
+    ]
+    event = events[0]
+    session.add_all(events)
+    session.add_all(
+        Article(title=f'Article {i}', slug=f'article-{i}', content='-', event=event, created_by=user, published_at=now - timedelta(hours=i))
+        for i, user in enumerate(users)
+    )
+    session.add_all(EventInterest(event=event, user=user, status=1) for user in users)
+    # Every event of the data set in one organisation, to list them through the organisation
+    session.add_all(
+        Event(title=f'Organisation event {i}', start_at=now, end_at=now, organisation=organisations[0], created_by=user) for i, user in enumerate(users)
+    )
+    session.commit()
+    ids = {'event_id': event.id, 'organisation_id': organisations[0].id}
+    session.close()
+    return ids
+
+
+def measure(client: TestClient, rows: int) -> Dict[str, Tuple[int, int, List[str]]]:
+    """Seed the database and return the number of queries, rows and leaked secret fields for every endpoint"""
+    ids = seed(rows)
+    results = {}
+    for path in BUDGETS:
+        url = path.format(**ids)
+        with count_queries() as counter:
+            response = client.get(url, params={'limit': 100})
+        assert response.status_code == status.HTTP_200_OK, (url, response.status_code, response.text)
+        leaked = sorted(field for field in SECRET_FIELDS if f'"{field}"' in response.text)
+        results[path] = (counter.count, len(response.json()['data']), leaked)
+    return results
+
+
+def main(rows: int) -> int:
+    """Compare the number of queries for a small and a large data set"""
+    failures = 0
+    try:
+        with TestClient(app) as client:
+            small = measure(client, rows=1)
+            large = measure(client, rows=rows)
+    finally:
+        os.remove(DATABASE_PATH)
+    for path, budget in BUDGETS.items():
+        (small_queries, _, _), (large_queries, large_rows, leaked) = small[path], large[path]
+        failed = large_queries > small_queries or large_queries > budget or bool(leaked)
+        failures += failed
+        print(f'{"FAIL" if failed else "ok":4}  {path:45} {large_queries} queries for {large_rows} rows, budget {budget}')  # noqa: T201
+        if leaked:
+            print(f'      responds with {", ".join(leaked)}')  # noqa: T201
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50, help='Number of rows in the large data set')
+    args = parser.parse_args()
+    sys.exit(main(rows=args.rows))
@@ -1,42 +1,29 @@
 import logging
+import logging.config
 import socket
+from functools import lru_cache
 from os import getenv, makedirs, path
 from pathlib import Path
 from typing import ClassVar, Optional
 
-import sentry_sdk
 from dotenv import load_dotenv
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
-from sentry_sdk.integrations.starlette import StarletteIntegration
 from tunsberg.konfig import check_required_env_vars, uvicorn_log_config
 
 PROJECT_DIR: Path = Path(__file__).parent
 
-# Initial Logging Configuration
 LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
 _LOG_PATH = './logs/'
 LOG_FILE_PATH = f'{_LOG_PATH}app.log'
-if not path.exists(_LOG_PATH):
-    makedirs(_LOG_PATH)
-if not path.exists(LOG_FILE_PATH):
-    with open(LOG_FILE_PATH, 'w'):
-        pass
-
-# Set up logging with debug level for initial bootstrapping
-logging.basicConfig(level=logging.DEBUG, handlers=[logging.StreamHandler()], format=LOG_FORMAT)
 
 
 class HealthCheckFilter(logging.Filter):
-    """Filter to exclude health check logs"""
+    """Filter to exclude health check, readiness probe and metrics scrape logs"""
 
     def filter(self, record: logging.LogRecord) -> bool:
-        """Filter out log messages containing the health check endpoint"""
-        return '/v3/system/up' not in record.getMessage()
-
+        """Filter out log messages containing the health check, readiness or metrics endpoint"""
+        message = record.getMessage()
+        return not any(path in message for path in ('/v3/system/up', '/v3/system/ready', '/v3/system/metrics'))
 
-# Remove health check logs from uvicorn.access logs
-logging.getLogger('uvicorn.access').addFilter(HealthCheckFilter())
 
 # Load .env file if it exists
 load_dotenv()
@@ -65,14 +52,7 @@ class Config:
     MICRO_SERVICE_IS_LIVE: bool = bool(ENV in LIVE_ENVS)
     MICRO_SERVICE_IN_PRODUCTION: bool = IN_PROD_ENV
     MICRO_SERVICE_IN_STAGING: bool = IN_STAGING_ENV
-    try:
-        HOSTNAME: str = socket.gethostname() or 'unknown'
-    except socket.gaierror:
-        HOSTNAME: str = 'unknown'
-    try:
-        IPADDRESS: str = socket.gethostbyname(HOSTNAME) or 'unknown'
-    except socket.gaierror:
-        IPADDRESS: str = 'unknown'
+    HOSTNAME: str = socket.gethostname() or 'unknown'
 
     # Debug
     DEBUG_MODE: bool = bool(IN_LOCAL_DEVELOPMENT_ENV or DEBUG)
@@ -80,22 +60,12 @@ class Config:
     # Logging
     LOG_LEVEL = logging.DEBUG if DEBUG else logging.INFO
 
-    # Debug logging
-    logging.debug(f'ENV: {ENV}')
-    logging.debug(f'DEBUG: {DEBUG}')
-    logging.debug(f'CODE_BUILD: {CODE_BUILD}')
-    logging.debug(f'MICRO_SERVICE_NAME: {MICRO_SERVICE_NAME}')
-    logging.debug(f'MICRO_SERVICE_IS_LIVE: {MICRO_SERVICE_IS_LIVE}')
-    logging.debug(f'MICRO_SERVICE_IN_STAGING: {MICRO_SERVICE_IN_STAGING}')
-    logging.debug(f'MICRO_SERVICE_IN_PRODUCTION: {MICRO_SERVICE_IN_PRODUCTION}')
-    logging.debug(f'HOSTNAME: {HOSTNAME}')
-    logging.debug(f'IPADDRESS: {IPADDRESS}')
-    logging.debug(f'IN_LOCAL_DEVELOPMENT_ENV: {IN_LOCAL_DEVELOPMENT_ENV}')
-    logging.debug(f'DEBUG_MODE: {DEBUG_MODE}')
+    # Request timings, sent in a Server-Timing header in debug mode, and logged for requests slower than the threshold, 0 disables the log
+    SERVER_TIMING_HEADER: bool = bool(getenv('SERVER_TIMING_HEADER', '')) or DEBUG_MODE
+    SLOW_REQUEST_THRESHOLD_MS: int = int(getenv('SLOW_REQUEST_THRESHOLD_MS', '1000'))
 
     # Database
     DATABASE_DEBUG: bool = bool(getenv('DATABASE_DEBUG', ''))
-    logging.debug(f'DATABASE_DEBUG: {DATABASE_DEBUG}')
     DATABASE_INFO: ClassVar[dict] = {
         'hostname': getenv('DB_HOST', 'localhost'),
         'username': getenv('DB_USERNAME', 'postgres'),
@@ -110,6 +80,30 @@ class Config:
         if ENV != 'test'
         else f'{getenv("SQLALCHEMY_DATABASE_URI")}'
     )
+    # Set to run the synchronous (psycopg2) session behind the async session API, e.g. for tests
+    DATABASE_SYNC_COMPAT: bool = bool(getenv('DATABASE_SYNC_COMPAT', ''))
+    # Set to create missing tables from the models on startup, e.g. for a scratch database, the schema is otherwise managed by Alembic
+    DATABASE_CREATE_ALL: bool = bool(getenv('DATABASE_CREATE_ALL', ''))
+    DATABASE_POOL_SIZE: int = int(getenv('DATABASE_POOL_SIZE', '10'))
+    DATABASE_MAX_OVERFLOW: int = int(getenv('DATABASE_MAX_OVERFLOW', '10'))
+    DATABASE_POOL_TIMEOUT: int = int(getenv('DATABASE_POOL_TIMEOUT', '10'))  # In seconds
+    DATABASE_POOL_RECYCLE: int = int(getenv('DATABASE_POOL_RECYCLE', '1800'))  # In seconds
+    # max_connections of the database, see postgres/postgresql.conf, and the connections kept free for migrations, maintenance
+    # and processes outside the server, e.g. `python -m app.v3.mailer`
+    DATABASE_MAX_CONNECTIONS: int = int(getenv('DATABASE_MAX_CONNECTIONS', '100'))
+    DATABASE_RESERVED_CONNECTIONS: int = int(getenv('DATABASE_RESERVED_CONNECTIONS', '10'))
+
+    # Readiness probe, /v3/system/ready, the result is reused for the cache interval so probes do not load the database
+    READINESS_TIMEOUT_SECS: float = float(getenv('READINESS_TIMEOUT_SECS', '2'))
+    READINESS_CACHE_SECS: float = float(getenv('READINESS_CACHE_SECS', '5'))
+    READINESS_MAX_POOL_USAGE: float = float(getenv('READINESS_MAX_POOL_USAGE', '1'))  # Share of the pool and overflow in use
+
+    # Server, see serve.py, every worker has its own connection pool so the workers are capped by the database connections
+    SERVER_HOST: str = getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT: int = int(getenv('SERVER_PORT', '8000'))
+    SERVER_WORKERS: int = int(getenv('SERVER_WORKERS', '0'))  # 0 for one worker per CPU
+    SERVER_KEEP_ALIVE_SECS: int = int(getenv('SERVER_KEEP_ALIVE_SECS', '5'))  # Keep above the idle timeout of a load balancer in front
+    SERVER_GRACEFUL_TIMEOUT_SECS: int = int(getenv('SERVER_GRACEFUL_TIMEOUT_SECS', '30'))  # Time given to running requests on shutdown
 
     # API Docs
     API_DOCS_TITLE: str = f'{MICRO_SERVICE_NAME_FOR_HUMANS} API'
@@ -138,6 +132,21 @@ class Config:
     JWT_ALGORITHM: str = getenv('JWT_ALGORITHM', 'RS256')
     JWT_PUBLIC_KEY: str = getenv('JWT_PUBLIC_KEY', '').replace('\\n', '\n').replace('\\', '')
     JWT_PRIVATE_KEY: str = getenv('JWT_PRIVATE_KEY', '').replace('\\n', '\n').replace('\\', '')
+    JWT_CACHE_MAX_SIZE: int = int(getenv('JWT_CACHE_MAX_SIZE', '10000'))  # Verified tokens kept in memory
+    JWT_CACHE_TTL_SECS: int = int(getenv('JWT_CACHE_TTL_SECS', '300'))  # Never longer than the token expiry
+
+    # Users resolved from access tokens are cached per worker, and invalidated on every worker of the host when the user record changes
+    USER_CACHE_MAX_SIZE: int = int(getenv('USER_CACHE_MAX_SIZE', '10000'))
+    USER_CACHE_TTL_SECS: int = int(getenv('USER_CACHE_TTL_SECS', '60'))
+
+    # Response cache for the public event, article and organisation reads, per worker. Writes invalidate the entries of
+    # every worker on the host right away, see CACHE_TAG_VERSIONS_FILE in serve.py. Servers on other hosts are not
+    # invalidated, with several hosts a response can be stale for up to RESPONSE_CACHE_TTL_SECS.
+    RESPONSE_CACHE_MAX_SIZE: int = int(getenv('RESPONSE_CACHE_MAX_SIZE', '1000'))
+    RESPONSE_CACHE_TTL_SECS: int = int(getenv('RESPONSE_CACHE_TTL_SECS', '30'))  # 0 disables the cache
+
+    # Interest counters are kept up to date by the services, and recomputed from the interests every interval by one worker at a time, 0 to disable
+    INTEREST_COUNTS_RECONCILE_SECS: int = int(getenv('INTEREST_COUNTS_RECONCILE_SECS', '3600'))
 
     # OTP Configuration
     OTP_SECRET_KEY: str = getenv('OTP_SECRET_KEY')
@@ -146,32 +155,34 @@ class Config:
 
     # Sentry
     SENTRY_DSN: Optional[str] = getenv('SENTRY_DSN')
-    if SENTRY_DSN and MICRO_SERVICE_IS_LIVE:
-        sentry_sdk.init(
-            dsn=SENTRY_DSN,
-            enable_tracing=False,  # Disable tracing for now
-            environment=str(ENV).lower(),
-            integrations=[
-                FastApiIntegration(transaction_style='url'),
-                SqlalchemyIntegration(),
-                StarletteIntegration(),
-            ],
-        )
-    elif not SENTRY_DSN and MICRO_SERVICE_IS_LIVE:
-        logging.warning('Sentry DSN not set!')
 
     # Email
     FROM_EMAIL: str = getenv('FROM_EMAIL')
 
     # Sendgrid Email Config
     SENDGRID_API_KEY: Optional[str] = getenv('SENDGRID_API_KEY')
-    if not SENDGRID_API_KEY:
-        logging.warning('Sendgrid API Key not set!')
 
     # Postmark Email Config
     POSTMARK_API_KEY: Optional[str] = getenv('POSTMARK_API_KEY')
-    if not POSTMARK_API_KEY:
-        logging.warning('Postmark API Key not set!')
+
+    # Email provider: sendgrid, postmark, smtp or file, defaults to the provider with an API key set
+    EMAIL_PROVIDER: Optional[str] = getenv('EMAIL_PROVIDER')
+    EMAIL_FILE_DIR: str = getenv('EMAIL_FILE_DIR', './logs/emails/')  # Emails are written here by the file provider
+    SMTP_HOST: str = getenv('SMTP_HOST', 'localhost')
+    SMTP_PORT: int = int(getenv('SMTP_PORT', '25'))
+    SMTP_USERNAME: Optional[str] = getenv('SMTP_USERNAME')
+    SMTP_PASSWORD: Optional[str] = getenv('SMTP_PASSWORD')
+    SMTP_STARTTLS: bool = bool(getenv('SMTP_STARTTLS', ''))
+
+    # Email outbox, emails are stored with the request and sent by a background worker
+    # Set when the emails are sent by the worker of `python -m app.v3.mailer` instead of by every server worker
+    EMAIL_OUTBOX_WORKER_DISABLED: bool = bool(getenv('EMAIL_OUTBOX_WORKER_DISABLED', ''))
+    EMAIL_OUTBOX_BATCH_SIZE: int = int(getenv('EMAIL_OUTBOX_BATCH_SIZE', '50'))
+    EMAIL_OUTBOX_POLL_SECS: float = float(getenv('EMAIL_OUTBOX_POLL_SECS', '5'))
+    EMAIL_OUTBOX_LEASE_SECS: int = int(getenv('EMAIL_OUTBOX_LEASE_SECS', '120'))  # Time a worker has to send a claimed batch
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '8'))
+    EMAIL_OUTBOX_BACKOFF_SECS: int = int(getenv('EMAIL_OUTBOX_BACKOFF_SECS', '30'))  # Doubled after every failed attempt
+    EMAIL_OUTBOX_RETENTION_SECS: int = int(getenv('EMAIL_OUTBOX_RETENTION_SECS', '604800'))  # Sent and failed emails are deleted after this
 
     # Portal
     PORTAL_URL: str = getenv('PORTAL_URL')
@@ -179,6 +190,11 @@ class Config:
     # Validation
     PASSWORD_MIN_LENGTH: int = int(getenv('PASSWORD_MIN_LENGTH', '12'))
 
+    # Password hashing, bcrypt runs in a bounded pool outside the event loop
+    PASSWORD_HASH_EXECUTOR: str = getenv('PASSWORD_HASH_EXECUTOR', 'thread')  # thread or process
+    PASSWORD_HASH_WORKERS: int = int(getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_QUEUE: int = int(getenv('PASSWORD_HASH_MAX_QUEUE', '32'))  # Calls allowed to wait for a worker
+
     # Super Admin
     SUPER_ADMINS: ClassVar[list[str]] = getenv('SUPER_ADMINS', '').split(',')
 
@@ -190,7 +206,7 @@ class Config:
     UVICORN_LOG_CONFIG: ClassVar[dict] = uvicorn_log_config(log_level=LOG_LEVEL, log_file_path=LOG_FILE_PATH, log_format=LOG_FORMAT)
 
 
-# Check all required environment variables are set
+# Required environment variables, checked by init_app
 _REQUIRED_ENV_VARS = {
     'ENV': {'runtime': True, 'build': True},
     'JWT_PUBLIC_KEY': {'runtime': True, 'build': False},
@@ -198,4 +214,91 @@ _REQUIRED_ENV_VARS = {
     'PORTAL_URL': {'runtime': True, 'build': False},
     'OTP_SECRET_KEY': {'runtime': True, 'build': False},
 }
-check_required_env_vars(required_env_vars=_REQUIRED_ENV_VARS, env=Config.ENV, live_envs=Config.LIVE_ENVS, code_build=Config.CODE_BUILD)
+
+
+def configure_logging() -> None:
+    """Create the log file, and log to it and to the console with the uvicorn loggers"""
+    if not path.exists(_LOG_PATH):
+        makedirs(_LOG_PATH)
+    logging.basicConfig(level=logging.DEBUG, handlers=[logging.StreamHandler()], format=LOG_FORMAT)
+    logging.config.dictConfig(Config.UVICORN_LOG_CONFIG)
+    # Remove health check logs from uvicorn.access logs
+    logging.getLogger('uvicorn.access').addFilter(HealthCheckFilter())
+
+
+@lru_cache(maxsize=1)
+def init_sentry() -> None:
+    """
+    Initialise Sentry in the live environments, the SDK is only imported when it is used.
+
+    Called when the application module is imported, before the app and its middleware are built, as the integrations
+    patch FastAPI and Starlette when they are set up, and so errors during startup are reported.
+    """
+    if not Config.MICRO_SERVICE_IS_LIVE:
+        return
+    if not Config.SENTRY_DSN:
+        logging.warning('Sentry DSN not set!')
+        return
+
+    import sentry_sdk
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+    from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+    from sentry_sdk.integrations.starlette import StarletteIntegration
+
+    sentry_sdk.init(
+        dsn=Config.SENTRY_DSN,
+        enable_tracing=False,  # Disable tracing for now
+        environment=str(Config.ENV).lower(),
+        integrations=[
+            FastApiIntegration(transaction_style='url'),
+            SqlalchemyIntegration(),
+            StarletteIntegration(),
+        ],
+    )
+
+
+def log_environment() -> None:
+    """Log the environment the application runs in, resolving the IP address of the host only when debug logs are shown"""
+    if not Config.SENDGRID_API_KEY:
+        logging.warning('Sendgrid API Key not set!')
+    if not Config.POSTMARK_API_KEY:
+        logging.warning('Postmark API Key not set!')
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    try:
+        ip_address = socket.gethostbyname(Config.HOSTNAME) or 'unknown'
+    except socket.gaierror:
+        ip_address = 'unknown'
+    for name in (
+        'ENV',
+        'DEBUG',
+        'CODE_BUILD',
+        'MICRO_SERVICE_NAME',
+        'MICRO_SERVICE_IS_LIVE',
+        'MICRO_SERVICE_IN_STAGING',
+        'MICRO_SERVICE_IN_PRODUCTION',
+        'HOSTNAME',
+        'IN_LOCAL_DEVELOPMENT_ENV',
+        'DEBUG_MODE',
+        'DATABASE_DEBUG',
+        'DATABASE_SYNC_COMPAT',
+        'DATABASE_CREATE_ALL',
+    ):
+        logging.debug(f'{name}: {getattr(Config, name)}')
+    logging.debug(f'IPADDRESS: {ip_address}')
+
+
+@lru_cache(maxsize=1)
+def init_app() -> None:
+    """
+    Initialise the process for serving the application, from the lifespan of the app.
+
+    Importing the configuration only reads the environment, so scripts and the Alembic CLI start quickly. This checks the
+    required environment variables and configures logging, once per process. Sentry is initialised by init_sentry before
+    the app is built.
+
+    :raises ValueError: When a required environment variable is not set
+    """
+    check_required_env_vars(required_env_vars=_REQUIRED_ENV_VARS, env=Config.ENV, live_envs=Config.LIVE_ENVS, code_build=Config.CODE_BUILD)
+    configure_logging()
+    log_environment()
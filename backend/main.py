@@ -1,24 +1,30 @@
+import asyncio
 import json
 import logging
-from logging.config import dictConfig
-from typing import TYPE_CHECKING
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from starlette.datastructures import MutableHeaders
 from starlette.middleware import Middleware
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from tunsberg.responses import response_bad_request, response_custom, response_internal_server_error
 
-from app.dependencies import get_db_engine, get_local_session
+from app.dependencies import dispose_db_engines, get_async_db_engine, get_async_session, get_db_engine, get_db_pool_stats
+from app.metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT, mark_process_dead
 from app.models.base import Base
+from app.timing import collect_request_timings
 from app.v3.api import router as api_v1_router
+from app.v3.auth.hashing import password_hasher
+from app.v3.event_interests.tasks import reconcile_interest_counts_periodically
+from app.v3.mailer import email_outbox
 from app.v3.utils import CustomExceptionError
-from config import Config
+from config import Config, init_app, init_sentry
 
-if TYPE_CHECKING:
-    from requests import Response
+# Before the app and its middleware are built, see init_sentry
+init_sentry()
 
 # We need both this and the custom cors handler below
 middleware = [
@@ -30,6 +36,36 @@ middleware = [
         allow_headers=['*'],
     )
 ]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialise the process and start the background tasks on startup, stop them on shutdown."""
+    init_app()
+    # The schema is managed by Alembic, only create the tables from the models when asked to, e.g. for a scratch database
+    if Config.DATABASE_CREATE_ALL:
+        if Config.DATABASE_SYNC_COMPAT:
+            Base.metadata.create_all(bind=get_db_engine())
+        else:
+            async with get_async_db_engine().begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+    if not Config.EMAIL_OUTBOX_WORKER_DISABLED:
+        email_outbox.start()
+    reconcile_task = None
+    if Config.INTEREST_COUNTS_RECONCILE_SECS > 0:
+        reconcile_task = asyncio.create_task(reconcile_interest_counts_periodically(), name='reconcile-interest-counts')
+    yield
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await reconcile_task
+    await email_outbox.stop()
+    logging.debug(f'Database pool stats on shutdown: {get_db_pool_stats()}')
+    await dispose_db_engines()
+    password_hasher.shutdown()
+    mark_process_dead()
+
+
 app = FastAPI(
     title=Config.API_DOCS_TITLE,
     version=Config.API_DOCS_VERSION,
@@ -38,6 +74,7 @@ app = FastAPI(
     docs_url=Config.API_DOCS_URL,
     debug=Config.DEBUG,
     middleware=middleware,
+    lifespan=lifespan,
 )
 
 app.include_router(api_v1_router)
@@ -62,60 +99,159 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     return response_bad_request(message=f'Validation Error: {summary_message}', data=errors_json)
 
 
-class SQLAlchemySessionMiddleware(BaseHTTPMiddleware):
-    """Middleware to manage SQLAlchemy database session."""
+class SQLAlchemySessionMiddleware:
+    """
+    Middleware to catch exception and manage SQLAlchemy database session.
+
+    This middleware creates a SQLAlchemy database session and attaches it to the request state. The session is
+    closed after each request is processed, including streamed responses.
+    This middleware also catches the exception and outputs the custom exception format.
+    It is a plain ASGI middleware, so responses are passed through without being wrapped in a task group.
+    """
+
+    def __init__(self, app: ASGIApp):  # noqa: D107
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):  # noqa: D102
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
-        """
-        Middleware to catch exception and manage SQLAlchemy database session.
+        state = scope.setdefault('state', {})
+        received_messages: list[Message] = []
+        response_started = False
+
+        async def receive_and_record() -> Message:
+            message = await receive()
+            received_messages.append(message)
+            return message
+
+        async def send_and_track(message: Message) -> None:
+            nonlocal response_started
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
 
-        This middleware creates a SQLAlchemy database session and attaches it to the request state. The session is
-        closed after each request is processed.
-        This middleware also catches the exception and outputs the custom exception format.
-        """
         try:
-            request.state.db = get_local_session(url=Config.SQLALCHEMY_DATABASE_URI)
-            response = await call_next(request)
+            state['db'] = get_async_session(url=Config.SQLALCHEMY_DATABASE_URI)
+            await self.app(scope, receive_and_record, send_and_track)
         except OperationalError as e:
-            request.state.db.rollback()
+            await state['db'].rollback()
+            if response_started:
+                raise e
             logging.debug(f'OperationalError in SQLAlchemySessionMiddleware: {e}')
-            request.state.db = get_local_session(url=Config.SQLALCHEMY_DATABASE_URI)
-            response = await call_next(request)
+            await state['db'].close()
+            state['db'] = get_async_session(url=Config.SQLALCHEMY_DATABASE_URI)
+            # Replay the request body already read by the first attempt
+            replay = iter(list(received_messages))
+
+            async def receive_replayed() -> Message:
+                return next(replay, None) or await receive()
+
+            await self.app(scope, receive_replayed, send_and_track)
         except SQLAlchemyError as e:
-            request.state.db.rollback()
+            await state['db'].rollback()
             raise e
         except CustomExceptionError as e:
+            if response_started:
+                raise e
             message = getattr(e, 'message', 'Internal Server Error')
             status_code = getattr(e, 'status_code', 500)
-            return response_custom(status_code=status_code, message=message)
+            await response_custom(status_code=status_code, message=message)(scope, receive, send)
         except Exception as e:
             logging.debug(f'Error in SQLAlchemySessionMiddleware, class name: {e.__class__.__name__}')
             # Handle unknown exceptions
-            request.state.db.rollback()
+            await state['db'].rollback()
             logging.error(f'Error in SQLAlchemySessionMiddleware: {e}', exc_info=True)
-            return response_internal_server_error()
+            if response_started:
+                raise e
+            await response_internal_server_error()(scope, receive, send)
         finally:
-            request.state.db.close()
-        return response
+            await state['db'].close()
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware to measure where the time of a request goes.
 
+    The time in the database, the number of queries, the wait for a pooled connection and the serialization time are
+    collected for every request. They are sent in a Server-Timing header when Config.SERVER_TIMING_HEADER is set, the
+    header is sent before a streamed body so it covers the time until the response starts. Requests slower than
+    Config.SLOW_REQUEST_THRESHOLD_MS are logged with their timings as JSON. The latency is also recorded in the
+    http_request_duration_seconds metric, by route name.
+    """
 
-# Apply the logging configuration to the app
-dictConfig(Config.UVICORN_LOG_CONFIG)
+    def __init__(self, app: ASGIApp):  # noqa: D107
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):  # noqa: D102
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+        REQUESTS_IN_FLIGHT.inc()
+        with collect_request_timings() as timings:
+
+            async def send_with_timings(message: Message) -> None:
+                nonlocal status_code
+                if message['type'] == 'http.response.start':
+                    status_code = message['status']
+                    if Config.SERVER_TIMING_HEADER:
+                        MutableHeaders(scope=message).append('Server-Timing', timings.server_timing())
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timings)
+            finally:
+                REQUESTS_IN_FLIGHT.dec()
+                route = scope.get('route')
+                total_ms = timings.total_secs * 1000
+                REQUEST_LATENCY.labels(route=getattr(route, 'name', 'unmatched'), method=scope['method'], status=str(status_code)).observe(total_ms / 1000)
+                if Config.SLOW_REQUEST_THRESHOLD_MS and total_ms >= Config.SLOW_REQUEST_THRESHOLD_MS:
+                    entry = {
+                        'method': scope['method'],
+                        'path': getattr(route, 'path', scope['path']),
+                        'route': getattr(route, 'name', None),
+                        'status_code': status_code,
+                        'total_ms': round(total_ms, 1),
+                        'db_ms': round(timings.db_secs * 1000, 1),
+                        'queries': timings.queries,
+                        'pool_wait_ms': round(timings.pool_wait_secs * 1000, 1),
+                        'serialization_ms': round(timings.serialization_secs * 1000, 1),
+                    }
+                    logging.warning(f'Slow request: {json.dumps(entry)}')
+
+
+class CORSHeadersMiddleware:
+    """Add CORS headers to the response."""
+
+    def __init__(self, app: ASGIApp):  # noqa: D107
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):  # noqa: D102
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors_headers(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                headers['Access-Control-Allow-Credentials'] = 'true'
+                headers['Access-Control-Allow-Origin'] = Config.CORS_ALLOW_ORIGIN
+                headers['Access-Control-Allow-Methods'] = '*'
+                headers['Access-Control-Allow-Headers'] = '*'
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors_headers)
 
-# Create all tables stored in this metadata
-Base.metadata.create_all(bind=get_db_engine())
 
 # Add the SQLAlchemySessionMiddleware to the app
 app.add_middleware(SQLAlchemySessionMiddleware)
 
+# Time the requests, including the database session middleware
+app.add_middleware(RequestTimingMiddleware)
+
 
 # Custom CORS handler, needs to be at the end of the middleware list
-@app.middleware('http')
-async def cors_handler(request: Request, call_next):
-    """Add CORS headers to the response."""
-    response: Response = await call_next(request)
-    response.headers['Access-Control-Allow-Credentials'] = 'true'
-    response.headers['Access-Control-Allow-Origin'] = Config.CORS_ALLOW_ORIGIN
-    response.headers['Access-Control-Allow-Methods'] = '*'
-    response.headers['Access-Control-Allow-Headers'] = '*'
-    return response
+app.add_middleware(CORSHeadersMiddleware)
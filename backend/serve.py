@@ -0,0 +1,124 @@
+"""
+Serve the application with uvicorn, one worker process per CPU unless SERVER_WORKERS is set.
+
+Every worker has its own database connection pool, so the number of workers is capped to keep the pools of all workers
+within the connections of the database. A worker opens one engine, the async engine or the synchronous one with
+DATABASE_SYNC_COMPAT, and its background tasks take their connections from the same pool.
+
+With several workers the Prometheus metrics run in multiprocess mode, and the workers share the tag versions of the
+caches, so a write invalidates the cached responses of every worker.
+
+Usage, from the backend directory:
+
+    python serve.py
+"""
+
+import logging
+import os
+import tempfile
+
+import uvicorn
+
+from config import Config, configure_logging
+
+
+def get_worker_count(
+    requested: int = Config.SERVER_WORKERS,
+    pool_size: int = Config.DATABASE_POOL_SIZE,
+    max_overflow: int = Config.DATABASE_MAX_OVERFLOW,
+    max_connections: int = Config.DATABASE_MAX_CONNECTIONS,
+    reserved_connections: int = Config.DATABASE_RESERVED_CONNECTIONS,
+) -> int:
+    """
+    Get the number of worker processes, so workers * (pool_size + max_overflow) stays within the database connections.
+
+    A worker only opens one engine, the async engine, or the synchronous one when DATABASE_SYNC_COMPAT is set. The email
+    outbox worker and the interest counter reconcile of a worker take their connections from that pool as well, so a
+    worker never holds more than pool_size + max_overflow connections. Processes of their own, such as the email outbox
+    runner, the task runners and migrations, use the reserved connections.
+
+    :param requested: Requested number of workers, 0 for one worker per CPU
+    :type requested: int
+    :param pool_size: Connections kept open in the pool of every worker
+    :type pool_size: int
+    :param max_overflow: Connections every worker may open on top of its pool
+    :type max_overflow: int
+    :param max_connections: max_connections of the database
+    :type max_connections: int
+    :param reserved_connections: Connections kept free for migrations, maintenance and processes outside the server
+    :type reserved_connections: int
+    :return: Number of workers, at least 1
+    :rtype: int
+    """
+    workers = requested or os.cpu_count() or 1
+    connections_per_worker = pool_size + max_overflow
+    cap = max((max_connections - reserved_connections) // connections_per_worker, 1)
+    if workers > cap:
+        logging.warning(
+            f'Running {cap} instead of {workers} workers, {workers} workers with {connections_per_worker} connections each would exceed the '
+            f'{max_connections - reserved_connections} available database connections'
+        )
+        workers = cap
+    if workers * connections_per_worker > max_connections - reserved_connections:
+        logging.warning(f'A single worker may open {connections_per_worker} connections, more than the {max_connections - reserved_connections} available')
+    return workers
+
+
+def prepare_metrics_dir(workers: int) -> None:
+    """
+    Share the Prometheus metrics of several workers through files in PROMETHEUS_MULTIPROC_DIR.
+
+    A temporary directory is used unless the variable is set, the files of a previous run are removed from it.
+
+    :param workers: Number of workers
+    :type workers: int
+    """
+    if workers == 1:
+        return
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not directory:
+        directory = os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='prometheus-')
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        if filename.endswith('.db'):
+            os.remove(os.path.join(directory, filename))
+
+
+def prepare_cache_tag_versions(workers: int) -> None:
+    """
+    Share the cache tag versions of several workers through the file in CACHE_TAG_VERSIONS_FILE.
+
+    A temporary file is used unless the variable is set. Versions left by a previous run do no harm, as the workers
+    start with empty caches.
+
+    :param workers: Number of workers
+    :type workers: int
+    """
+    if workers == 1:
+        return
+    if not os.environ.get('CACHE_TAG_VERSIONS_FILE'):
+        fd, path = tempfile.mkstemp(prefix='cache-tags-')
+        os.close(fd)
+        os.environ['CACHE_TAG_VERSIONS_FILE'] = path
+
+
+def main() -> None:
+    """Run the uvicorn server with the settings from Config"""
+    configure_logging()
+    workers = get_worker_count()
+    prepare_metrics_dir(workers)
+    prepare_cache_tag_versions(workers)
+    logging.info(f'Starting {workers} workers on {Config.SERVER_HOST}:{Config.SERVER_PORT}')
+    uvicorn.run(
+        'main:app',
+        host=Config.SERVER_HOST,
+        port=Config.SERVER_PORT,
+        workers=workers,
+        timeout_keep_alive=Config.SERVER_KEEP_ALIVE_SECS,
+        timeout_graceful_shutdown=Config.SERVER_GRACEFUL_TIMEOUT_SECS,
+        log_config=Config.UVICORN_LOG_CONFIG,
+    )
+
+
+if __name__ == '__main__':
+    main()